@@ -0,0 +1,39 @@
+"""Add (user_id, id) index for keyset pagination of messages
+
+Revision ID: 002
+Revises: 59aea0b85086
+Create Date: 2026-10-18
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "002"
+down_revision: Union[str, Sequence[str], None] = "59aea0b85086"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create partial index used by keyset-paginated chat history.
+
+    Pages are read with `WHERE user_id = ? AND id < ? ORDER BY id DESC`,
+    which idx_messages_user_created (ordered by created_at) can't serve
+    without sorting all messages of the user.
+    """
+    op.execute(
+        """
+        CREATE INDEX idx_messages_user_id_active
+        ON messages(user_id, id)
+        WHERE deleted_at IS NULL
+    """
+    )
+
+
+def downgrade() -> None:
+    """Drop keyset pagination index."""
+    op.execute("DROP INDEX IF EXISTS idx_messages_user_id_active")
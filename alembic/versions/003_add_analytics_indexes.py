@@ -0,0 +1,52 @@
+"""Add created_at/deleted_at indexes for statistics queries
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "003"
+down_revision: Union[str, Sequence[str], None] = "002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create indexes used by RealStatCollector.
+
+    Statistics filter messages by time range across all users, which
+    idx_messages_user_created (leading user_id) can't serve, so every KPI
+    and timeline query scanned the whole table.
+
+    - idx_messages_created_active: `created_at` ranges of active messages
+      (partial, so it only grows with messages that are counted)
+    - idx_messages_deleted: `deleted_at` ranges of deleted messages
+      (partial, active messages are not indexed at all)
+    """
+    op.execute(
+        """
+        CREATE INDEX idx_messages_created_active
+        ON messages(created_at)
+        WHERE deleted_at IS NULL
+    """
+    )
+    op.execute(
+        """
+        CREATE INDEX idx_messages_deleted
+        ON messages(deleted_at)
+        WHERE deleted_at IS NOT NULL
+    """
+    )
+
+
+def downgrade() -> None:
+    """Drop statistics indexes."""
+    op.execute("DROP INDEX IF EXISTS idx_messages_deleted")
+    op.execute("DROP INDEX IF EXISTS idx_messages_created_active")
@@ -0,0 +1,137 @@
+"""Add hourly message statistics rollup
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-18
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "004"
+down_revision: Union[str, Sequence[str], None] = "003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create message_stats_hourly, its maintenance triggers and backfill it.
+
+    One row per hour (unix time // 3600):
+    - message_count / total_length: active messages created in the hour
+    - deleted_count: messages soft deleted in the hour
+
+    Triggers keep the rollup in sync on insert, soft delete, restore and
+    change of the deletion time.
+    Hard deletes are not tracked: the rollup keeps the history of purged
+    messages. Use `python -m src.maintenance rebuild-stats` to recalculate it.
+    """
+    op.execute(
+        """
+        CREATE TABLE message_stats_hourly (
+            hour INTEGER PRIMARY KEY,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            total_length INTEGER NOT NULL DEFAULT 0,
+            deleted_count INTEGER NOT NULL DEFAULT 0
+        )
+    """
+    )
+
+    op.execute(
+        """
+        CREATE TRIGGER message_stats_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO message_stats_hourly (hour, message_count, total_length)
+            SELECT CAST(strftime('%s', new.created_at) AS INTEGER) / 3600, 1, new.length
+            WHERE new.deleted_at IS NULL
+            ON CONFLICT(hour) DO UPDATE SET
+                message_count = message_count + 1,
+                total_length = total_length + excluded.total_length;
+
+            INSERT INTO message_stats_hourly (hour, deleted_count)
+            SELECT CAST(strftime('%s', new.deleted_at) AS INTEGER) / 3600, 1
+            WHERE new.deleted_at IS NOT NULL
+            ON CONFLICT(hour) DO UPDATE SET deleted_count = deleted_count + 1;
+        END
+    """
+    )
+
+    op.execute(
+        """
+        CREATE TRIGGER message_stats_soft_delete AFTER UPDATE OF deleted_at ON messages
+        WHEN old.deleted_at IS NULL AND new.deleted_at IS NOT NULL BEGIN
+            UPDATE message_stats_hourly
+            SET message_count = message_count - 1,
+                total_length = total_length - old.length
+            WHERE hour = CAST(strftime('%s', old.created_at) AS INTEGER) / 3600;
+
+            INSERT INTO message_stats_hourly (hour, deleted_count)
+            VALUES (CAST(strftime('%s', new.deleted_at) AS INTEGER) / 3600, 1)
+            ON CONFLICT(hour) DO UPDATE SET deleted_count = deleted_count + 1;
+        END
+    """
+    )
+
+    op.execute(
+        """
+        CREATE TRIGGER message_stats_restore AFTER UPDATE OF deleted_at ON messages
+        WHEN old.deleted_at IS NOT NULL AND new.deleted_at IS NULL BEGIN
+            UPDATE message_stats_hourly
+            SET deleted_count = deleted_count - 1
+            WHERE hour = CAST(strftime('%s', old.deleted_at) AS INTEGER) / 3600;
+
+            INSERT INTO message_stats_hourly (hour, message_count, total_length)
+            VALUES (CAST(strftime('%s', new.created_at) AS INTEGER) / 3600, 1, new.length)
+            ON CONFLICT(hour) DO UPDATE SET
+                message_count = message_count + 1,
+                total_length = total_length + excluded.total_length;
+        END
+    """
+    )
+
+    op.execute(
+        """
+        CREATE TRIGGER message_stats_redelete AFTER UPDATE OF deleted_at ON messages
+        WHEN old.deleted_at IS NOT NULL AND new.deleted_at IS NOT NULL
+        AND old.deleted_at != new.deleted_at BEGIN
+            UPDATE message_stats_hourly
+            SET deleted_count = deleted_count - 1
+            WHERE hour = CAST(strftime('%s', old.deleted_at) AS INTEGER) / 3600;
+
+            INSERT INTO message_stats_hourly (hour, deleted_count)
+            VALUES (CAST(strftime('%s', new.deleted_at) AS INTEGER) / 3600, 1)
+            ON CONFLICT(hour) DO UPDATE SET deleted_count = deleted_count + 1;
+        END
+    """
+    )
+
+    # Backfill from existing messages
+    op.execute(
+        """
+        INSERT INTO message_stats_hourly (hour, message_count, total_length, deleted_count)
+        SELECT hour, SUM(message_count), SUM(total_length), SUM(deleted_count)
+        FROM (
+            SELECT CAST(strftime('%s', created_at) AS INTEGER) / 3600 AS hour,
+                   1 AS message_count, length AS total_length, 0 AS deleted_count
+            FROM messages
+            WHERE deleted_at IS NULL
+            UNION ALL
+            SELECT CAST(strftime('%s', deleted_at) AS INTEGER) / 3600, 0, 0, 1
+            FROM messages
+            WHERE deleted_at IS NOT NULL
+        )
+        GROUP BY hour
+    """
+    )
+
+
+def downgrade() -> None:
+    """Drop hourly statistics rollup."""
+    op.execute("DROP TRIGGER IF EXISTS message_stats_redelete")
+    op.execute("DROP TRIGGER IF EXISTS message_stats_restore")
+    op.execute("DROP TRIGGER IF EXISTS message_stats_soft_delete")
+    op.execute("DROP TRIGGER IF EXISTS message_stats_insert")
+    op.execute("DROP TABLE IF EXISTS message_stats_hourly")
@@ -0,0 +1,100 @@
+"""Add integer epoch timestamp columns to messages
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-18
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "005"
+down_revision: Union[str, Sequence[str], None] = "004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add created_at_ts / deleted_at_ts (unix seconds, UTC) to messages.
+
+    Time ranges, ordering and bucket math use the integer columns: range
+    scans compare integers instead of TEXT, the indexes get smaller and
+    buckets are integer division. The TEXT columns stay the source of truth
+    for writes, the API and the text-to-SQL prompt.
+
+    The columns are VIRTUAL generated columns, so the migration is online:
+    ADD COLUMN doesn't rewrite the table and there is nothing to backfill,
+    and writers (repositories, triggers, raw SQL) can't leave them out of
+    sync. Only the indexes store the integer values.
+    """
+    op.execute(
+        """
+        ALTER TABLE messages ADD COLUMN created_at_ts INTEGER
+        GENERATED ALWAYS AS (CAST(strftime('%s', created_at) AS INTEGER)) VIRTUAL
+    """
+    )
+    op.execute(
+        """
+        ALTER TABLE messages ADD COLUMN deleted_at_ts INTEGER
+        GENERATED ALWAYS AS (CAST(strftime('%s', deleted_at) AS INTEGER)) VIRTUAL
+    """
+    )
+
+    # Integer replacements of the TEXT timestamp indexes
+    op.execute("DROP INDEX IF EXISTS idx_messages_user_created")
+    op.execute("DROP INDEX IF EXISTS idx_messages_created_active")
+    op.execute("DROP INDEX IF EXISTS idx_messages_deleted")
+    op.execute(
+        """
+        CREATE INDEX idx_messages_user_created_ts
+        ON messages(user_id, created_at_ts)
+    """
+    )
+    op.execute(
+        """
+        CREATE INDEX idx_messages_created_ts_active
+        ON messages(created_at_ts)
+        WHERE deleted_at IS NULL
+    """
+    )
+    op.execute(
+        """
+        CREATE INDEX idx_messages_deleted_ts
+        ON messages(deleted_at_ts)
+        WHERE deleted_at IS NOT NULL
+    """
+    )
+
+
+def downgrade() -> None:
+    """Drop epoch columns and restore the TEXT timestamp indexes."""
+    op.execute("DROP INDEX IF EXISTS idx_messages_deleted_ts")
+    op.execute("DROP INDEX IF EXISTS idx_messages_created_ts_active")
+    op.execute("DROP INDEX IF EXISTS idx_messages_user_created_ts")
+    op.execute("ALTER TABLE messages DROP COLUMN deleted_at_ts")
+    op.execute("ALTER TABLE messages DROP COLUMN created_at_ts")
+
+    op.execute(
+        """
+        CREATE INDEX idx_messages_user_created
+        ON messages(user_id, created_at)
+    """
+    )
+    op.execute(
+        """
+        CREATE INDEX idx_messages_created_active
+        ON messages(created_at)
+        WHERE deleted_at IS NULL
+    """
+    )
+    op.execute(
+        """
+        CREATE INDEX idx_messages_deleted
+        ON messages(deleted_at)
+        WHERE deleted_at IS NOT NULL
+    """
+    )
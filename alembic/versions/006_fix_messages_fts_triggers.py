@@ -0,0 +1,142 @@
+"""Index only active messages in FTS and sync it on content changes only
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-18
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "006"
+down_revision: Union[str, Sequence[str], None] = "005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Segments per level before FTS5 merges them during a write (default 4).
+# Writers merge less, the periodic 'merge' job (src/database/fts.py) catches up.
+FTS_AUTOMERGE = 8
+
+
+def upgrade() -> None:
+    """Replace messages_fts triggers and drop soft deleted rows from the index.
+
+    messages_fts_update fired on every UPDATE of messages, so each soft
+    delete (and every row of /clear) rewrote the FTS entries although the
+    content didn't change. messages_fts_delete used DELETE on the
+    external-content table, which reads the already deleted row.
+
+    New triggers keep only active messages in the index:
+    - messages_fts_insert: new active message
+    - messages_fts_update: content change of an active message (UPDATE OF content)
+    - messages_fts_soft_delete / messages_fts_restore: remove / re-add on soft delete
+    - messages_fts_delete: hard delete of an active message
+    Rows are removed with the FTS5 'delete' command and the old content.
+    """
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_insert")
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_delete")
+
+    op.execute(
+        """
+        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages
+        WHEN new.deleted_at IS NULL BEGIN
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """
+    )
+
+    op.execute(
+        """
+        CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages
+        WHEN old.deleted_at IS NULL AND new.deleted_at IS NULL BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """
+    )
+
+    op.execute(
+        """
+        CREATE TRIGGER messages_fts_soft_delete AFTER UPDATE OF deleted_at ON messages
+        WHEN old.deleted_at IS NULL AND new.deleted_at IS NOT NULL BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+        END
+    """
+    )
+
+    op.execute(
+        """
+        CREATE TRIGGER messages_fts_restore AFTER UPDATE OF deleted_at ON messages
+        WHEN old.deleted_at IS NOT NULL AND new.deleted_at IS NULL BEGIN
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """
+    )
+
+    op.execute(
+        """
+        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages
+        WHEN old.deleted_at IS NULL BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+        END
+    """
+    )
+
+    # Reindex active messages only: the old delete trigger may have left
+    # entries of hard deleted rows, soft deleted ones must go anyway
+    op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('delete-all')")
+    op.execute(
+        """
+        INSERT INTO messages_fts(rowid, content)
+        SELECT id, content FROM messages WHERE deleted_at IS NULL
+    """
+    )
+    op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')")
+    op.execute(
+        f"INSERT INTO messages_fts(messages_fts, rank) VALUES ('automerge', {FTS_AUTOMERGE})"
+    )
+
+
+def downgrade() -> None:
+    """Restore the original triggers and index soft deleted messages again."""
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_restore")
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_soft_delete")
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_insert")
+
+    op.execute(
+        """
+        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts(rowid, content)
+            VALUES (new.id, new.content);
+        END
+    """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER messages_fts_update AFTER UPDATE ON messages BEGIN
+            UPDATE messages_fts
+            SET content = new.content
+            WHERE rowid = new.id;
+        END
+    """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+            DELETE FROM messages_fts WHERE rowid = old.id;
+        END
+    """
+    )
+
+    op.execute("INSERT INTO messages_fts(messages_fts, rank) VALUES ('automerge', 4)")
+    op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
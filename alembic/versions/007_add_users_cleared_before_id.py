@@ -0,0 +1,48 @@
+"""Add users.cleared_before_id marker for constant-time /clear
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "007"
+down_revision: Union[str, Sequence[str], None] = "006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add cleared_before_id / cleared_swept to users.
+
+    Messages of a user with id < cleared_before_id are cleared: /clear moves
+    the marker with one row write instead of soft deleting every message,
+    readers of the conversation skip messages below it and a background
+    sweeper soft deletes them later (MessageRepository.sweep_cleared).
+
+    cleared_swept = 0 marks users whose clear is not swept yet; the partial
+    index idx_users_cleared_pending holds only them, so the sweeper finds
+    them without scanning all users.
+    """
+    op.execute("ALTER TABLE users ADD COLUMN cleared_before_id INTEGER NOT NULL DEFAULT 0")
+    op.execute("ALTER TABLE users ADD COLUMN cleared_swept INTEGER NOT NULL DEFAULT 1")
+    op.execute(
+        """
+        CREATE INDEX idx_users_cleared_pending
+        ON users(id)
+        WHERE cleared_swept = 0
+    """
+    )
+
+
+def downgrade() -> None:
+    """Drop clear marker columns."""
+    op.execute("DROP INDEX IF EXISTS idx_users_cleared_pending")
+    op.execute("ALTER TABLE users DROP COLUMN cleared_swept")
+    op.execute("ALTER TABLE users DROP COLUMN cleared_before_id")
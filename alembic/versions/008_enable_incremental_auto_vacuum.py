@@ -0,0 +1,42 @@
+"""Switch the database to incremental auto-vacuum
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "008"
+down_revision: Union[str, Sequence[str], None] = "007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Set auto_vacuum = INCREMENTAL.
+
+    Pages freed by hard deletes (the retention purge, src/database/retention.py)
+    stay on the freelist until `PRAGMA incremental_vacuum` moves them to the
+    end of the file and truncates it, a bounded amount of pages per call, so
+    the file shrinks online.
+
+    auto_vacuum of an existing database changes only with VACUUM, which
+    rewrites the whole file and can't run inside a transaction: the upgrade
+    is an offline step, its duration grows with the database size.
+    """
+    with op.get_context().autocommit_block():
+        op.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        op.execute("VACUUM")
+
+
+def downgrade() -> None:
+    """Turn auto-vacuum off again (rewrites the file)."""
+    with op.get_context().autocommit_block():
+        op.execute("PRAGMA auto_vacuum = NONE")
+        op.execute("VACUUM")
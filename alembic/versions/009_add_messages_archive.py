@@ -0,0 +1,93 @@
+"""Add messages_archive cold storage table
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-18
+
+"""
+
+import json
+import zlib
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "009"
+down_revision: Union[str, Sequence[str], None] = "008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create messages_archive: one compressed blob per user per month.
+
+    Old active messages are moved here from messages by the archive job
+    (src/database/archive.py), so the hot table and its indexes stay small.
+    data holds the month's messages as zlib-compressed JSON (see
+    records.pack_messages); first_id / last_id bound their ids, so readers
+    pick the blobs a keyset cursor needs without decompressing others.
+
+    Messages keep their ids, months follow id order (ids grow with time),
+    so cursors of the history pages work across both tables.
+    """
+    op.execute(
+        """
+        CREATE TABLE messages_archive (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (user_id, month),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """
+    )
+
+
+def downgrade() -> None:
+    """Move archived messages back to messages and drop messages_archive.
+
+    The insert trigger counts restored messages in message_stats_hourly
+    again, so their counts are subtracted back.
+    """
+    connection = op.get_bind()
+    archive = connection.execute(sa.text("SELECT user_id, data FROM messages_archive"))
+    for user_id, data in archive.fetchall():
+        rows = [
+            {
+                "id": id,
+                "user_id": user_id,
+                "role": role,
+                "content": content,
+                "length": length,
+                "created_at": created_at,
+            }
+            for id, role, content, length, created_at in json.loads(zlib.decompress(data))
+        ]
+        connection.execute(
+            sa.text(
+                """
+                INSERT INTO messages (id, user_id, role, content, length, created_at)
+                VALUES (:id, :user_id, :role, :content, :length, :created_at)
+            """
+            ),
+            rows,
+        )
+        connection.execute(
+            sa.text(
+                """
+                UPDATE message_stats_hourly
+                SET message_count = message_count - 1, total_length = total_length - :length
+                WHERE hour = CAST(strftime('%s', :created_at) AS INTEGER) / 3600
+            """
+            ),
+            rows,
+        )
+
+    op.execute("DROP TABLE IF EXISTS messages_archive")
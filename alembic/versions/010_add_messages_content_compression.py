@@ -0,0 +1,175 @@
+"""Add compressed storage of long message content
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18
+
+"""
+
+import zlib
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "010"
+down_revision: Union[str, Sequence[str], None] = "009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _index(row: str) -> str:
+    """Statements adding message `row` ('new' / 'old') to the index"""
+    return f"""
+            INSERT INTO messages_fts(rowid, content)
+            SELECT {row}.id, {row}.content WHERE {row}.content_z IS NULL;
+            INSERT INTO messages_fts_queue(message_id, action, content_z)
+            SELECT {row}.id, 'index', {row}.content_z WHERE {row}.content_z IS NOT NULL;"""
+
+
+def _unindex(row: str) -> str:
+    """Statements removing message `row` ('new' / 'old') from the index"""
+    return f"""
+            INSERT INTO messages_fts(messages_fts, rowid, content)
+            SELECT 'delete', {row}.id, {row}.content WHERE {row}.content_z IS NULL;
+            INSERT INTO messages_fts_queue(message_id, action, content_z)
+            SELECT {row}.id, 'unindex', {row}.content_z WHERE {row}.content_z IS NOT NULL;"""
+
+
+# Migration 006 triggers, with compressed messages sent to messages_fts_queue
+FTS_TRIGGERS = {
+    "messages_fts_insert": f"""
+        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages
+        WHEN new.deleted_at IS NULL BEGIN{_index("new")}
+        END
+    """,
+    "messages_fts_update": f"""
+        CREATE TRIGGER messages_fts_update AFTER UPDATE OF content, content_z ON messages
+        WHEN old.deleted_at IS NULL AND new.deleted_at IS NULL BEGIN{_unindex("old")}{_index("new")}
+        END
+    """,
+    "messages_fts_soft_delete": f"""
+        CREATE TRIGGER messages_fts_soft_delete AFTER UPDATE OF deleted_at ON messages
+        WHEN old.deleted_at IS NULL AND new.deleted_at IS NOT NULL BEGIN{_unindex("old")}
+        END
+    """,
+    "messages_fts_restore": f"""
+        CREATE TRIGGER messages_fts_restore AFTER UPDATE OF deleted_at ON messages
+        WHEN old.deleted_at IS NOT NULL AND new.deleted_at IS NULL BEGIN{_index("new")}
+        END
+    """,
+    "messages_fts_delete": f"""
+        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages
+        WHEN old.deleted_at IS NULL BEGIN{_unindex("old")}
+        END
+    """,
+}
+
+# Triggers of migration 006
+PLAIN_FTS_TRIGGERS = {
+    "messages_fts_insert": """
+        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages
+        WHEN new.deleted_at IS NULL BEGIN
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """,
+    "messages_fts_update": """
+        CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages
+        WHEN old.deleted_at IS NULL AND new.deleted_at IS NULL BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """,
+    "messages_fts_soft_delete": """
+        CREATE TRIGGER messages_fts_soft_delete AFTER UPDATE OF deleted_at ON messages
+        WHEN old.deleted_at IS NULL AND new.deleted_at IS NOT NULL BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+        END
+    """,
+    "messages_fts_restore": """
+        CREATE TRIGGER messages_fts_restore AFTER UPDATE OF deleted_at ON messages
+        WHEN old.deleted_at IS NOT NULL AND new.deleted_at IS NULL BEGIN
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+    """,
+    "messages_fts_delete": """
+        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages
+        WHEN old.deleted_at IS NULL BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+        END
+    """,
+}
+
+
+def _replace_triggers(triggers: dict[str, str]) -> None:
+    """Drop the messages_fts triggers and create `triggers`"""
+    for name in triggers:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for sql in triggers.values():
+        op.execute(sql)
+
+
+def upgrade() -> None:
+    """Add messages.content_z and keep compressed messages in the index.
+
+    MessageRepository stores content of at least MESSAGE_COMPRESSION_THRESHOLD
+    bytes zlib-compressed in content_z and leaves content empty; records
+    decompress it when the text is read.
+
+    The schema uses no application-defined SQL functions, so any SQLite
+    client can read and write the file. messages_fts stays an external
+    content index over messages.content: the triggers index plain rows as
+    before. SQL can't decompress, so for compressed rows they queue the
+    blob in messages_fts_queue ('index' / 'unindex'), and the application
+    applies the queue with the plain text (FTSMaintenance.apply_queue(),
+    MessageRepository.create() for new messages).
+
+    Existing rows stay uncompressed.
+    """
+    op.execute("ALTER TABLE messages ADD COLUMN content_z BLOB NULL")
+    op.execute(
+        """
+        CREATE TABLE messages_fts_queue (
+            id INTEGER PRIMARY KEY,
+            message_id INTEGER NOT NULL,
+            action TEXT NOT NULL CHECK (action IN ('index', 'unindex')),
+            content_z BLOB NOT NULL
+        )
+    """
+    )
+    op.execute("CREATE INDEX idx_messages_fts_queue_message_id ON messages_fts_queue(message_id)")
+    _replace_triggers(FTS_TRIGGERS)
+
+
+def downgrade() -> None:
+    """Decompress messages back into content and drop content_z.
+
+    Compressed messages aren't in the index until their queued 'index'
+    entries are applied, so the index is rebuilt from the plain text.
+    """
+    _replace_triggers(PLAIN_FTS_TRIGGERS)
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.text("SELECT id, content_z FROM messages WHERE content_z IS NOT NULL")
+    ).fetchall()
+    if rows:
+        connection.execute(
+            sa.text("UPDATE messages SET content = :content, content_z = NULL WHERE id = :id"),
+            [{"id": id, "content": zlib.decompress(data).decode("utf-8")} for id, data in rows],
+        )
+
+    op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('delete-all')")
+    op.execute(
+        """
+        INSERT INTO messages_fts(rowid, content)
+        SELECT id, content FROM messages WHERE deleted_at IS NULL
+    """
+    )
+    op.execute("DROP TABLE IF EXISTS messages_fts_queue")
+    op.execute("ALTER TABLE messages DROP COLUMN content_z")
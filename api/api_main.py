@@ -7,24 +7,55 @@ Run with: uvicorn api.api_main:app --reload --port 8000
 API documentation: http://localhost:8000/docs
 """
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from typing import Annotated
 
-from fastapi import Depends, FastAPI, Query
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 
 from api.chat_manager import ChatManager
-from api.dependencies import get_chat_manager, get_stat_collector
+from api.collectors.cached_collector import CachedStatCollector
+from api.dependencies import (
+    APIResources,
+    get_chat_manager,
+    get_stat_collector,
+    get_stats_broadcaster,
+)
+from api.etag import etag_matches, make_etag, not_modified, set_etag
 from api.models import (
+    BucketEnum,
     ChatHistoryMessage,
     ChatHistoryResponse,
     ChatMode,
     ChatRequest,
     ChatResponse,
     PeriodEnum,
+    SearchHit,
+    SearchResponse,
     StatsResponse,
 )
-from api.protocols import StatCollectorProtocol
-from src.database.repository import DatabaseManager
+from api.stats_stream import StatsBroadcaster
+from src.config import Config
+from src.database.repository import MessageRepository
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Build shared resources on startup and close them on shutdown
+
+    Config, database connections, the LLM client and the collectors are
+    created once and injected into every request (see api/dependencies.py).
+    """
+    resources = await APIResources.create(Config.load())
+    await resources.warm_up()
+    app.state.resources = resources
+    try:
+        yield
+    finally:
+        await resources.close()
+
 
 # Create FastAPI application
 app = FastAPI(
@@ -33,6 +64,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 # Configure CORS for local development
@@ -61,16 +93,30 @@ async def root() -> dict[str, str]:
 
 @app.get("/stats", response_model=StatsResponse)
 async def get_stats(
+    response: Response,
     period: Annotated[str, Query(description="Time period for statistics")] = PeriodEnum.WEEK.value,
-    collector: StatCollectorProtocol = Depends(get_stat_collector),  # noqa: B008
-) -> StatsResponse:
+    bucket: Annotated[
+        str | None, Query(description="Timeline bucket width: 5m, 1h, 1d or 1w")
+    ] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+    collector: CachedStatCollector = Depends(get_stat_collector),  # noqa: B008
+) -> StatsResponse | Response:
     """Get statistics for dashboard
 
     Returns KPI metrics and timeline data for the specified period.
 
+    The response carries an ETag derived from the database version and the
+    timeline bucket (UTC, at most an hour wide) the statistics were computed
+    at; a request with a matching If-None-Match gets 304 Not Modified.
+    Cached statistics keep their ETag until the cache TTL expires.
+
     Args:
+        response: Response to add the ETag to
         period: Time period - "day", "week", or "month" (default: "week")
-        collector: Statistics collector (injected dependency)
+        bucket: Timeline bucket width - "5m", "1h", "1d" or "1w"
+            (default: "1h" for day, "1d" for week and month)
+        if_none_match: ETag of the client's copy
+        collector: Cached statistics collector (injected dependency)
 
     Returns:
         StatsResponse with:
@@ -101,11 +147,71 @@ async def get_stats(
     if period not in valid_periods:
         period = PeriodEnum.WEEK.value
 
-    # Get statistics from collector
-    stats = await collector.get_stats(period)
+    # Unknown buckets fall back to the period default
+    valid_buckets = [b.value for b in BucketEnum]
+    if bucket not in valid_buckets:
+        bucket = None
+
+    # Get statistics from collector, with the version they were computed at
+    stats, version = await collector.get_versioned_stats(period, bucket)
+    if version is None:
+        return stats
+
+    etag = make_etag(version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     return stats
 
 
+@app.get("/stats/stream")
+async def stream_stats(
+    period: Annotated[str, Query(description="Time period for statistics")] = PeriodEnum.WEEK.value,
+    bucket: Annotated[
+        str | None, Query(description="Timeline bucket width: 5m, 1h, 1d or 1w")
+    ] = None,
+    broadcaster: StatsBroadcaster = Depends(get_stats_broadcaster),  # noqa: B008
+) -> StreamingResponse:
+    """Stream statistics for dashboard as server-sent events
+
+    Statistics are computed once per interval for all subscribers of the same
+    period and bucket, and only changes are sent:
+
+    - `snapshot`: full StatsResponse, first event of the stream
+    - `delta`: StatsDelta with changed KPI cards, new or changed timeline
+      points (matched by date) and dates that left the window
+
+    Args:
+        period: Time period - "day", "week", or "month" (default: "week")
+        bucket: Timeline bucket width - "5m", "1h", "1d" or "1w"
+            (default: "1h" for day, "1d" for week and month)
+        broadcaster: Statistics broadcaster (injected dependency)
+
+    Returns:
+        text/event-stream response
+
+    Example stream:
+    ```
+    event: snapshot
+    data: {"kpi_metrics": [...], "timeline": [...]}
+
+    event: delta
+    data: {"kpi_metrics": null, "timeline": [{"date": "2025-10-17", "value": 530}], "removed_dates": []}
+    ```
+    """
+    if period not in [p.value for p in PeriodEnum]:
+        period = PeriodEnum.WEEK.value
+    if bucket not in [b.value for b in BucketEnum]:
+        bucket = None
+
+    return StreamingResponse(
+        broadcaster.subscribe(period, bucket),
+        media_type="text/event-stream",
+        # Disable caching and proxy buffering of the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/health")
 async def health_check() -> dict[str, str]:
     """Health check endpoint
@@ -119,20 +225,40 @@ async def health_check() -> dict[str, str]:
 @app.get("/api/chat/history/{user_id}", response_model=ChatHistoryResponse)
 async def get_chat_history(
     user_id: int,
-    limit: Annotated[int, Query(description="Maximum number of messages to return")] = 50,
+    response: Response,
+    limit: Annotated[
+        int, Query(ge=1, le=500, description="Maximum number of messages to return")
+    ] = 50,
+    before_id: Annotated[
+        int | None, Query(description="Return messages older than this message id")
+    ] = None,
+    after_id: Annotated[
+        int | None, Query(description="Return messages newer than this message id")
+    ] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
     chat_manager: ChatManager = Depends(get_chat_manager),  # noqa: B008
-) -> ChatHistoryResponse:
+) -> ChatHistoryResponse | Response:
     """Get chat history for a user
 
-    Returns recent messages ordered by created_at (oldest first for display).
+    Returns a page of messages ordered by id (oldest first for display).
+    Without cursors the newest messages are returned; pass `next_cursor` from
+    the response as `before_id` to scroll back (or as `after_id` when paging
+    forward with `after_id`).
+
+    The response carries an ETag derived from the database version; a request
+    with a matching If-None-Match gets 304 Not Modified without a query.
 
     Args:
         user_id: User ID
+        response: Response to add the ETag to
         limit: Maximum number of messages to return (default: 50)
+        before_id: Cursor for paging back to older messages
+        after_id: Cursor for paging forward to newer messages
+        if_none_match: ETag of the client's copy
         chat_manager: Chat manager (injected dependency)
 
     Returns:
-        ChatHistoryResponse with list of messages
+        ChatHistoryResponse with list of messages and next page cursor
 
     Example response:
     ```json
@@ -150,25 +276,106 @@ async def get_chat_history(
                 "content": "Hi! How can I help?",
                 "created_at": "2025-10-17T10:30:05"
             }
-        ]
+        ],
+        "next_cursor": 1
     }
     ```
     """
-    # Get recent messages from DB
-    messages_data = await chat_manager.message_repo.get_recent(user_id, limit)
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id")
+
+    etag = make_etag(await chat_manager.db.data_version())
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
 
-    # Convert to response model (reverse to show oldest first)
+    # Get page of messages from DB (already oldest first)
+    messages_data, next_cursor = await chat_manager.message_repo.get_page(
+        user_id, limit, before_id=before_id, after_id=after_id
+    )
+
+    # Convert to response model
     messages = [
         ChatHistoryMessage(
-            id=msg["id"],
-            role=msg["role"],
-            content=msg["content"],
-            created_at=msg["created_at"],
+            id=msg.id,
+            role=msg.role,
+            content=msg.content,
+            created_at=msg.created_at,
         )
-        for msg in reversed(messages_data)
+        for msg in messages_data
     ]
 
-    return ChatHistoryResponse(messages=messages)
+    set_etag(response, etag)
+    return ChatHistoryResponse(messages=messages, next_cursor=next_cursor)
+
+
+@app.get("/api/search", response_model=SearchResponse)
+async def search_messages(
+    q: Annotated[str, Query(min_length=1, max_length=500, description="Words to search for")],
+    user_id: Annotated[int | None, Query(description="Search only messages of this user")] = None,
+    limit: Annotated[
+        int,
+        Query(
+            ge=1,
+            le=MessageRepository.MAX_SEARCH_RESULTS,
+            description="Maximum number of results to return",
+        ),
+    ] = 20,
+    cursor: Annotated[str | None, Query(description="next_cursor of the previous page")] = None,
+    chat_manager: ChatManager = Depends(get_chat_manager),  # noqa: B008
+) -> SearchResponse:
+    """Full-text search over messages
+
+    Returns messages containing all words of `q`, most relevant (bm25) first,
+    with a snippet of each message where the matched words are wrapped in
+    `<mark></mark>`. Pass `next_cursor` from the response as `cursor` to get
+    the next page.
+
+    Args:
+        q: Words to search for
+        user_id: Optional user filter
+        limit: Maximum number of results (default: 20)
+        cursor: Cursor of the next page
+        chat_manager: Chat manager (injected dependency)
+
+    Returns:
+        SearchResponse with matching messages and next page cursor
+
+    Example response:
+    ```json
+    {
+        "results": [
+            {
+                "id": 123,
+                "user_id": 42,
+                "role": "user",
+                "snippet": "I want to eat <mark>pizza</mark> tonight",
+                "created_at": "2025-10-17 10:30:00",
+                "rank": -1.7
+            }
+        ],
+        "next_cursor": "-1.7:123"
+    }
+    ```
+    """
+    try:
+        hits, next_cursor = await chat_manager.message_repo.search(
+            q, limit, user_id=user_id, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    results = [
+        SearchHit(
+            id=hit.id,
+            user_id=hit.user_id,
+            role=hit.role,
+            snippet=hit.snippet,
+            created_at=hit.created_at,
+            rank=hit.rank,
+        )
+        for hit in hits
+    ]
+    return SearchResponse(results=results, next_cursor=next_cursor)
 
 
 @app.post("/api/chat/message", response_model=ChatResponse)
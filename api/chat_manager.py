@@ -4,7 +4,7 @@ import json
 import logging
 from pathlib import Path
 
-from api.sql_executor import SQLExecutor
+from api.sql_executor import QueryResult, SQLExecutor
 from llm.client import LLMClient
 from src.database.repository import DatabaseManager, MessageRepository, UserRepository
 
@@ -19,17 +19,22 @@ class ChatManager:
     - admin: Analytics mode with text-to-SQL pipeline
     """
 
-    def __init__(self, llm_client: LLMClient, db_manager: DatabaseManager):
+    def __init__(
+        self, llm_client: LLMClient, db_manager: DatabaseManager, compression_threshold: int = 0
+    ):
         """Initialize chat manager
 
         Args:
             llm_client: LLM client for AI interactions
             db_manager: Database manager for admin mode queries
+            compression_threshold: Compress stored messages of at least this many bytes
         """
         self.llm = llm_client
         self.db = db_manager
         self.sql_executor = SQLExecutor(db_manager)
-        self.message_repo = MessageRepository(db_manager)
+        self.message_repo = MessageRepository(
+            db_manager, compression_threshold=compression_threshold
+        )
         self.user_repo = UserRepository(db_manager)
 
         # Load text-to-SQL prompt
@@ -52,20 +57,6 @@ class ChatManager:
         """
         logger.info(f"Handling normal mode chat request for user {user_id}")
 
-        # Ensure user exists in DB (create if needed with generic name)
-        await self.user_repo.get_or_create(
-            chat_id=user_id,
-            username=None,
-            first_name=f"WebUser_{user_id}"
-        )
-
-        # Save user message to DB
-        await self.message_repo.create(
-            user_id=user_id,
-            role="user",
-            content=message
-        )
-
         # Simple system prompt for general assistant
         messages = [
             {
@@ -78,12 +69,8 @@ class ChatManager:
         # Get response from LLM
         response = await self.llm.send_message(messages)
 
-        # Save assistant response to DB
-        await self.message_repo.create(
-            user_id=user_id,
-            role="assistant",
-            content=response
-        )
+        # Save the exchange only after LLM succeeded
+        await self._save_exchange(user_id, message, response)
 
         return response
 
@@ -107,50 +94,46 @@ class ChatManager:
         """
         logger.info(f"Handling admin mode chat request for user {user_id}")
 
-        # Ensure user exists in DB (create if needed with generic name)
-        await self.user_repo.get_or_create(
-            chat_id=user_id,
-            username=None,
-            first_name=f"WebUser_{user_id}"
-        )
-
-        # Save user message to DB
-        await self.message_repo.create(
-            user_id=user_id,
-            role="user",
-            content=message
-        )
-
         # Step 1: Convert question to SQL
         sql_query = await self._question_to_sql(message)
         logger.info(f"Generated SQL: {sql_query}")
 
         # Step 2: Execute SQL query
         try:
-            results = await self.sql_executor.execute_safe(sql_query)
+            result = await self.sql_executor.execute_safe(sql_query)
         except Exception as e:
             error_msg = f"Ошибка выполнения SQL: {str(e)}"
             logger.error(error_msg)
-            # Save error message to DB
-            await self.message_repo.create(
-                user_id=user_id,
-                role="assistant",
-                content=error_msg
-            )
+            # Save question together with the error message
+            await self._save_exchange(user_id, message, error_msg)
             return error_msg, sql_query
 
         # Step 3: Generate natural language answer from results
-        answer = await self._results_to_answer(message, sql_query, results)
+        answer = await self._results_to_answer(message, sql_query, result)
 
-        # Save assistant response to DB
-        await self.message_repo.create(
-            user_id=user_id,
-            role="assistant",
-            content=answer
-        )
+        # Save question and answer to DB
+        await self._save_exchange(user_id, message, answer)
 
         return answer, sql_query
 
+    async def _save_exchange(self, user_id: int, message: str, answer: str) -> None:
+        """Save user message and assistant answer in one transaction
+
+        Also ensures the user exists (created with a generic name if needed).
+        Nothing is written if the pipeline failed before reaching this point.
+
+        Args:
+            user_id: User ID for tracking messages
+            message: User's message
+            answer: Assistant's answer
+        """
+        async with self.db.transaction():
+            await self.user_repo.get_or_create(
+                chat_id=user_id, username=None, first_name=f"WebUser_{user_id}"
+            )
+            await self.message_repo.create(user_id=user_id, role="user", content=message)
+            await self.message_repo.create(user_id=user_id, role="assistant", content=answer)
+
     async def _question_to_sql(self, question: str) -> str:
         """Convert natural language question to SQL query
 
@@ -175,25 +158,28 @@ class ChatManager:
 
         return sql
 
-    async def _results_to_answer(
-        self, question: str, sql: str, results: list[dict]
-    ) -> str:
+    async def _results_to_answer(self, question: str, sql: str, result: QueryResult) -> str:
         """Convert SQL results to natural language answer
 
         Args:
             question: Original user question
             sql: SQL query that was executed
-            results: Query results
+            result: Query results
 
         Returns:
             Natural language answer
         """
         # Format results for LLM
+        results = result.rows
         if not results:
             return "Запрос выполнен успешно, но не вернул результатов."
 
         # Limit results shown to LLM to avoid token limits
         results_to_show = results[:50]  # Max 50 rows
+        total_rows = str(len(results))
+        if result.truncated:
+            # Otherwise the LLM would report the cap as the real count
+            total_rows = f"больше {len(results)} (результат обрезан до {len(results)} строк)"
         results_str = json.dumps(results_to_show, ensure_ascii=False, indent=2)
 
         prompt = f"""На основе следующих данных из базы данных, ответь на вопрос пользователя.
@@ -205,7 +191,7 @@ SQL запрос: {sql}
 Результаты запроса:
 {results_str}
 
-Всего строк: {len(results)}
+Всего строк: {total_rows}
 
 Сформулируй понятный и информативный ответ на русском языке. Если результатов много, обобщи их.
 Не упоминай SQL запрос в ответе, только данные."""
@@ -214,4 +200,3 @@ SQL запрос: {sql}
 
         response = await self.llm.send_message(messages)
         return response
-
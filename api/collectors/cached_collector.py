@@ -0,0 +1,153 @@
+"""TTL cache with single-flight in front of a statistics collector"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from api.collectors.timeline import resolve_bucket
+from api.models import StatsResponse
+from api.protocols import StatCollectorProtocol
+
+logger = logging.getLogger("telegram_bot")
+
+CacheKey = tuple[str, str]
+
+
+@dataclass
+class _CacheEntry:
+    """Cached response with its expiry and background refresh times"""
+
+    response: StatsResponse
+    expires_at: float
+    refresh_at: float
+    version: str | None = None  # Data version the response was computed at
+
+
+class CachedStatCollector:
+    """Statistics collector caching responses per (period, bucket)
+
+    Every dashboard tab polls /stats, so identical requests arrive in bursts.
+    Responses are kept for `ttl_seconds`; concurrent misses for the same key
+    share one in-flight computation (single-flight) instead of recomputing
+    it per request. With `refresh_ahead_seconds` the entry is recomputed in
+    the background shortly before expiry while the cached response is still
+    served, so pollers don't wait for the recomputation at all.
+
+    With `version` every entry remembers the data version it was computed
+    at. Writes don't drop entries: a response stays valid for its TTL, and
+    its version is what /stats sends as the ETag, so a client never gets an
+    ETag newer than the data it describes.
+    """
+
+    def __init__(
+        self,
+        collector: StatCollectorProtocol,
+        ttl_seconds: float,
+        refresh_ahead_seconds: float = 0,
+        clock: Callable[[], float] = time.monotonic,
+        version: Callable[[str], Awaitable[str]] | None = None,
+    ):
+        """Initialize cache
+
+        Args:
+            collector: Collector computing the statistics
+            ttl_seconds: Lifetime of cached responses (0 - cache disabled)
+            refresh_ahead_seconds: Start background refresh this long before
+                expiry (0 - refresh only on miss)
+            clock: Monotonic time source in seconds
+            version: Returns current data version for a bucket width (None - TTL only)
+        """
+        self.collector = collector
+        self.ttl_seconds = ttl_seconds
+        self.refresh_ahead_seconds = min(refresh_ahead_seconds, ttl_seconds)
+        self._clock = clock
+        self._version = version
+        self._entries: dict[CacheKey, _CacheEntry] = {}
+        self._in_flight: dict[CacheKey, asyncio.Task[_CacheEntry]] = {}
+
+    async def get_stats(self, period: str, bucket: str | None = None) -> StatsResponse:
+        """Get statistics from cache or compute them once for all waiters
+
+        Args:
+            period: Time period ("day", "week", "month")
+            bucket: Timeline bucket width ("5m", "1h", "1d", "1w"), default depends on period
+
+        Returns:
+            StatsResponse, at most ttl_seconds old
+        """
+        response, _ = await self.get_versioned_stats(period, bucket)
+        return response
+
+    async def get_versioned_stats(
+        self, period: str, bucket: str | None = None
+    ) -> tuple[StatsResponse, str | None]:
+        """Get statistics together with the data version they were computed at
+
+        Args:
+            period: Time period ("day", "week", "month")
+            bucket: Timeline bucket width ("5m", "1h", "1d", "1w"), default depends on period
+
+        Returns:
+            Tuple (StatsResponse at most ttl_seconds old, its version or None
+            without `version`)
+        """
+        key = (period, resolve_bucket(period, bucket))
+        if self.ttl_seconds <= 0:
+            version = await self._read_version(key)
+            return await self.collector.get_stats(period, bucket), version
+
+        entry = self._entries.get(key)
+        now = self._clock()
+
+        if entry is None or now >= entry.expires_at:
+            # Shield: a cancelled request (client gone) must not cancel the
+            # computation other requests are waiting for
+            entry = await asyncio.shield(self._compute(key))
+        elif self.refresh_ahead_seconds > 0 and now >= entry.refresh_at:
+            self._compute(key)
+        return entry.response, entry.version
+
+    def clear(self) -> None:
+        """Drop all cached responses (in-flight computations are kept)"""
+        self._entries.clear()
+
+    async def _read_version(self, key: CacheKey) -> str | None:
+        """Current data version for key's bucket (None without `version`)"""
+        return await self._version(key[1]) if self._version is not None else None
+
+    def _compute(self, key: CacheKey) -> asyncio.Task[_CacheEntry]:
+        """Return the in-flight computation for key, starting it if needed"""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh(key))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return task
+
+    async def _refresh(self, key: CacheKey) -> _CacheEntry:
+        """Compute statistics for key and store them in the cache
+
+        The version is read before computing: a write during the computation
+        may already be in the response, but the version is never newer than it.
+        """
+        version = await self._read_version(key)
+        period, bucket = key
+        response = await self.collector.get_stats(period, bucket)
+        now = self._clock()
+        entry = _CacheEntry(
+            response=response,
+            expires_at=now + self.ttl_seconds,
+            refresh_at=now + self.ttl_seconds - self.refresh_ahead_seconds,
+            version=version,
+        )
+        self._entries[key] = entry
+        return entry
+
+    def _finish(self, key: CacheKey, task: asyncio.Task[_CacheEntry]) -> None:
+        """Forget finished computation, log failures nobody may be awaiting"""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Statistics refresh failed for {key}: {task.exception()}")
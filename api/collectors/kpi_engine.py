@@ -0,0 +1,187 @@
+"""Declarative KPI definitions evaluated with one conditional-aggregation query"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from src.database.repository import DatabaseManager
+
+
+@dataclass(frozen=True)
+class KPIDefinition:
+    """KPI compared between the current and the previous period
+
+    Rows are selected by `condition` and by `time_column` falling into the
+    period; `value` is aggregated over them with `aggregate`. All definitions
+    are evaluated by the same query, so a new KPI adds columns, not scans.
+
+    Example:
+        KPIDefinition("deleted", "Deleted Messages", "count",
+                      time_column="deleted_at_ts", condition="deleted_at IS NOT NULL")
+
+    Over pre-aggregated rows an average is weighted: SUM(value) / SUM(weight),
+    e.g. value="total_length", weight="message_count".
+    """
+
+    key: str  # Column alias, must be a valid SQL identifier
+    label: str  # Dashboard label, e.g. "Total Messages"
+    aggregate: Literal["count", "sum", "avg"]
+    time_column: str = "created_at_ts"  # Column matched against the period bounds
+    condition: str | None = "deleted_at IS NULL"  # SQL predicate selecting rows
+    value: str = "1"  # SQL expression aggregated by sum/avg
+    weight: str | None = None  # Weight of value for avg, plain AVG if None
+    value_format: str = "{:,}"  # Format of the integer value, e.g. "{} chars"
+
+
+@dataclass(frozen=True)
+class SnapshotKPI:
+    """KPI with one all-time value, evaluated as a scalar subquery"""
+
+    key: str  # Column alias, must be a valid SQL identifier
+    label: str  # Dashboard label, e.g. "Total Users"
+    query: str  # SELECT returning a single value
+    value_format: str = "{:,}"
+
+
+@dataclass
+class KPIValue:
+    """Evaluated KPI: value in current and previous period"""
+
+    definition: KPIDefinition | SnapshotKPI
+    current: float
+    previous: float | None  # None for snapshot KPIs
+
+
+@dataclass(frozen=True)
+class PeriodBounds:
+    """Current and previous period bounds in the units of the time columns
+
+    Unix seconds for the epoch columns of messages, hour numbers for
+    message_stats_hourly. The current period includes its end, the previous
+    one excludes it (it's the start of the current period).
+    """
+
+    current_start: int
+    current_end: int
+    previous_start: int
+    previous_end: int
+
+
+class KPIEngine:
+    """Evaluates KPI definitions with a single pass over one table
+
+    Every period KPI becomes two SUM/AVG(CASE WHEN ...) columns (current and
+    previous period); snapshot KPIs become scalar subqueries. The WHERE clause
+    keeps only rows inside the compared periods, so the time-range indexes
+    (or the primary key of a rollup) are used instead of a table scan.
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        definitions: Sequence[KPIDefinition | SnapshotKPI],
+        table: str = "messages",
+    ):
+        """Initialize engine
+
+        Args:
+            db_manager: Database manager instance
+            definitions: KPIs in the order they are returned
+            table: Table the period KPIs are aggregated over
+        """
+        self.db = db_manager
+        self.definitions = list(definitions)
+        self.table = table
+
+    def build_query(self, bounds: PeriodBounds) -> tuple[str, tuple[Any, ...]]:
+        """Build the aggregation query for given periods
+
+        Args:
+            bounds: Current and previous period bounds
+
+        Returns:
+            Tuple of (SQL query, parameters)
+        """
+        columns: list[str] = []
+        column_params: list[Any] = []
+        row_filters: dict[tuple[str | None, str], None] = {}
+
+        for definition in self.definitions:
+            if isinstance(definition, SnapshotKPI):
+                columns.append(f"({definition.query}) AS {definition.key}")
+                continue
+
+            periods = (
+                ("current", "<=", bounds.current_start, bounds.current_end),
+                ("previous", "<", bounds.previous_start, bounds.previous_end),
+            )
+            for suffix, end_operator, start, end in periods:
+                predicate = self._predicate(
+                    definition.condition, definition.time_column, end_operator
+                )
+                aggregate = self._aggregate(definition, predicate)
+                columns.append(f"{aggregate} AS {definition.key}_{suffix}")
+                # Weighted average repeats the predicate in numerator and denominator
+                column_params.extend((start, end) * aggregate.count(predicate))
+            row_filters[(definition.condition, definition.time_column)] = None
+
+        if not row_filters:
+            return f"SELECT {', '.join(columns)}", tuple(column_params)
+
+        where_params: list[Any] = []
+        where_terms: list[str] = []
+        for condition, time_column in row_filters:
+            where_terms.append(f"({self._predicate(condition, time_column, '<=')})")
+            where_params.extend((bounds.previous_start, bounds.current_end))
+
+        query = (
+            f"SELECT {', '.join(columns)}\n"
+            f"FROM {self.table}\n"
+            f"WHERE {' OR '.join(where_terms)}"
+        )
+        return query, (*column_params, *where_params)
+
+    async def evaluate(self, bounds: PeriodBounds) -> list[KPIValue]:
+        """Evaluate all KPIs with one query
+
+        Args:
+            bounds: Current and previous period bounds
+
+        Returns:
+            KPI values in definition order (missing values are 0)
+        """
+        query, params = self.build_query(bounds)
+        row = await self.db.fetchone(query, params) or {}
+
+        values: list[KPIValue] = []
+        for definition in self.definitions:
+            if isinstance(definition, SnapshotKPI):
+                values.append(KPIValue(definition, row.get(definition.key) or 0, None))
+            else:
+                values.append(
+                    KPIValue(
+                        definition,
+                        row.get(f"{definition.key}_current") or 0,
+                        row.get(f"{definition.key}_previous") or 0,
+                    )
+                )
+        return values
+
+    @staticmethod
+    def _predicate(condition: str | None, time_column: str, end_operator: str) -> str:
+        """SQL predicate: condition and time_column in [?, ?] or [?, ?)"""
+        time_range = f"{time_column} >= ? AND {time_column} {end_operator} ?"
+        return f"{condition} AND {time_range}" if condition else time_range
+
+    @staticmethod
+    def _aggregate(definition: KPIDefinition, predicate: str) -> str:
+        """SQL aggregate of definition over rows matching predicate"""
+        if definition.aggregate == "avg" and definition.weight:
+            return (
+                f"CAST(SUM(CASE WHEN {predicate} THEN {definition.value} ELSE 0 END) AS REAL)"
+                f" / NULLIF(SUM(CASE WHEN {predicate} THEN {definition.weight} ELSE 0 END), 0)"
+            )
+        if definition.aggregate == "avg":
+            return f"AVG(CASE WHEN {predicate} THEN {definition.value} END)"
+        value = "1" if definition.aggregate == "count" else definition.value
+        return f"SUM(CASE WHEN {predicate} THEN {value} ELSE 0 END)"
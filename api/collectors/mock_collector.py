@@ -1,9 +1,15 @@
 """Mock implementation of statistics collector with test data"""
 
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from api.models import KPIMetric, StatsResponse, TimelinePoint, TrendEnum
+from api.collectors.timeline import (
+    format_bucket_start,
+    get_bucket_starts,
+    get_timeline_window,
+    resolve_bucket,
+)
+from api.models import BUCKET_SECONDS, KPIMetric, StatsResponse, TimelinePoint, TrendEnum
 
 
 class MockStatCollector:
@@ -87,65 +93,39 @@ class MockStatCollector:
 
         return [users_metric, messages_metric, deleted_metric, length_metric]
 
-    def _generate_timeline(self, period: str) -> list[TimelinePoint]:
+    def _generate_timeline(self, period: str, bucket: str) -> list[TimelinePoint]:
         """Generate timeline data based on period
 
         Args:
             period: "day", "week", or "month"
+            bucket: Bucket width ("5m", "1h", "1d", "1w")
 
         Returns:
             List of TimelinePoint objects
         """
-        today = datetime.now()
-        points: list[TimelinePoint] = []
-
-        if period == "day":
-            # 24 hours (hourly data)
-            for hour in range(24):
-                dt = today.replace(hour=hour, minute=0, second=0, microsecond=0)
-                value = random.randint(20, 80)  # Messages per hour
-                points.append(
-                    TimelinePoint(
-                        date=dt.strftime("%Y-%m-%dT%H:00:00"),
-                        value=value,
-                    )
-                )
-        elif period == "week":
-            # 7 days (daily data)
-            for day_offset in range(7):
-                dt = today - timedelta(days=6 - day_offset)
-                value = random.randint(400, 800)  # Messages per day
-                points.append(
-                    TimelinePoint(
-                        date=dt.strftime("%Y-%m-%d"),
-                        value=value,
-                    )
-                )
-        else:  # month
-            # 30 days (daily data)
-            for day_offset in range(30):
-                dt = today - timedelta(days=29 - day_offset)
-                value = random.randint(400, 900)  # Messages per day
-                points.append(
-                    TimelinePoint(
-                        date=dt.strftime("%Y-%m-%d"),
-                        value=value,
-                    )
-                )
-
-        return points
-
-    async def get_stats(self, period: str) -> StatsResponse:
+        start, end = get_timeline_window(period, datetime.now())
+        # 20-80 messages per hour, scaled to the bucket width
+        hours = BUCKET_SECONDS[bucket] / 3600
+        return [
+            TimelinePoint(
+                date=format_bucket_start(bucket_start, bucket),
+                value=random.randint(int(20 * hours), max(int(80 * hours), 1)),
+            )
+            for bucket_start in get_bucket_starts(start, end, bucket)
+        ]
+
+    async def get_stats(self, period: str, bucket: str | None = None) -> StatsResponse:
         """Get mock statistics for given period
 
         Args:
             period: Time period ("day", "week", "month")
+            bucket: Timeline bucket width ("5m", "1h", "1d", "1w"), default depends on period
 
         Returns:
             StatsResponse with generated test data
         """
         kpi_metrics = self._generate_kpi_metrics()
-        timeline = self._generate_timeline(period)
+        timeline = self._generate_timeline(period, resolve_bucket(period, bucket))
 
         return StatsResponse(
             kpi_metrics=kpi_metrics,
@@ -1,13 +1,59 @@
 """Real implementation of statistics collector with database queries"""
 
+import calendar
 import logging
-from datetime import datetime, timedelta
-
-from api.models import KPIMetric, StatsResponse, TimelinePoint, TrendEnum
+from datetime import UTC, datetime, timedelta
+
+from api.collectors.kpi_engine import KPIDefinition, KPIEngine, PeriodBounds, SnapshotKPI
+from api.collectors.timeline import (
+    format_bucket_start,
+    get_bucket_starts,
+    get_timeline_window,
+    resolve_bucket,
+)
+from api.models import BUCKET_SECONDS, KPIMetric, StatsResponse, TimelinePoint, TrendEnum
+from src.database.message_stats import HOUR_SECONDS
 from src.database.repository import DatabaseManager
 
 logger = logging.getLogger("telegram_bot")
 
+# KPI cards of the dashboard, evaluated together by one query over the
+# hourly rollup (message_stats_hourly), periods are ranges of hour numbers
+DASHBOARD_KPIS: list[KPIDefinition | SnapshotKPI] = [
+    # We don't track user change over time periods
+    SnapshotKPI(
+        key="users",
+        label="Total Users",
+        query="SELECT COUNT(*) FROM users WHERE deleted_at IS NULL",
+    ),
+    KPIDefinition(
+        key="messages",
+        label="Total Messages",
+        aggregate="sum",
+        time_column="hour",
+        condition=None,
+        value="message_count",
+    ),
+    KPIDefinition(
+        key="deleted",
+        label="Deleted Messages",
+        aggregate="sum",
+        time_column="hour",
+        condition=None,
+        value="deleted_count",
+    ),
+    KPIDefinition(
+        key="avg_length",
+        label="Avg Message Length",
+        aggregate="avg",
+        time_column="hour",
+        condition=None,
+        value="total_length",
+        weight="message_count",
+        value_format="{} chars",
+    ),
+]
+
 
 class RealStatCollector:
     """Real statistics collector with database queries
@@ -22,6 +68,7 @@ class RealStatCollector:
             db_manager: Database manager instance
         """
         self.db = db_manager
+        self.kpi_engine = KPIEngine(db_manager, DASHBOARD_KPIS, table="message_stats_hourly")
 
     def _determine_trend(self, change: float) -> str:
         """Determine trend based on change percentage
@@ -50,16 +97,17 @@ class RealStatCollector:
         """
         return f"{int(value):,}"
 
-    def _get_period_dates(self, period: str) -> tuple[str, str, str, str]:
+    def _get_period_dates(self, period: str) -> PeriodBounds:
         """Calculate date ranges for current and previous periods
 
         Args:
             period: "day", "week", or "month"
 
         Returns:
-            Tuple of (current_start, current_end, previous_start, previous_end)
+            Current and previous period bounds as hour numbers, the current
+            period includes the hour in progress
         """
-        now = datetime.now()
+        now = datetime.now(UTC)
 
         if period == "day":
             # Current: today, Previous: yesterday
@@ -80,294 +128,126 @@ class RealStatCollector:
             previous_start = current_start - timedelta(days=30)
             previous_end = current_start
 
-        return (
-            current_start.isoformat(),
-            current_end.isoformat(),
-            previous_start.isoformat(),
-            previous_end.isoformat(),
-        )
-
-    async def _get_metric_with_change(
-        self, label: str, current_query: str, previous_query: str, format_value: callable
-    ) -> KPIMetric:
-        """Get metric with calculated change percentage
-
-        Args:
-            label: Metric label
-            current_query: SQL query for current period
-            previous_query: SQL query for previous period
-            format_value: Function to format the value
-
-        Returns:
-            KPIMetric with value, change, and trend
-        """
-        # Get current value
-        current_result = await self.db.fetchone(current_query)
-        current_value = (
-            list(current_result.values())[0] if current_result else 0
-        )
-
-        # Get previous value
-        previous_result = await self.db.fetchone(previous_query)
-        previous_value = (
-            list(previous_result.values())[0] if previous_result else 0
-        )
-
-        # Calculate change percentage
-        if previous_value and previous_value > 0:
-            change = ((current_value - previous_value) / previous_value) * 100
-        else:
-            change = 0.0
-
-        return KPIMetric(
-            label=label,
-            value=format_value(current_value),
-            change=round(change, 1),
-            trend=self._determine_trend(change),
+        return PeriodBounds(
+            current_start=self._to_hour(current_start),
+            current_end=self._to_hour(current_end),
+            previous_start=self._to_hour(previous_start),
+            previous_end=self._to_hour(previous_end),
         )
 
     async def _generate_kpi_metrics(self, period: str) -> list[KPIMetric]:
-        """Generate 4 KPI metrics with real data from database
+        """Generate KPI metrics with real data from database
+
+        All metrics, for both the current and the previous period, come from
+        one query built by KPIEngine.
 
         Args:
             period: Time period ("day", "week", "month")
 
         Returns:
-            List of 4 KPIMetric objects
+            List of KPIMetric objects in DASHBOARD_KPIS order
         """
-        current_start, current_end, previous_start, previous_end = (
-            self._get_period_dates(period)
-        )
-
-        # Total Users (active users) - all time count
-        total_users = await self.db.fetchone(
-            "SELECT COUNT(*) as count FROM users WHERE deleted_at IS NULL"
-        )
-        users_count = total_users["count"] if total_users else 0
-
-        # Total Messages (in current period)
-        total_messages_current = await self.db.fetchone(
-            """
-            SELECT COUNT(*) as count FROM messages
-            WHERE deleted_at IS NULL
-            AND created_at >= ? AND created_at <= ?
-            """,
-            (current_start, current_end),
-        )
-        messages_current = (
-            total_messages_current["count"] if total_messages_current else 0
-        )
-
-        total_messages_previous = await self.db.fetchone(
-            """
-            SELECT COUNT(*) as count FROM messages
-            WHERE deleted_at IS NULL
-            AND created_at >= ? AND created_at < ?
-            """,
-            (previous_start, previous_end),
-        )
-        messages_previous = (
-            total_messages_previous["count"] if total_messages_previous else 0
-        )
-
-        if messages_previous > 0:
-            messages_change = (
-                (messages_current - messages_previous) / messages_previous
-            ) * 100
-        else:
-            messages_change = 0.0
-
-        messages_metric = KPIMetric(
-            label="Total Messages",
-            value=self._format_number(messages_current),
-            change=round(messages_change, 1),
-            trend=self._determine_trend(messages_change),
-        )
-
-        # Deleted Messages (all time)
-        deleted_current = await self.db.fetchone(
-            """
-            SELECT COUNT(*) as count FROM messages
-            WHERE deleted_at IS NOT NULL
-            AND deleted_at >= ? AND deleted_at <= ?
-            """,
-            (current_start, current_end),
-        )
-        deleted_count_current = deleted_current["count"] if deleted_current else 0
-
-        deleted_previous = await self.db.fetchone(
-            """
-            SELECT COUNT(*) as count FROM messages
-            WHERE deleted_at IS NOT NULL
-            AND deleted_at >= ? AND deleted_at < ?
-            """,
-            (previous_start, previous_end),
-        )
-        deleted_count_previous = (
-            deleted_previous["count"] if deleted_previous else 0
-        )
-
-        if deleted_count_previous > 0:
-            deleted_change = (
-                (deleted_count_current - deleted_count_previous)
-                / deleted_count_previous
-            ) * 100
-        else:
-            deleted_change = 0.0
-
-        deleted_metric = KPIMetric(
-            label="Deleted Messages",
-            value=self._format_number(deleted_count_current),
-            change=round(deleted_change, 1),
-            trend=self._determine_trend(deleted_change),
-        )
-
-        # Average Message Length (in current period)
-        avg_length_current = await self.db.fetchone(
-            """
-            SELECT AVG(length) as avg_length FROM messages
-            WHERE deleted_at IS NULL
-            AND created_at >= ? AND created_at <= ?
-            """,
-            (current_start, current_end),
-        )
-        avg_current = (
-            avg_length_current["avg_length"]
-            if avg_length_current and avg_length_current["avg_length"] is not None
-            else 0
-        )
-
-        avg_length_previous = await self.db.fetchone(
-            """
-            SELECT AVG(length) as avg_length FROM messages
-            WHERE deleted_at IS NULL
-            AND created_at >= ? AND created_at < ?
-            """,
-            (previous_start, previous_end),
-        )
-        avg_previous = (
-            avg_length_previous["avg_length"]
-            if avg_length_previous and avg_length_previous["avg_length"] is not None
-            else 0
-        )
-
-        if avg_previous and avg_previous > 0:
-            avg_change = ((avg_current - avg_previous) / avg_previous) * 100
-        else:
-            avg_change = 0.0
-
-        avg_metric = KPIMetric(
-            label="Avg Message Length",
-            value=f"{int(avg_current)} chars" if avg_current else "0 chars",
-            change=round(avg_change, 1),
-            trend=self._determine_trend(avg_change),
-        )
-
-        # Use total users count for first metric
-        users_metric_final = KPIMetric(
-            label="Total Users",
-            value=self._format_number(users_count),
-            change=0.0,  # We don't track user change over time periods
-            trend="stable",
-        )
-
-        return [users_metric_final, messages_metric, deleted_metric, avg_metric]
+        values = await self.kpi_engine.evaluate(self._get_period_dates(period))
+
+        metrics: list[KPIMetric] = []
+        for kpi in values:
+            # No previous value (or all-time snapshot) - no change
+            change = (kpi.current - kpi.previous) / kpi.previous * 100 if kpi.previous else 0.0
+            metrics.append(
+                KPIMetric(
+                    label=kpi.definition.label,
+                    value=kpi.definition.value_format.format(int(kpi.current)),
+                    change=round(change, 1),
+                    trend=self._determine_trend(change),
+                )
+            )
+        return metrics
 
-    async def _generate_timeline(self, period: str) -> list[TimelinePoint]:
+    async def _generate_timeline(self, period: str, bucket: str) -> list[TimelinePoint]:
         """Generate timeline data based on period with real database data
 
+        Counts of all buckets come from one GROUP BY query over the timeline
+        window; buckets without messages are filled with zeros here. Buckets
+        of an hour and wider are summed from message_stats_hourly, only 5m
+        buckets need the messages themselves.
+
         Args:
             period: "day", "week", or "month"
+            bucket: Bucket width ("5m", "1h", "1d", "1w")
 
         Returns:
             List of TimelinePoint objects
         """
-        now = datetime.now()
-        points: list[TimelinePoint] = []
-
-        if period == "day":
-            # 24 hours (hourly data)
-            for hour in range(24):
-                start_time = now.replace(
-                    hour=hour, minute=0, second=0, microsecond=0
-                )
-                end_time = start_time + timedelta(hours=1)
-
-                result = await self.db.fetchone(
-                    """
-                    SELECT COUNT(*) as count FROM messages
-                    WHERE deleted_at IS NULL
-                    AND created_at >= ? AND created_at < ?
-                    """,
-                    (start_time.isoformat(), end_time.isoformat()),
-                )
-                count = result["count"] if result else 0
-
-                points.append(
-                    TimelinePoint(
-                        date=start_time.strftime("%Y-%m-%dT%H:00:00"), value=count
-                    )
-                )
-        elif period == "week":
-            # 7 days (daily data)
-            for day_offset in range(7):
-                day = now - timedelta(days=6 - day_offset)
-                start_time = day.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_time = start_time + timedelta(days=1)
-
-                result = await self.db.fetchone(
-                    """
-                    SELECT COUNT(*) as count FROM messages
-                    WHERE deleted_at IS NULL
-                    AND created_at >= ? AND created_at < ?
-                    """,
-                    (start_time.isoformat(), end_time.isoformat()),
-                )
-                count = result["count"] if result else 0
-
-                points.append(
-                    TimelinePoint(date=start_time.strftime("%Y-%m-%d"), value=count)
-                )
-        else:  # month
-            # 30 days (daily data)
-            for day_offset in range(30):
-                day = now - timedelta(days=29 - day_offset)
-                start_time = day.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_time = start_time + timedelta(days=1)
-
-                result = await self.db.fetchone(
-                    """
-                    SELECT COUNT(*) as count FROM messages
-                    WHERE deleted_at IS NULL
-                    AND created_at >= ? AND created_at < ?
-                    """,
-                    (start_time.isoformat(), end_time.isoformat()),
-                )
-                count = result["count"] if result else 0
-
-                points.append(
-                    TimelinePoint(date=start_time.strftime("%Y-%m-%d"), value=count)
-                )
-
-        return points
-
-    async def get_stats(self, period: str) -> StatsResponse:
+        start, end = get_timeline_window(period, datetime.now(UTC))
+        bucket_starts = get_bucket_starts(start, end, bucket)
+
+        # Epoch columns and the window are UTC, days start at UTC midnight
+        start_epoch = self._to_epoch(start)
+        if BUCKET_SECONDS[bucket] >= HOUR_SECONDS:
+            rows = await self.db.fetchall(
+                """
+                SELECT (hour * ? - ?) / ? AS bucket,
+                       SUM(message_count) AS count
+                FROM message_stats_hourly
+                WHERE hour >= ? AND hour < ?
+                GROUP BY bucket
+                """,
+                (
+                    HOUR_SECONDS,
+                    start_epoch,
+                    BUCKET_SECONDS[bucket],
+                    self._to_hour(start),
+                    self._to_hour(end),
+                ),
+            )
+        else:
+            rows = await self.db.fetchall(
+                """
+                SELECT (created_at_ts - ?) / ? AS bucket,
+                       COUNT(*) AS count
+                FROM messages
+                WHERE deleted_at IS NULL
+                AND created_at_ts >= ? AND created_at_ts < ?
+                GROUP BY bucket
+                """,
+                (start_epoch, BUCKET_SECONDS[bucket], start_epoch, self._to_epoch(end)),
+            )
+        counts = {row["bucket"]: row["count"] for row in rows}
+
+        return [
+            TimelinePoint(
+                date=format_bucket_start(bucket_start, bucket), value=counts.get(index, 0)
+            )
+            for index, bucket_start in enumerate(bucket_starts)
+        ]
+
+    @staticmethod
+    def _to_epoch(value: datetime) -> int:
+        """Unix seconds of UTC datetime as stored in messages.created_at_ts"""
+        return calendar.timegm(value.timetuple())
+
+    @classmethod
+    def _to_hour(cls, value: datetime) -> int:
+        """Hour number of datetime as stored in message_stats_hourly.hour"""
+        return cls._to_epoch(value) // HOUR_SECONDS
+
+    async def get_stats(self, period: str, bucket: str | None = None) -> StatsResponse:
         """Get real statistics from database for given period
 
         Args:
             period: Time period ("day", "week", "month")
+            bucket: Timeline bucket width ("5m", "1h", "1d", "1w"), default depends on period
 
         Returns:
             StatsResponse with real data from database
         """
-        logger.info(f"Fetching real statistics for period: {period}")
+        bucket = resolve_bucket(period, bucket)
+        logger.info(f"Fetching real statistics for period: {period}, bucket: {bucket}")
 
         kpi_metrics = await self._generate_kpi_metrics(period)
-        timeline = await self._generate_timeline(period)
+        timeline = await self._generate_timeline(period, bucket)
 
-        logger.info(
-            f"Generated {len(kpi_metrics)} KPI metrics and {len(timeline)} timeline points"
-        )
+        logger.info(f"Generated {len(kpi_metrics)} KPI metrics and {len(timeline)} timeline points")
 
         return StatsResponse(
             kpi_metrics=kpi_metrics,
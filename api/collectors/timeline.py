@@ -0,0 +1,76 @@
+"""Timeline window and bucket helpers shared by statistics collectors"""
+
+from datetime import datetime, timedelta
+
+from api.models import BUCKET_SECONDS, DEFAULT_BUCKETS, BucketEnum, PeriodEnum
+
+# Days covered by the timeline of each period (ending today)
+_PERIOD_DAYS = {
+    PeriodEnum.DAY.value: 1,
+    PeriodEnum.WEEK.value: 7,
+    PeriodEnum.MONTH.value: 30,
+}
+
+
+def resolve_bucket(period: str, bucket: str | None) -> str:
+    """Get bucket width to use for period
+
+    Args:
+        period: "day", "week", or "month"
+        bucket: Requested bucket ("5m", "1h", "1d", "1w") or None
+
+    Returns:
+        Requested bucket, or the default bucket of the period if it's not given
+    """
+    if bucket is not None and bucket in BUCKET_SECONDS:
+        return bucket
+    return DEFAULT_BUCKETS.get(period, BucketEnum.DAY.value)
+
+
+def get_timeline_window(period: str, now: datetime) -> tuple[datetime, datetime]:
+    """Calculate timeline bounds for period
+
+    The window ends at the next midnight and covers 1 (day), 7 (week) or
+    30 (month) calendar days including today.
+
+    Args:
+        period: "day", "week", or "month"
+        now: Current time
+
+    Returns:
+        Tuple of (start, end), end is exclusive
+    """
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    days = _PERIOD_DAYS.get(period, _PERIOD_DAYS[PeriodEnum.MONTH.value])
+    return today - timedelta(days=days - 1), today + timedelta(days=1)
+
+
+def get_bucket_starts(start: datetime, end: datetime, bucket: str) -> list[datetime]:
+    """Split timeline window into buckets
+
+    Args:
+        start: Window start
+        end: Window end (exclusive)
+        bucket: Bucket width ("5m", "1h", "1d", "1w")
+
+    Returns:
+        Start of every bucket; the last bucket may extend past the window end
+    """
+    width = timedelta(seconds=BUCKET_SECONDS[bucket])
+    count = -(-(end - start) // width)
+    return [start + width * index for index in range(count)]
+
+
+def format_bucket_start(start: datetime, bucket: str) -> str:
+    """Format bucket start as timeline point date
+
+    Args:
+        start: Bucket start
+        bucket: Bucket width
+
+    Returns:
+        "YYYY-MM-DD" for daily and wider buckets, "YYYY-MM-DDTHH:MM:00" otherwise
+    """
+    if BUCKET_SECONDS[bucket] < BUCKET_SECONDS[BucketEnum.DAY.value]:
+        return start.strftime("%Y-%m-%dT%H:%M:00")
+    return start.strftime("%Y-%m-%d")
@@ -1,53 +1,158 @@
-"""Dependency injection for FastAPI"""
+"""Dependency injection for FastAPI
+
+Shared resources are built once per application in the lifespan handler
+(see api_main.lifespan) and stored in app.state; dependencies only hand
+them out to request handlers.
+"""
+
+import logging
+from dataclasses import dataclass
+
+from fastapi import Request
 
 from api.chat_manager import ChatManager
+from api.collectors.cached_collector import CachedStatCollector
 from api.collectors.real_collector import RealStatCollector
-from api.protocols import StatCollectorProtocol
+from api.etag import get_stats_version
+from api.models import PeriodEnum
+from api.stats_stream import StatsBroadcaster
 from llm.client import LLMClient
 from src.config import Config
 from src.database.repository import DatabaseManager
 
+logger = logging.getLogger("telegram_bot")
+
+
+@dataclass
+class APIResources:
+    """Resources shared by all requests for the application lifetime
+
+    Attributes:
+        config: Application configuration
+        db_manager: Database manager (connections and reader pool)
+        llm_client: LLM client (keeps its HTTP connection pool)
+        chat_manager: Chat manager for /api/chat endpoints
+        stat_collector: Cached statistics collector for /stats
+        stats_broadcaster: Statistics broadcaster for /stats/stream
+    """
+
+    config: Config
+    db_manager: DatabaseManager
+    llm_client: LLMClient
+    chat_manager: ChatManager
+    stat_collector: CachedStatCollector
+    stats_broadcaster: StatsBroadcaster
+
+    @classmethod
+    async def create(cls, config: Config) -> "APIResources":
+        """Open database connections and build shared services
+
+        Args:
+            config: Application configuration
+
+        Returns:
+            Initialized resources
+        """
+        db_manager = DatabaseManager.from_config(config)
+        await db_manager.init()
+
+        llm_client = LLMClient(
+            api_key=config.openrouter_api_key,
+            base_url=config.openrouter_base_url,
+            model=config.openrouter_model,
+        )
+
+        # Entries remember the data version they were computed at, /stats
+        # sends it as the ETag
+        stat_collector = CachedStatCollector(
+            RealStatCollector(db_manager),
+            ttl_seconds=config.stats_cache_ttl_seconds,
+            refresh_ahead_seconds=config.stats_cache_refresh_ahead_seconds,
+            version=lambda bucket: get_stats_version(db_manager, bucket),
+        )
+
+        # The broadcaster computes statistics itself once per interval, so it
+        # uses RealStatCollector without the response cache
+        stats_broadcaster = StatsBroadcaster(
+            RealStatCollector(db_manager),
+            interval_seconds=config.stats_stream_interval_seconds,
+        )
+
+        return cls(
+            config=config,
+            db_manager=db_manager,
+            llm_client=llm_client,
+            chat_manager=ChatManager(llm_client, db_manager, config.message_compression_threshold),
+            stat_collector=stat_collector,
+            stats_broadcaster=stats_broadcaster,
+        )
 
-async def get_stat_collector() -> StatCollectorProtocol:
+    async def warm_up(self) -> None:
+        """Fill the statistics cache for the dashboard's default period
+
+        The first dashboard request then doesn't pay for cold SQLite pages.
+        Failures are logged, the API still starts.
+        """
+        try:
+            await self.stat_collector.get_stats(PeriodEnum.WEEK.value)
+        except Exception as e:
+            logger.warning(f"API warm-up failed: {e}")
+
+    async def close(self) -> None:
+        """Stop streams, flush pending writes and close connections"""
+        await self.stats_broadcaster.close()
+        await self.chat_manager.user_repo.flush_last_accessed()
+        await self.llm_client.close()
+        await self.db_manager.close()
+
+
+def get_resources(request: Request) -> APIResources:
+    """Get resources created by the lifespan handler
+
+    Args:
+        request: Current request
+
+    Returns:
+        APIResources of the application
+    """
+    resources: APIResources = request.app.state.resources
+    return resources
+
+
+async def get_stat_collector(request: Request) -> CachedStatCollector:
     """Get statistics collector instance
 
-    Now returns RealStatCollector that fetches data from actual database.
+    Returns RealStatCollector that fetches data from actual database, wrapped
+    in a TTL cache shared by all requests.
+
+    Args:
+        request: Current request
 
     Returns:
-        StatCollectorProtocol implementation
+        CachedStatCollector shared by all requests
     """
-    # Load config to get database path
-    config = Config.load()
+    return get_resources(request).stat_collector
+
 
-    # Create database manager
-    db_manager = DatabaseManager(config.database_path)
-    await db_manager.init()
+async def get_stats_broadcaster(request: Request) -> StatsBroadcaster:
+    """Get statistics broadcaster for /stats/stream
 
-    # Return real collector
-    return RealStatCollector(db_manager)
+    Args:
+        request: Current request
+
+    Returns:
+        StatsBroadcaster shared by all subscribers
+    """
+    return get_resources(request).stats_broadcaster
 
 
-async def get_chat_manager() -> ChatManager:
+async def get_chat_manager(request: Request) -> ChatManager:
     """Get chat manager instance
 
-    Creates LLMClient and DatabaseManager for ChatManager.
+    Args:
+        request: Current request
 
     Returns:
-        ChatManager instance
+        ChatManager shared by all requests
     """
-    # Load config
-    config = Config.load()
-
-    # Create LLM client
-    llm_client = LLMClient(
-        api_key=config.openrouter_api_key,
-        base_url=config.openrouter_base_url,
-        model=config.openrouter_model,
-    )
-
-    # Create database manager
-    db_manager = DatabaseManager(config.database_path)
-    await db_manager.init()
-
-    # Create and return chat manager
-    return ChatManager(llm_client, db_manager)
+    return get_resources(request).chat_manager
@@ -0,0 +1,66 @@
+"""ETag helpers for conditional GET (If-None-Match -> 304 Not Modified)"""
+
+import time
+from datetime import UTC, datetime
+
+from fastapi import Response
+
+from api.models import BUCKET_SECONDS
+from src.database.message_stats import HOUR_SECONDS
+from src.database.repository import DatabaseManager
+
+# Clients must revalidate, but may keep the body and reuse it on 304
+CACHE_CONTROL = "no-cache"
+
+
+async def get_stats_version(db_manager: DatabaseManager, bucket: str) -> str:
+    """Version of /stats responses with a timeline of `bucket` width
+
+    Statistics depend on the data and on the current time, so both are part
+    of the token. The time is the start of the current bucket in UTC, at
+    most an hour long: KPI period bounds are whole hours.
+
+    Args:
+        db_manager: Database manager instance
+        bucket: Resolved bucket width ("5m", "1h", "1d", "1w")
+
+    Returns:
+        Version string, equal for identical statistics
+    """
+    seconds = min(BUCKET_SECONDS[bucket], HOUR_SECONDS)
+    now = int(time.time())
+    slot = datetime.fromtimestamp(now - now % seconds, UTC)
+    return f"{await db_manager.data_version()}-{slot:%Y%m%d%H%M}"
+
+
+def make_etag(version: str) -> str:
+    """Format version as a strong ETag value"""
+    return f'"{version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check If-None-Match header against ETag (weak comparison, RFC 9110)
+
+    Args:
+        if_none_match: Header value, e.g. '"v1", W/"v2"' or '*'
+        etag: Current ETag of the resource
+
+    Returns:
+        True if the client's copy is current
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    """Empty 304 response for a client holding the current version"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def set_etag(response: Response, etag: str) -> None:
+    """Add ETag and revalidation headers to a 200 response"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
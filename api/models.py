@@ -14,6 +14,31 @@ class PeriodEnum(str, Enum):
     MONTH = "month"
 
 
+class BucketEnum(str, Enum):
+    """Width of one timeline bucket"""
+
+    FIVE_MINUTES = "5m"
+    HOUR = "1h"
+    DAY = "1d"
+    WEEK = "1w"
+
+
+# Bucket width in seconds
+BUCKET_SECONDS: dict[str, int] = {
+    BucketEnum.FIVE_MINUTES.value: 5 * 60,
+    BucketEnum.HOUR.value: 60 * 60,
+    BucketEnum.DAY.value: 24 * 60 * 60,
+    BucketEnum.WEEK.value: 7 * 24 * 60 * 60,
+}
+
+# Bucket used for the timeline when none is requested
+DEFAULT_BUCKETS: dict[str, str] = {
+    PeriodEnum.DAY.value: BucketEnum.HOUR.value,
+    PeriodEnum.WEEK.value: BucketEnum.DAY.value,
+    PeriodEnum.MONTH.value: BucketEnum.DAY.value,
+}
+
+
 class TrendEnum(str, Enum):
     """Trend direction for metrics"""
 
@@ -52,7 +77,7 @@ class TimelinePoint:
     }
     """
 
-    date: str  # Date in ISO format (YYYY-MM-DD)
+    date: str  # Bucket start: YYYY-MM-DD, or YYYY-MM-DDTHH:MM:00 for sub-day buckets
     value: int  # Number of messages
 
 
@@ -71,6 +96,26 @@ class StatsResponse:
     timeline: list[TimelinePoint]  # Timeline graph data
 
 
+@dataclass
+class StatsDelta:
+    """Changes of StatsResponse pushed by /stats/stream after the snapshot
+
+    Timeline points are matched by date: the client replaces or adds the
+    points from `timeline` and drops the ones in `removed_dates`.
+
+    Example JSON:
+    {
+        "kpi_metrics": null,
+        "timeline": [{"date": "2025-10-17", "value": 530}],
+        "removed_dates": []
+    }
+    """
+
+    kpi_metrics: list[KPIMetric] | None  # All KPI cards if any changed, else null
+    timeline: list[TimelinePoint]  # New or changed timeline points
+    removed_dates: list[str]  # Points that left the timeline window
+
+
 # Chat API Models
 
 
@@ -134,8 +179,48 @@ class ChatHistoryResponse(BaseModel):
 
     Example JSON:
     {
-        "messages": [...]
+        "messages": [...],
+        "next_cursor": 101
     }
     """
 
     messages: list[ChatHistoryMessage]
+    # Pass as before_id (or after_id, when paging forward) to get the next page
+    next_cursor: int | None = None
+
+
+class SearchHit(BaseModel):
+    """Message matched by full-text search
+
+    Example JSON:
+    {
+        "id": 123,
+        "user_id": 42,
+        "role": "user",
+        "snippet": "I want to eat <mark>pizza</mark> tonight",
+        "created_at": "2025-10-17 10:30:00",
+        "rank": -1.7
+    }
+    """
+
+    id: int
+    user_id: int
+    role: str
+    snippet: str  # Matched terms wrapped in <mark></mark>, content is not escaped
+    created_at: str
+    rank: float  # bm25 score, lower is more relevant
+
+
+class SearchResponse(BaseModel):
+    """Page of search results, most relevant first
+
+    Example JSON:
+    {
+        "results": [...],
+        "next_cursor": "-1.2:123"
+    }
+    """
+
+    results: list[SearchHit]
+    # Pass as cursor to get the next page
+    next_cursor: str | None = None
@@ -12,11 +12,12 @@ class StatCollectorProtocol(Protocol):
     Implementations can be Mock (test data) or Real (from database).
     """
 
-    async def get_stats(self, period: str) -> StatsResponse:
+    async def get_stats(self, period: str, bucket: str | None = None) -> StatsResponse:
         """Get statistics for given period
 
         Args:
             period: Time period ("day", "week", "month")
+            bucket: Timeline bucket width ("5m", "1h", "1d", "1w"), default depends on period
 
         Returns:
             StatsResponse with KPI metrics and timeline data
@@ -2,18 +2,34 @@
 
 import logging
 import re
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import Any
 
+from src.database.records import decompress_content
 from src.database.repository import DatabaseManager
 
 logger = logging.getLogger("telegram_bot")
 
 
+@dataclass
+class QueryResult:
+    """Rows returned by an admin query"""
+
+    rows: list[dict[str, Any]]
+    truncated: bool = False  # The query had more than MAX_ROWS rows, the rest were dropped
+
+
 class SQLExecutor:
     """Execute SQL queries safely with validation
 
     Only allows SELECT queries with additional security checks.
+    Results are streamed from the database and capped at MAX_ROWS rows.
     """
 
+    # Hard cap on returned rows regardless of the query's LIMIT
+    MAX_ROWS = 1000
+
     # Dangerous SQL keywords that are not allowed
     DANGEROUS_KEYWORDS = [
         "INSERT",
@@ -67,14 +83,15 @@ class SQLExecutor:
 
         return True, ""
 
-    async def execute_safe(self, sql: str) -> list[dict]:
+    async def execute_safe(self, sql: str) -> QueryResult:
         """Execute SQL query safely
 
         Args:
             sql: SELECT query to execute
 
         Returns:
-            List of result rows as dictionaries
+            Result rows as dictionaries (see _plain_row), at most MAX_ROWS,
+            and whether more rows were dropped
 
         Raises:
             ValueError: If SQL is invalid or dangerous
@@ -86,13 +103,36 @@ class SQLExecutor:
             logger.warning(f"Invalid SQL query rejected: {error_msg}")
             raise ValueError(f"Invalid SQL: {error_msg}")
 
-        # Execute query
+        # Execute query, streaming rows so memory stays bounded by MAX_ROWS
         try:
             logger.info(f"Executing admin SQL query: {sql}")
-            results = await self.db.fetchall(sql)
-            logger.info(f"Query returned {len(results)} rows")
-            return results
+            result = QueryResult(rows=[])
+            async with aclosing(self.db.iterate(sql, batch_size=100)) as rows:
+                async for row in rows:
+                    if len(result.rows) >= self.MAX_ROWS:
+                        logger.warning(f"Query result truncated to {self.MAX_ROWS} rows")
+                        result.truncated = True
+                        break
+                    result.rows.append(self._plain_row(row))
+            logger.info(f"Query returned {len(result.rows)} rows")
+            return result
         except Exception as e:
             logger.error(f"SQL execution error: {e}", exc_info=True)
             raise Exception(f"Failed to execute query: {str(e)}")
 
+    @staticmethod
+    def _plain_row(row: dict[str, Any]) -> dict[str, Any]:
+        """Make a result row JSON serializable
+
+        Compressed message text (messages.content_z) is decompressed into
+        content, other BLOB columns are dropped.
+
+        Args:
+            row: Row as returned by the database
+
+        Returns:
+            Row without bytes values
+        """
+        if isinstance(row.get("content_z"), bytes):
+            row["content"] = decompress_content("", row["content_z"])
+        return {key: value for key, value in row.items() if not isinstance(value, bytes)}
@@ -0,0 +1,158 @@
+"""Server-sent events stream of statistics shared by all subscribers"""
+
+import asyncio
+import json
+import logging
+from collections.abc import AsyncIterator
+from dataclasses import asdict, dataclass, field
+
+from api.collectors.timeline import resolve_bucket
+from api.models import StatsDelta, StatsResponse
+from api.protocols import StatCollectorProtocol
+
+logger = logging.getLogger("telegram_bot")
+
+# Events queued for one subscriber; a slower client is resynced with a snapshot
+SUBSCRIBER_QUEUE_SIZE = 16
+
+
+def diff_stats(old: StatsResponse, new: StatsResponse) -> StatsDelta | None:
+    """Compute changes between two responses
+
+    Args:
+        old: Previously sent response
+        new: Freshly computed response
+
+    Returns:
+        StatsDelta, or None if nothing changed
+    """
+    old_points = {point.date: point.value for point in old.timeline}
+    new_dates = {point.date for point in new.timeline}
+
+    delta = StatsDelta(
+        kpi_metrics=new.kpi_metrics if new.kpi_metrics != old.kpi_metrics else None,
+        timeline=[point for point in new.timeline if old_points.get(point.date) != point.value],
+        removed_dates=[date for date in old_points if date not in new_dates],
+    )
+    if delta.kpi_metrics is None and not delta.timeline and not delta.removed_dates:
+        return None
+    return delta
+
+
+def format_event(event: str, payload: StatsResponse | StatsDelta) -> str:
+    """Format payload as a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(asdict(payload), ensure_ascii=False)}\n\n"
+
+
+@dataclass
+class _Channel:
+    """Subscribers of one (period, bucket) and its producer task"""
+
+    subscribers: set[asyncio.Queue[str]] = field(default_factory=set)
+    last: StatsResponse | None = None
+    task: asyncio.Task[None] | None = None
+
+
+class StatsBroadcaster:
+    """Computes statistics once per tick and fans them out to subscribers
+
+    Each (period, bucket) pair has one producer task, started by the first
+    subscriber and stopped with the last one. Every `interval_seconds` it
+    computes StatsResponse once, whatever the number of clients, and sends
+    only what changed: a new subscriber gets a `snapshot` event, then
+    `delta` events (see StatsDelta) when the statistics change.
+    """
+
+    def __init__(
+        self,
+        collector: StatCollectorProtocol,
+        interval_seconds: float,
+        heartbeat_seconds: float = 15,
+    ):
+        """Initialize broadcaster
+
+        Args:
+            collector: Collector computing the statistics
+            interval_seconds: Interval between computations
+            heartbeat_seconds: Idle time after which a keep-alive comment is sent
+        """
+        self.collector = collector
+        self.interval_seconds = interval_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self._channels: dict[tuple[str, str], _Channel] = {}
+
+    async def subscribe(self, period: str, bucket: str | None = None) -> AsyncIterator[str]:
+        """Stream server-sent events for period until the client disconnects
+
+        Args:
+            period: Time period ("day", "week", "month")
+            bucket: Timeline bucket width ("5m", "1h", "1d", "1w"), default depends on period
+
+        Yields:
+            Formatted SSE events: snapshot, then deltas and keep-alive comments
+        """
+        key = (period, resolve_bucket(period, bucket))
+        channel = self._channels.setdefault(key, _Channel())
+        queue: asyncio.Queue[str] = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        channel.subscribers.add(queue)
+        if channel.last is not None:
+            queue.put_nowait(format_event("snapshot", channel.last))
+        if channel.task is None:
+            channel.task = asyncio.create_task(self._produce(key, channel))
+
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), self.heartbeat_seconds)
+                except TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            channel.subscribers.discard(queue)
+            if not channel.subscribers:
+                self._close(key, channel)
+
+    async def close(self) -> None:
+        """Stop all producer tasks"""
+        tasks = [channel.task for channel in self._channels.values() if channel.task]
+        for key, channel in list(self._channels.items()):
+            self._close(key, channel)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _produce(self, key: tuple[str, str], channel: _Channel) -> None:
+        """Compute statistics every interval and publish changes"""
+        period, bucket = key
+        while True:
+            try:
+                response = await self.collector.get_stats(period, bucket)
+            except Exception as e:
+                logger.warning(f"Statistics stream computation failed for {key}: {e}")
+            else:
+                self._publish(channel, response)
+            await asyncio.sleep(self.interval_seconds)
+
+    def _publish(self, channel: _Channel, response: StatsResponse) -> None:
+        """Send the response (or its delta) to every subscriber"""
+        if channel.last is None:
+            event = format_event("snapshot", response)
+        else:
+            delta = diff_stats(channel.last, response)
+            if delta is None:
+                return
+            event = format_event("delta", delta)
+        channel.last = response
+
+        for queue in channel.subscribers:
+            if queue.full():
+                # The client missed deltas, start it over from the current state
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(format_event("snapshot", response))
+            else:
+                queue.put_nowait(event)
+
+    def _close(self, key: tuple[str, str], channel: _Channel) -> None:
+        """Cancel producer of channel and forget it"""
+        if channel.task is not None:
+            channel.task.cancel()
+        if self._channels.get(key) is channel:
+            del self._channels[key]
@@ -33,5 +33,6 @@ export interface ChatHistoryMessage {
 
 export interface ChatHistoryResponse {
     messages: ChatHistoryMessage[];
+    next_cursor: number | null; // before_id для загрузки более старых сообщений
 }
 
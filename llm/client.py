@@ -26,6 +26,10 @@ class LLMClient:
         self.client = AsyncOpenAI(api_key=api_key, base_url=base_url)
         self.model = model
 
+    async def close(self) -> None:
+        """Закрытие HTTP-соединений клиента"""
+        await self.client.close()
+
     async def send_message(self, messages: list[dict[str, str]]) -> str:
         """Отправка сообщения в LLM
 
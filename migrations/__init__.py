@@ -0,0 +1 @@
+"""Helpers for Alembic migrations (not imported by the bot or the API)"""
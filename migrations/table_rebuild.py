@@ -0,0 +1,331 @@
+"""Online table rebuild for Alembic migrations
+
+SQLite changes most of a table definition (dropping or retyping columns,
+constraints, generated columns) only by rebuilding the table. A single
+`INSERT ... SELECT` plus `DROP TABLE` holds the write lock for the whole
+copy, so the bot can't write until the migration ends.
+
+rebuild_table() copies the table into a shadow table in id-ordered batches,
+each committed on its own, while triggers on the live table mirror changes
+of already copied rows. Only the final swap takes the lock for longer than
+one batch. An interrupted rebuild resumes from the last committed batch
+when the migration runs again.
+
+The rebuild commits the migration's transaction before it starts, so it
+must be the only operation of its migration: put other schema changes into
+migrations of their own. Statements run before it would be committed
+without the revision, and would run again when the interrupted migration
+is retried.
+
+Usage in a migration::
+
+    from migrations.table_rebuild import rebuild_table
+
+    def upgrade() -> None:
+        rebuild_table(
+            "users",
+            '''
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY,
+                username TEXT NULL,
+                first_name TEXT NOT NULL
+            )
+            ''',
+            columns=["id", "username", "first_name"],
+        )
+"""
+
+import logging
+import time
+from collections.abc import Callable, Sequence
+from typing import Any
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# Alembic's logger, so the progress shows in `alembic upgrade` output
+logger = logging.getLogger("alembic.table_rebuild")
+
+# Rows copied by one batch (and commit)
+DEFAULT_BATCH_SIZE = 5000
+
+# Pause between batches, lets other writers take the lock
+DEFAULT_PAUSE_SECONDS = 0.05
+
+# Copy watermarks of unfinished rebuilds, one row per table
+PROGRESS_TABLE = "table_rebuild_progress"
+
+# Watermark before the first batch, below any rowid
+_MIN_ID = -(2**63)
+
+
+def shadow_table_name(table: str) -> str:
+    """Name of the table the rows of `table` are copied to"""
+    return f"{table}__rebuild"
+
+
+def _trigger_names(table: str) -> list[str]:
+    """Names of the triggers mirroring changes of `table` to its shadow"""
+    return [f"{table}__rebuild_{event}" for event in ("insert", "update", "delete")]
+
+
+def _scalar(sql: str, **params: Any) -> Any:
+    """Run a query on the migration connection and return the first column"""
+    return op.get_bind().execute(sa.text(sql), params).scalar()
+
+
+def _exec(sql: str, **params: Any) -> int:
+    """Run a statement on the migration connection and return its rowcount"""
+    return int(op.get_bind().execute(sa.text(sql), params).rowcount)
+
+
+def _in_transaction(statements: Callable[[], Any]) -> Any:
+    """Run statements in one BEGIN IMMEDIATE transaction (autocommit mode)"""
+    _exec("BEGIN IMMEDIATE")
+    try:
+        result = statements()
+    except BaseException:
+        _exec("ROLLBACK")
+        raise
+    _exec("COMMIT")
+    return result
+
+
+def rebuild_table(
+    table: str,
+    create_sql: str,
+    columns: Sequence[str],
+    select: Sequence[str] | None = None,
+    after_swap: Sequence[str] = (),
+    key: str = "id",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause_seconds: float = DEFAULT_PAUSE_SECONDS,
+    progress: Callable[[int, int], None] | None = None,
+) -> int:
+    """Rebuild `table` with a new definition without blocking writers.
+
+    1. `create_sql` creates the shadow table; triggers on `table` mirror
+       inserts, updates and deletes of rows up to the copy watermark.
+    2. Rows are copied in batches of `batch_size` in `key` order. A batch
+       and the new watermark (table_rebuild_progress) commit together.
+    3. The swap, in one transaction: rows added since the last batch are
+       copied, `table` is dropped, the shadow is renamed to `table` and the
+       `after_swap` statements run.
+
+    DROP TABLE drops the indexes and triggers of `table`, `after_swap`
+    recreates them. They are built inside the swap transaction, so index
+    creation is the part of the rebuild that blocks writers. Views and
+    foreign keys of other tables refer to the table by name and keep
+    working after the swap.
+
+    The migration's transaction is committed first (autocommit_block), so
+    the rebuild must be the only operation of the migration: earlier
+    statements would stay applied if the rebuild fails and run again on
+    the retry. Running the migration again resumes the copy; the shadow
+    table is kept until the swap.
+
+    Args:
+        table: Table to rebuild
+        create_sql: CREATE TABLE statement with a `{table}` placeholder for
+            the shadow table's name
+        columns: Columns of the new table filled by the copy
+        select: SQL expressions over the old table's row for `columns`,
+            defaults to the same column names
+        after_swap: Statements run after the rename (indexes, triggers),
+            a `{table}` placeholder stands for `table`
+        key: Integer primary key (rowid alias) of both tables
+        batch_size: Rows per batch
+        pause_seconds: Pause after every batch
+        progress: Called with (copied rows, total rows) after every batch
+
+    Returns:
+        Number of copied rows
+
+    Raises:
+        ValueError: If batch_size is less than 1 or select doesn't match columns
+        RuntimeError: In offline (--sql) mode, or if a table named like the
+            shadow table exists without a rebuild in progress
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be greater than 0")
+    select = list(select) if select is not None else list(columns)
+    if len(select) != len(columns):
+        raise ValueError("select must have one expression per column")
+    if op.get_context().as_sql:
+        raise RuntimeError("rebuild_table() needs a database connection, not offline mode")
+
+    shadow = shadow_table_name(table)
+    column_list = ", ".join(columns)
+    copy_rows = (
+        f"INSERT OR REPLACE INTO {shadow} ({column_list}) SELECT {', '.join(select)} FROM {table}"
+    )
+
+    with op.get_context().autocommit_block():
+        # DROP TABLE with enforced foreign keys deletes the referencing rows
+        foreign_keys = _scalar("PRAGMA foreign_keys")
+        _exec("PRAGMA foreign_keys = OFF")
+        try:
+            _in_transaction(lambda: _start(table, shadow, create_sql, copy_rows, key))
+            copied = _copy(table, shadow, copy_rows, key, batch_size, pause_seconds, progress)
+            _in_transaction(lambda: _swap(table, shadow, copy_rows, key, after_swap))
+        finally:
+            _exec(f"PRAGMA foreign_keys = {int(foreign_keys)}")
+
+    logger.info(f"Rebuilt table {table}: {copied} rows copied")
+    return copied
+
+
+def _start(table: str, shadow: str, create_sql: str, copy_rows: str, key: str) -> None:
+    """Create the shadow table and the change triggers, unless resuming"""
+    _exec(
+        f"""
+        CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+        """
+    )
+    resuming = _scalar(f"SELECT 1 FROM {PROGRESS_TABLE} WHERE table_name = :table", table=table)
+    shadow_exists = _scalar(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name", name=shadow
+    )
+    if resuming:
+        if not shadow_exists:
+            raise RuntimeError(f"Rebuild of {table} is in progress, but {shadow} is missing")
+        logger.info(f"Resuming rebuild of table {table}")
+        return
+    if shadow_exists:
+        raise RuntimeError(f"Table {shadow} exists, but no rebuild of {table} is in progress")
+
+    _exec(create_sql.format(table=shadow))
+    _exec(
+        f"INSERT INTO {PROGRESS_TABLE} (table_name, last_id) VALUES (:table, :last_id)",
+        table=table,
+        last_id=_MIN_ID,
+    )
+
+    # Rows above the watermark are copied by a later batch as they are then
+    copied = f"(SELECT last_id FROM {PROGRESS_TABLE} WHERE table_name = '{table}')"
+    insert, update, delete = _trigger_names(table)
+    _exec(
+        f"""
+        CREATE TRIGGER {insert} AFTER INSERT ON {table}
+        WHEN new.{key} <= {copied} BEGIN
+            {copy_rows} WHERE {key} = new.{key};
+        END
+        """
+    )
+    _exec(
+        f"""
+        CREATE TRIGGER {update} AFTER UPDATE ON {table}
+        WHEN new.{key} <= {copied} OR old.{key} <= {copied} BEGIN
+            DELETE FROM {shadow} WHERE {key} = old.{key};
+            {copy_rows} WHERE {key} = new.{key};
+        END
+        """
+    )
+    _exec(
+        f"""
+        CREATE TRIGGER {delete} AFTER DELETE ON {table} BEGIN
+            DELETE FROM {shadow} WHERE {key} = old.{key};
+        END
+        """
+    )
+
+
+def _copy(
+    table: str,
+    shadow: str,
+    copy_rows: str,
+    key: str,
+    batch_size: int,
+    pause_seconds: float,
+    progress: Callable[[int, int], None] | None,
+) -> int:
+    """Copy rows above the watermark in batches, return the copied rows"""
+    last_id = _scalar(
+        f"SELECT last_id FROM {PROGRESS_TABLE} WHERE table_name = :table", table=table
+    )
+    # Rows copied before an interruption count as copied
+    copied = int(_scalar(f"SELECT COUNT(*) FROM {table} WHERE {key} <= :last_id", last_id=last_id))
+    total = int(_scalar(f"SELECT COUNT(*) FROM {table}"))
+
+    while True:
+        # Upper bound of the batch: the batch_size-th id above the watermark
+        batch_end = _scalar(
+            f"SELECT {key} FROM {table} WHERE {key} > :last_id ORDER BY {key} LIMIT 1 OFFSET :skip",
+            last_id=last_id,
+            skip=batch_size - 1,
+        )
+        if batch_end is None:
+            batch_end = _scalar(
+                f"SELECT MAX({key}) FROM {table} WHERE {key} > :last_id", last_id=last_id
+            )
+        if batch_end is None:
+            return copied
+
+        def copy_batch(start: int = last_id, end: int = batch_end) -> int:
+            rows = _exec(
+                f"{copy_rows} WHERE {key} > :start AND {key} <= :end", start=start, end=end
+            )
+            _exec(
+                f"UPDATE {PROGRESS_TABLE} SET last_id = :end WHERE table_name = :table",
+                end=end,
+                table=table,
+            )
+            return rows
+
+        copied += _in_transaction(copy_batch)
+        last_id = batch_end
+        total = max(total, copied)
+        logger.info(f"Rebuilding table {table}: {copied}/{total} rows copied")
+        if progress is not None:
+            progress(copied, total)
+        time.sleep(pause_seconds)
+
+
+def _swap(table: str, shadow: str, copy_rows: str, key: str, after_swap: Sequence[str]) -> None:
+    """Copy the last rows, replace `table` with the shadow table"""
+    last_id = _scalar(
+        f"SELECT last_id FROM {PROGRESS_TABLE} WHERE table_name = :table", table=table
+    )
+    _exec(f"{copy_rows} WHERE {key} > :last_id", last_id=last_id)
+
+    # Keep AUTOINCREMENT from reusing ids of deleted rows at the end of table
+    if _scalar("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'"):
+        _exec(
+            """
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT :shadow, 0 WHERE EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :table)
+            AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :shadow)
+            """,
+            shadow=shadow,
+            table=table,
+        )
+        _exec(
+            """
+            UPDATE sqlite_sequence
+            SET seq = MAX(seq, (SELECT seq FROM sqlite_sequence WHERE name = :table))
+            WHERE name = :shadow AND EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :table)
+            """,
+            shadow=shadow,
+            table=table,
+        )
+
+    for trigger in _trigger_names(table):
+        _exec(f"DROP TRIGGER IF EXISTS {trigger}")
+    _exec(f"DROP TABLE {table}")
+    # Views and triggers on other tables may refer to the dropped table, the
+    # modern RENAME would refuse to run with them in the schema
+    _exec("PRAGMA legacy_alter_table = ON")
+    try:
+        _exec(f"ALTER TABLE {shadow} RENAME TO {table}")
+    finally:
+        _exec("PRAGMA legacy_alter_table = OFF")
+    for sql in after_swap:
+        _exec(sql.format(table=table))
+
+    _exec(f"DELETE FROM {PROGRESS_TABLE} WHERE table_name = :table", table=table)
+    if not _scalar(f"SELECT 1 FROM {PROGRESS_TABLE} LIMIT 1"):
+        _exec(f"DROP TABLE {PROGRESS_TABLE}")
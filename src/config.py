@@ -20,6 +20,30 @@ class Config:
         max_context_messages: Максимальное количество сообщений в контексте
         welcome_message: Текст приветственного сообщения
         database_path: Путь к файлу базы данных SQLite
+        database_read_pool_size: Количество read-only соединений в пуле чтения
+        database_group_commit_ms: Интервал group commit в мс (0 - коммит после каждой записи)
+        database_group_commit_max_batch: Максимум записей в одной групповой транзакции
+        user_cache_size: Размер LRU-кэша пользователей (0 - кэш выключен)
+        last_accessed_flush_seconds: Интервал пакетной записи last_accessed в секундах
+        context_cache_max_bytes: Лимит кэша контекста диалогов в байтах (0 - кэш выключен)
+        stats_cache_ttl_seconds: Время жизни кэша ответов /stats в секундах (0 - кэш выключен)
+        stats_cache_refresh_ahead_seconds: За сколько секунд до истечения кэша /stats
+            пересчитывать его в фоне (0 - только при промахе)
+        stats_stream_interval_seconds: Интервал пересчета статистики для /stats/stream в секундах
+        fts_merge_interval_seconds: Интервал фонового слияния сегментов FTS-индекса
+            в секундах (0 - выключено)
+        clear_sweep_interval_seconds: Интервал фонового удаления сообщений, скрытых
+            командой /clear, в секундах (0 - выключено)
+        retention_days: Через сколько дней после soft delete сообщения и пользователи
+            удаляются окончательно (0 - хранятся всегда)
+        retention_interval_seconds: Интервал фоновой очистки по retention_days в секундах
+            (0 - выключено)
+        archive_after_days: Через сколько дней сообщения переносятся в архив
+            messages_archive (0 - не переносятся)
+        archive_interval_seconds: Интервал фонового переноса в архив в секундах
+            (0 - выключено)
+        message_compression_threshold: Размер текста сообщения в байтах, начиная
+            с которого он хранится сжатым (0 - без сжатия)
     """
 
     telegram_bot_token: str
@@ -31,6 +55,22 @@ class Config:
     max_context_messages: int
     welcome_message: str
     database_path: str
+    database_read_pool_size: int = 4
+    database_group_commit_ms: int = 0
+    database_group_commit_max_batch: int = 100
+    user_cache_size: int = 10000
+    last_accessed_flush_seconds: int = 60
+    context_cache_max_bytes: int = 16 * 1024 * 1024
+    stats_cache_ttl_seconds: int = 15
+    stats_cache_refresh_ahead_seconds: int = 0
+    stats_stream_interval_seconds: int = 5
+    fts_merge_interval_seconds: int = 600
+    clear_sweep_interval_seconds: int = 60
+    retention_days: int = 0
+    retention_interval_seconds: int = 3600
+    archive_after_days: int = 0
+    archive_interval_seconds: int = 86400
+    message_compression_threshold: int = 0
 
     @classmethod
     def load(cls) -> "Config":
@@ -85,6 +125,26 @@ class Config:
 
         # Путь к базе данных
         database_path = os.getenv("DATABASE_PATH", "data/bot.db")
+        read_pool_size = cls._get_int_env("DATABASE_READ_POOL_SIZE", 4, min_value=1)
+        group_commit_ms = cls._get_int_env("DATABASE_GROUP_COMMIT_MS", 0)
+        group_commit_max_batch = cls._get_int_env(
+            "DATABASE_GROUP_COMMIT_MAX_BATCH", 100, min_value=1
+        )
+        user_cache_size = cls._get_int_env("USER_CACHE_SIZE", 10000)
+        last_accessed_flush_seconds = cls._get_int_env("LAST_ACCESSED_FLUSH_SECONDS", 60)
+        context_cache_max_bytes = cls._get_int_env("CONTEXT_CACHE_MAX_BYTES", 16 * 1024 * 1024)
+        stats_cache_ttl_seconds = cls._get_int_env("STATS_CACHE_TTL_SECONDS", 15)
+        stats_cache_refresh_ahead_seconds = cls._get_int_env("STATS_CACHE_REFRESH_AHEAD_SECONDS", 0)
+        stats_stream_interval_seconds = cls._get_int_env(
+            "STATS_STREAM_INTERVAL_SECONDS", 5, min_value=1
+        )
+        fts_merge_interval_seconds = cls._get_int_env("FTS_MERGE_INTERVAL_SECONDS", 600)
+        clear_sweep_interval_seconds = cls._get_int_env("CLEAR_SWEEP_INTERVAL_SECONDS", 60)
+        retention_days = cls._get_int_env("RETENTION_DAYS", 0)
+        retention_interval_seconds = cls._get_int_env("RETENTION_INTERVAL_SECONDS", 3600)
+        archive_after_days = cls._get_int_env("ARCHIVE_AFTER_DAYS", 0)
+        archive_interval_seconds = cls._get_int_env("ARCHIVE_INTERVAL_SECONDS", 86400)
+        message_compression_threshold = cls._get_int_env("MESSAGE_COMPRESSION_THRESHOLD", 0)
 
         return cls(
             telegram_bot_token=token.strip(),
@@ -96,4 +156,46 @@ class Config:
             max_context_messages=max_messages,
             welcome_message=welcome_msg,
             database_path=database_path,
+            database_read_pool_size=read_pool_size,
+            database_group_commit_ms=group_commit_ms,
+            database_group_commit_max_batch=group_commit_max_batch,
+            user_cache_size=user_cache_size,
+            last_accessed_flush_seconds=last_accessed_flush_seconds,
+            context_cache_max_bytes=context_cache_max_bytes,
+            stats_cache_ttl_seconds=stats_cache_ttl_seconds,
+            stats_cache_refresh_ahead_seconds=stats_cache_refresh_ahead_seconds,
+            stats_stream_interval_seconds=stats_stream_interval_seconds,
+            fts_merge_interval_seconds=fts_merge_interval_seconds,
+            clear_sweep_interval_seconds=clear_sweep_interval_seconds,
+            retention_days=retention_days,
+            retention_interval_seconds=retention_interval_seconds,
+            archive_after_days=archive_after_days,
+            archive_interval_seconds=archive_interval_seconds,
+            message_compression_threshold=message_compression_threshold,
         )
+
+    @staticmethod
+    def _get_int_env(name: str, default: int, min_value: int = 0) -> int:
+        """Чтение целочисленного параметра из окружения с валидацией
+
+        Args:
+            name: Имя переменной окружения
+            default: Значение по умолчанию
+            min_value: Минимально допустимое значение
+
+        Returns:
+            int: Значение параметра
+
+        Raises:
+            ValueError: Если значение не целое число или меньше min_value
+        """
+        raw_value = os.getenv(name, str(default))
+        try:
+            value = int(raw_value)
+        except ValueError:
+            raise ValueError(f"{name} must be a valid integer, got: {raw_value}")
+        if value < min_value:
+            if min_value == 1:
+                raise ValueError(f"{name} must be greater than 0")
+            raise ValueError(f"{name} must be greater than or equal to {min_value}")
+        return value
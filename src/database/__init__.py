@@ -1,6 +1,24 @@
 """Database layer with repositories for data access"""
 
+from src.database.archive import MessageArchiver
+from src.database.conversation_cache import ConversationCache
+from src.database.fts import FTSMaintenance
+from src.database.message_stats import MessageStatsRepository
+from src.database.records import MessageRecord, SearchHitRecord, UserRecord
 from src.database.repository import DatabaseManager, MessageRepository, UserRepository
+from src.database.retention import PurgeResult, RetentionPurger
 
-__all__ = ["DatabaseManager", "UserRepository", "MessageRepository"]
-
+__all__ = [
+    "DatabaseManager",
+    "UserRepository",
+    "MessageRepository",
+    "MessageStatsRepository",
+    "FTSMaintenance",
+    "RetentionPurger",
+    "MessageArchiver",
+    "PurgeResult",
+    "ConversationCache",
+    "UserRecord",
+    "MessageRecord",
+    "SearchHitRecord",
+]
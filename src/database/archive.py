@@ -0,0 +1,155 @@
+"""Moving old messages to the messages_archive cold storage table"""
+
+import asyncio
+import logging
+import time
+
+from src.database.records import MessageRecord, pack_messages, unpack_messages
+from src.database.repository import DatabaseManager
+
+logger = logging.getLogger("telegram_bot")
+
+# Pause between archived (user, month) groups, lets other writers take the lock
+DEFAULT_PAUSE_SECONDS = 0.05
+
+
+class MessageArchiver:
+    """Moves active messages older than archive_after_days to messages_archive
+
+    Messages of one user and one calendar month (UTC) become one zlib
+    compressed blob (records.pack_messages). Each group is moved in its own
+    transaction: the blob is written (merged with the month's existing blob)
+    and the rows are deleted from messages, so a message is always in exactly
+    one of the tables.
+
+    MessageRepository.get_recent() and get_page() read the archive when the
+    hot table runs out, archived messages keep their ids. Full-text search
+    covers the hot table only. message_stats_hourly keeps the counts of
+    archived messages.
+
+    Soft deleted messages and messages hidden by /clear are not archived,
+    they stay for the /clear sweeper and the retention purge.
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        archive_after_days: int,
+        pause_seconds: float = DEFAULT_PAUSE_SECONDS,
+    ):
+        """Initialize archiver
+
+        Args:
+            db_manager: Database manager instance
+            archive_after_days: Archive messages older than this many days
+            pause_seconds: Pause after every archived group
+
+        Raises:
+            ValueError: If archive_after_days is less than 1
+        """
+        if archive_after_days < 1:
+            raise ValueError("archive_after_days must be greater than 0")
+        self.db = db_manager
+        self.archive_after_days = archive_after_days
+        self.pause_seconds = pause_seconds
+
+    async def archive(self) -> int:
+        """Archive all messages older than archive_after_days
+
+        Returns:
+            Number of archived messages
+        """
+        cutoff = int(time.time()) - self.archive_after_days * 86400
+        # Without the index hint the planner walks all active messages in
+        # (user_id, id) order for the DISTINCT instead of the old ones only
+        groups = await self.db.fetchall(
+            """
+            SELECT DISTINCT user_id, strftime('%Y-%m', created_at) AS month
+            FROM messages INDEXED BY idx_messages_created_ts_active
+            WHERE deleted_at IS NULL AND created_at_ts < ?
+            ORDER BY user_id, month
+            """,
+            (cutoff,),
+        )
+
+        archived = 0
+        for group in groups:
+            archived += await self._archive_month(group["user_id"], group["month"], cutoff)
+            await asyncio.sleep(self.pause_seconds)
+        if archived:
+            logger.info(f"Archived {archived} messages in {len(groups)} user months")
+        return archived
+
+    async def _archive_month(self, user_id: int, month: str, cutoff: int) -> int:
+        """Move messages of one user and month older than cutoff to the archive
+
+        Args:
+            user_id: User's chat ID
+            month: Month as 'YYYY-MM'
+            cutoff: Unix time, only older messages are moved
+
+        Returns:
+            Number of moved messages
+        """
+        # Same rows for the SELECT and the DELETE inside one transaction
+        where = """
+            WHERE user_id = ? AND deleted_at IS NULL
+            AND created_at_ts >= CAST(strftime('%s', ? || '-01') AS INTEGER)
+            AND created_at_ts < MIN(?, CAST(strftime('%s', ? || '-01', '+1 month') AS INTEGER))
+            AND id >= COALESCE((SELECT cleared_before_id FROM users WHERE id = ?), 0)
+        """
+        params = (user_id, month, cutoff, month, user_id)
+
+        async with self.db.transaction():
+            messages = await self.db.fetchall(
+                f"SELECT {MessageRecord.COLUMNS} FROM messages {where} ORDER BY id",
+                params,
+                row_factory=MessageRecord.from_row,
+            )
+            if not messages:
+                return 0
+
+            existing = await self.db.fetchone(
+                "SELECT data FROM messages_archive WHERE user_id = ? AND month = ?",
+                (user_id, month),
+            )
+            if existing:
+                merged = {m.id: m for m in unpack_messages(user_id, existing["data"])}
+                merged.update((m.id, m) for m in messages)
+                messages = [merged[message_id] for message_id in sorted(merged)]
+
+            await self.db.execute(
+                """
+                INSERT INTO messages_archive
+                    (user_id, month, first_id, last_id, message_count, data)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(user_id, month) DO UPDATE SET
+                    first_id = excluded.first_id,
+                    last_id = excluded.last_id,
+                    message_count = excluded.message_count,
+                    data = excluded.data
+                """,
+                (
+                    user_id,
+                    month,
+                    messages[0].id,
+                    messages[-1].id,
+                    len(messages),
+                    pack_messages(messages),
+                ),
+            )
+            cursor = await self.db.execute(f"DELETE FROM messages {where}", params)
+        return cursor.rowcount
+
+    async def run_periodically(self, interval_seconds: float) -> None:
+        """Run archive() every interval until cancelled
+
+        Args:
+            interval_seconds: Pause between runs
+        """
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.archive()
+            except Exception as e:
+                logger.warning(f"Archiving messages failed: {e}")
@@ -0,0 +1,157 @@
+"""In-memory cache of recent conversation messages per user"""
+
+import logging
+from collections import OrderedDict, deque
+
+from src.database.records import MessageRecord
+
+logger = logging.getLogger("telegram_bot")
+
+
+class ConversationCache:
+    """Per-user ring buffer of the most recent messages
+
+    Holds the last `capacity` messages of each cached user so that building the
+    LLM context does not need a database round trip. Users are evicted in LRU
+    order once the total size of cached message contents exceeds `max_bytes`.
+
+    The cache is filled by MessageRepository on the first get_recent() for a
+    user, appended to on create() and invalidated on soft deletes. A fill that
+    raced with a write for the same user is discarded instead of stored.
+
+    Attributes:
+        capacity: Maximum number of messages kept per user
+        max_bytes: Maximum total size of cached contents in bytes
+    """
+
+    def __init__(self, capacity: int, max_bytes: int):
+        """Initialize cache
+
+        Args:
+            capacity: Maximum number of messages kept per user
+            max_bytes: Maximum total size of cached contents in bytes
+        """
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[int, deque[MessageRecord]] = OrderedDict()
+        self._entry_bytes: dict[int, int] = {}
+        self._total_bytes = 0
+        # user_id -> "stale" flag for fills in progress
+        self._pending_fills: dict[int, bool] = {}
+
+    @property
+    def total_bytes(self) -> int:
+        """Total size of cached message contents in bytes"""
+        return self._total_bytes
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def get(self, user_id: int, limit: int) -> list[MessageRecord] | None:
+        """Get recent messages of user from cache
+
+        Args:
+            user_id: User's chat ID
+            limit: Maximum number of messages to return (must not exceed capacity)
+
+        Returns:
+            List of message records (most recent first) or None on cache miss
+        """
+        entry = self._entries.get(user_id)
+        if entry is None or limit > self.capacity:
+            return None
+
+        self._entries.move_to_end(user_id)
+        if limit <= 0:
+            return []
+        recent = list(entry)[-limit:]
+        recent.reverse()
+        return recent
+
+    def start_fill(self, user_id: int) -> None:
+        """Mark that messages of user are being loaded from the database
+
+        Args:
+            user_id: User's chat ID
+        """
+        self._pending_fills.setdefault(user_id, False)
+
+    def finish_fill(self, user_id: int, messages: list[MessageRecord]) -> None:
+        """Store messages loaded from the database
+
+        Skipped if a write for this user happened since start_fill(), because
+        the loaded rows may already be outdated.
+
+        Args:
+            user_id: User's chat ID
+            messages: Up to `capacity` most recent messages (most recent first)
+        """
+        stale = self._pending_fills.pop(user_id, True)
+        if stale:
+            return
+
+        self._drop(user_id)
+        entry: deque[MessageRecord] = deque(reversed(messages), maxlen=self.capacity)
+        self._entries[user_id] = entry
+        self._entry_bytes[user_id] = sum(self._message_bytes(msg) for msg in entry)
+        self._total_bytes += self._entry_bytes[user_id]
+        self._evict()
+
+    def cancel_fill(self, user_id: int) -> None:
+        """Forget a fill that failed to load messages
+
+        Args:
+            user_id: User's chat ID
+        """
+        self._pending_fills.pop(user_id, None)
+
+    def append(self, user_id: int, message: MessageRecord) -> None:
+        """Append new message to the ring buffer of a cached user
+
+        Args:
+            user_id: User's chat ID
+            message: Message record as stored in the database
+        """
+        entry = self._entries.get(user_id)
+        if entry is None:
+            if user_id in self._pending_fills:
+                self._pending_fills[user_id] = True
+            return
+
+        message_bytes = self._message_bytes(message)
+        if len(entry) == entry.maxlen:
+            removed_bytes = self._message_bytes(entry[0])
+            self._entry_bytes[user_id] -= removed_bytes
+            self._total_bytes -= removed_bytes
+        entry.append(message)
+        self._entry_bytes[user_id] += message_bytes
+        self._total_bytes += message_bytes
+        self._entries.move_to_end(user_id)
+        self._evict()
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop cached messages of user
+
+        Args:
+            user_id: User's chat ID
+        """
+        self._drop(user_id)
+        if user_id in self._pending_fills:
+            self._pending_fills[user_id] = True
+
+    def _drop(self, user_id: int) -> None:
+        """Remove user entry and release its bytes"""
+        if self._entries.pop(user_id, None) is not None:
+            self._total_bytes -= self._entry_bytes.pop(user_id)
+
+    def _evict(self) -> None:
+        """Evict least recently used users until the byte budget is met"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            user_id, _ = self._entries.popitem(last=False)
+            self._total_bytes -= self._entry_bytes.pop(user_id)
+            logger.debug(f"Evicted conversation cache entry for user {user_id}")
+
+    @staticmethod
+    def _message_bytes(message: MessageRecord) -> int:
+        """Size of message content in bytes"""
+        return len(message.content.encode("utf-8"))
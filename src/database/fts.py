@@ -0,0 +1,161 @@
+"""Maintenance of the messages_fts full-text index"""
+
+import asyncio
+import logging
+
+from src.database.records import decompress_content
+from src.database.repository import DatabaseManager
+
+logger = logging.getLogger("telegram_bot")
+
+# Pages written by one incremental merge, bounds how long it holds the writer
+DEFAULT_MERGE_PAGES = 500
+
+# Queue entries (or compressed messages in rebuild()) handled per transaction
+DEFAULT_BATCH_SIZE = 500
+
+
+class FTSMaintenance:
+    """Merges and rebuilds the messages_fts index
+
+    Every FTS5 write adds a small segment; automerge (set by migration 006)
+    merges them only lazily so writes stay fast. Without merging, queries
+    read more and more segments. merge() does a bounded piece of that work
+    and is meant to run periodically (run_periodically), optimize() merges
+    everything at once for an offline window.
+
+    The index holds active messages only (see migration 006 triggers), so
+    rebuild() reindexes them instead of the FTS5 'rebuild' command, which
+    would add soft deleted messages back.
+
+    Triggers can't decompress messages stored in content_z (migration 010),
+    they queue them in messages_fts_queue instead; apply_queue() indexes or
+    unindexes them with the decompressed text.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        """Initialize maintenance
+
+        Args:
+            db_manager: Database manager instance
+        """
+        self.db = db_manager
+
+    async def merge(self, pages: int = DEFAULT_MERGE_PAGES) -> None:
+        """Merge index segments until about `pages` pages are written
+
+        Args:
+            pages: Work limit of this merge
+        """
+        await self.db.execute(
+            "INSERT INTO messages_fts(messages_fts, rank) VALUES ('merge', ?)", (pages,)
+        )
+
+    async def optimize(self) -> None:
+        """Merge the whole index into one segment (holds the writer until done)"""
+        await self.db.execute("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')")
+        logger.info("messages_fts optimized")
+
+    async def apply_queue(self, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Apply queued index changes of compressed messages
+
+        Args:
+            batch_size: Queue entries applied per transaction
+
+        Returns:
+            Number of applied entries
+        """
+        applied = 0
+        while True:
+            async with self.db.transaction():
+                entries = await self.db.fetchall(
+                    """
+                    SELECT id, message_id, action, content_z FROM messages_fts_queue
+                    ORDER BY id LIMIT ?
+                    """,
+                    (batch_size,),
+                )
+                for entry in entries:
+                    content = decompress_content("", entry["content_z"])
+                    if entry["action"] == "index":
+                        await self.db.execute(
+                            "INSERT INTO messages_fts(rowid, content) VALUES (?, ?)",
+                            (entry["message_id"], content),
+                        )
+                    else:
+                        await self.db.execute(
+                            """
+                            INSERT INTO messages_fts(messages_fts, rowid, content)
+                            VALUES ('delete', ?, ?)
+                            """,
+                            (entry["message_id"], content),
+                        )
+                if entries:
+                    await self.db.execute(
+                        "DELETE FROM messages_fts_queue WHERE id <= ?", (entries[-1]["id"],)
+                    )
+            applied += len(entries)
+            if len(entries) < batch_size:
+                return applied
+
+    async def rebuild(self, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Reindex active messages from scratch in one transaction
+
+        Args:
+            batch_size: Compressed messages decompressed at a time
+
+        Returns:
+            Number of indexed messages
+        """
+        async with self.db.transaction():
+            await self.db.execute("INSERT INTO messages_fts(messages_fts) VALUES ('delete-all')")
+            await self.db.execute(
+                """
+                INSERT INTO messages_fts(rowid, content)
+                SELECT id, content FROM messages
+                WHERE deleted_at IS NULL AND content_z IS NULL
+                """
+            )
+            row = await self.db.fetchone("SELECT changes() AS count")
+            count = int(row["count"]) if row else 0
+
+            last_id = 0
+            while True:
+                rows = await self.db.fetchall(
+                    """
+                    SELECT id, content_z FROM messages
+                    WHERE deleted_at IS NULL AND content_z IS NOT NULL AND id > ?
+                    ORDER BY id LIMIT ?
+                    """,
+                    (last_id, batch_size),
+                )
+                if not rows:
+                    break
+                await self.db.executemany(
+                    "INSERT INTO messages_fts(rowid, content) VALUES (?, ?)",
+                    [(row["id"], decompress_content("", row["content_z"])) for row in rows],
+                )
+                count += len(rows)
+                last_id = rows[-1]["id"]
+            # The index now matches the table, queued changes are included
+            await self.db.execute("DELETE FROM messages_fts_queue")
+
+        logger.info(f"messages_fts rebuilt: {count} messages")
+        return count
+
+    async def run_periodically(
+        self, interval_seconds: float, pages: int = DEFAULT_MERGE_PAGES
+    ) -> None:
+        """Run apply_queue() and merge() every interval until cancelled
+
+        Args:
+            interval_seconds: Pause between runs
+            pages: Work limit of each merge
+        """
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.apply_queue()
+                await self.merge(pages)
+            except Exception as e:
+                logger.warning(f"messages_fts maintenance failed: {e}")
@@ -0,0 +1,98 @@
+"""Hourly message statistics rollup"""
+
+import calendar
+import logging
+from contextlib import aclosing
+from datetime import datetime
+
+from src.database.records import unpack_messages
+from src.database.repository import DatabaseManager
+
+logger = logging.getLogger("telegram_bot")
+
+# Seconds in one rollup row
+HOUR_SECONDS = 3600
+
+
+class MessageStatsRepository:
+    """Access to the message_stats_hourly rollup table
+
+    The rollup is kept in sync by triggers on messages (see migration 004):
+    one row per hour (unix time // 3600) with the number and total length of
+    active messages created in that hour and the number of messages soft
+    deleted in it. Statistics read these rows instead of scanning messages.
+
+    The rollup counts all history: hard deletes (archiving, retention purge)
+    don't touch it, and rebuild() counts archived messages from the
+    messages_archive blobs.
+    """
+
+    def __init__(self, db_manager: DatabaseManager):
+        """Initialize repository
+
+        Args:
+            db_manager: Database manager instance
+        """
+        self.db = db_manager
+
+    async def rebuild(self) -> int:
+        """Recalculate the rollup from messages and the archive in one transaction
+
+        Needed after changes that bypass the triggers (e.g. data imported with
+        triggers disabled) or to drop the history of purged messages.
+        Archived messages are active, their blobs are unpacked and counted
+        by hour of creation.
+
+        Returns:
+            Number of hours in the rebuilt rollup
+        """
+        async with self.db.transaction():
+            await self.db.execute("DELETE FROM message_stats_hourly")
+            await self.db.execute(
+                """
+                INSERT INTO message_stats_hourly (hour, message_count, total_length, deleted_count)
+                SELECT hour, SUM(message_count), SUM(total_length), SUM(deleted_count)
+                FROM (
+                    SELECT created_at_ts / 3600 AS hour,
+                           1 AS message_count, length AS total_length, 0 AS deleted_count
+                    FROM messages
+                    WHERE deleted_at IS NULL
+                    UNION ALL
+                    SELECT deleted_at_ts / 3600, 0, 0, 1
+                    FROM messages
+                    WHERE deleted_at IS NOT NULL
+                )
+                GROUP BY hour
+                """
+            )
+            await self._add_archived()
+            row = await self.db.fetchone("SELECT COUNT(*) AS count FROM message_stats_hourly")
+
+        hours = int(row["count"]) if row else 0
+        logger.info(f"Rebuilt message_stats_hourly: {hours} hours")
+        return hours
+
+    async def _add_archived(self) -> None:
+        """Add counts of archived messages to the rollup (inside rebuild())"""
+        hours: dict[int, list[int]] = {}
+        async with aclosing(
+            self.db.iterate("SELECT user_id, data FROM messages_archive", batch_size=50)
+        ) as rows:
+            async for row in rows:
+                for message in unpack_messages(row["user_id"], row["data"]):
+                    created_at = datetime.fromisoformat(message.created_at)
+                    hour = calendar.timegm(created_at.timetuple()) // HOUR_SECONDS
+                    counts = hours.setdefault(hour, [0, 0])
+                    counts[0] += 1
+                    counts[1] += message.length
+
+        await self.db.executemany(
+            """
+            INSERT INTO message_stats_hourly (hour, message_count, total_length, deleted_count)
+            VALUES (?, ?, ?, 0)
+            ON CONFLICT(hour) DO UPDATE SET
+                message_count = message_count + excluded.message_count,
+                total_length = total_length + excluded.total_length
+            """,
+            [(hour, count, length) for hour, (count, length) in hours.items()],
+        )
@@ -0,0 +1,235 @@
+"""Compact row types returned by repositories"""
+
+import json
+import re
+import sqlite3
+import zlib
+from collections.abc import Iterable
+from dataclasses import dataclass, field, fields
+from typing import Any, ClassVar, Self
+
+
+class _Record:
+    """Dict-compatible access for slotted row types
+
+    Records are built directly from cursor tuples (see from_row), but still
+    support `record["field"]`, `record.get("field")` and `to_dict()` so code
+    written against the former dict rows keeps working.
+    """
+
+    __slots__ = ()
+
+    # Column list matching field order, used in SELECT/RETURNING clauses
+    COLUMNS: ClassVar[str]
+
+    @classmethod
+    def from_row(cls, cursor: sqlite3.Cursor, row: tuple[Any, ...]) -> Self:
+        """sqlite3 row factory building the record from a row tuple
+
+        Args:
+            cursor: Cursor that produced the row (unused)
+            row: Row values in COLUMNS order
+
+        Returns:
+            Record instance
+        """
+        return cls(*row)
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get field value by name like dict.get()"""
+        return getattr(self, key, default)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert record to plain dict"""
+        return {field.name: getattr(self, field.name) for field in fields(self)}  # type: ignore[arg-type]
+
+
+@dataclass(slots=True)
+class UserRecord(_Record):
+    """Row of the users table"""
+
+    COLUMNS: ClassVar[str] = "id, username, first_name, created_at, last_accessed, deleted_at"
+
+    id: int
+    username: str | None
+    first_name: str
+    created_at: str
+    last_accessed: str
+    deleted_at: str | None
+
+
+@dataclass(slots=True, eq=False)
+class MessageRecord(_Record):
+    """Row of the messages table
+
+    Compressed rows keep the stored form (empty stored_content, content_z):
+    the content property decompresses on first access and caches the plain
+    text, so rows whose text is never read are never decompressed.
+    """
+
+    COLUMNS: ClassVar[str] = "id, user_id, role, content, length, created_at, deleted_at, content_z"
+
+    id: int
+    user_id: int
+    role: str
+    stored_content: str
+    length: int
+    created_at: str
+    deleted_at: str | None
+    content_z: bytes | None = field(default=None, repr=False)
+
+    @property
+    def content(self) -> str:
+        """Plain message text"""
+        if self.content_z is not None:
+            self.stored_content = decompress_content(self.stored_content, self.content_z)
+            self.content_z = None
+        return self.stored_content
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, MessageRecord):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert record to plain dict with the plain text as content"""
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "role": self.role,
+            "content": self.content,
+            "length": self.length,
+            "created_at": self.created_at,
+            "deleted_at": self.deleted_at,
+        }
+
+
+def compress_content(content: str, threshold: int) -> tuple[str, bytes | None]:
+    """Storage form of message text for the content / content_z columns
+
+    Args:
+        content: Plain message text
+        threshold: Compress texts of at least this many UTF-8 bytes (0 - never)
+
+    Returns:
+        (content, None) for plain storage or ('', zlib-compressed UTF-8 text)
+        when compression is enabled and actually saves space
+    """
+    if threshold <= 0:
+        return content, None
+    encoded = content.encode("utf-8")
+    if len(encoded) < threshold:
+        return content, None
+    compressed = zlib.compress(encoded)
+    if len(compressed) >= len(encoded):
+        return content, None
+    return "", compressed
+
+
+def decompress_content(content: str, content_z: bytes | None) -> str:
+    """Plain message text from the content / content_z columns
+
+    Args:
+        content: Stored text ('' for compressed messages)
+        content_z: Compressed text or None
+
+    Returns:
+        Plain message text
+    """
+    if content_z is None:
+        return content
+    return zlib.decompress(content_z).decode("utf-8")
+
+
+# Tokens of a text, like the FTS5 unicode61 tokenizer (case folded on comparison)
+_TOKEN = re.compile(r"\w+")
+
+
+def text_snippet(
+    text: str, words: Iterable[str], highlight: tuple[str, str], max_tokens: int = 16
+) -> str:
+    """Fragment of text around the first matched word, like FTS5 snippet()
+
+    Used for compressed messages, whose text FTS5 can't read.
+
+    Args:
+        text: Plain message text
+        words: Words of the search query
+        highlight: Markers inserted around matched tokens
+        max_tokens: Tokens in the fragment
+
+    Returns:
+        Fragment with matched tokens highlighted, '…' where text is cut
+    """
+    terms = {token.casefold() for word in words for token in _TOKEN.findall(word)}
+    tokens = list(_TOKEN.finditer(text))
+    first = next((i for i, t in enumerate(tokens) if t.group().casefold() in terms), 0)
+    start = max(0, min(first - max_tokens // 4, len(tokens) - max_tokens))
+    window = tokens[start : start + max_tokens]
+    if not window:
+        return ""
+
+    parts = []
+    position = window[0].start()
+    for token in window:
+        parts.append(text[position : token.start()])
+        if token.group().casefold() in terms:
+            parts.append(f"{highlight[0]}{token.group()}{highlight[1]}")
+        else:
+            parts.append(token.group())
+        position = token.end()
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if start + max_tokens < len(tokens) else ""
+    return prefix + "".join(parts) + suffix
+
+
+def pack_messages(messages: Iterable[MessageRecord]) -> bytes:
+    """Serialize active messages of one user into a compressed archive blob
+
+    Only fields that differ between messages are stored: user_id is the key
+    of the archive row and archived messages are never deleted.
+
+    Args:
+        messages: Messages of one user, ordered by id
+
+    Returns:
+        zlib-compressed JSON array of [id, role, content, length, created_at]
+    """
+    rows = [[m.id, m.role, m.content, m.length, m.created_at] for m in messages]
+    return zlib.compress(json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode())
+
+
+def unpack_messages(user_id: int, data: bytes) -> list[MessageRecord]:
+    """Restore messages from an archive blob built by pack_messages()
+
+    Args:
+        user_id: Owner of the archive row
+        data: Archive blob
+
+    Returns:
+        Message records in the stored order (by id)
+    """
+    return [
+        MessageRecord(id, user_id, role, content, length, created_at, None)
+        for id, role, content, length, created_at in json.loads(zlib.decompress(data))
+    ]
+
+
+@dataclass(slots=True)
+class SearchHitRecord(_Record):
+    """Message matched by full-text search, with its highlighted fragment"""
+
+    COLUMNS: ClassVar[str] = "id, user_id, role, snippet, created_at, rank"
+
+    id: int
+    user_id: int
+    role: str
+    snippet: str  # Fragment of content with the matched terms highlighted
+    created_at: str
+    rank: float  # bm25 score, lower is more relevant
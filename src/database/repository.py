@@ -1,36 +1,141 @@
 """Repository layer for database access using direct SQL with aiosqlite"""
 
+import asyncio
 import logging
+import secrets
+import sqlite3
+import time
+from collections import OrderedDict
+from collections.abc import AsyncGenerator, AsyncIterator, Callable, Iterable, Sequence
+from contextlib import aclosing, asynccontextmanager, suppress
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal, TypeVar, overload
 
 import aiosqlite
 
+from src.config import Config
+from src.database.conversation_cache import ConversationCache
+from src.database.records import (
+    MessageRecord,
+    SearchHitRecord,
+    UserRecord,
+    compress_content,
+    decompress_content,
+    text_snippet,
+    unpack_messages,
+)
+
 logger = logging.getLogger("telegram_bot")
 
+T = TypeVar("T")
+
+# sqlite3 row factory building a typed record from a row tuple (see records.py)
+RowFactory = Callable[[sqlite3.Cursor, tuple[Any, ...]], T]
+
+
+@dataclass
+class _Transaction:
+    """Transaction opened by DatabaseManager.transaction()"""
+
+    connection: aiosqlite.Connection
+    after_commit: list[Callable[[], None]] = field(default_factory=list)
+
+
+# Transaction opened by the current task (see DatabaseManager.transaction)
+_current_transaction: ContextVar[_Transaction | None] = ContextVar(
+    "current_transaction", default=None
+)
+
+
+@dataclass
+class _WriteRequest:
+    """Write statement waiting in the group-commit queue"""
+
+    query: str
+    params: tuple[Any, ...]
+    future: "asyncio.Future[Any]"
+    returning: bool = False
+    row_factory: RowFactory[Any] | None = None
+
 
 class DatabaseManager:
     """Singleton database manager for SQLite connections
 
-    Manages a single connection to the SQLite database with proper async support.
+    Manages one writer connection and a pool of read-only connections to the
+    SQLite database with proper async support. Writes are serialized through the
+    writer, while reads are spread over the pool so that long analytical queries
+    do not block message inserts (WAL mode allows concurrent readers).
     All queries are executed using direct SQL without ORM.
+
+    Optionally (group_commit_interval > 0) writes are collected into a queue and
+    committed in one transaction per batch instead of one commit per statement.
+
+    Use transaction() to group several repository calls into one BEGIN/COMMIT.
     """
 
+    db_path: str
+    read_pool_size: int
+    group_commit_interval: float
+    group_commit_max_batch: int
+
     _instance: "DatabaseManager | None" = None
+    _write_lock: asyncio.Lock
+    _batch_ready: asyncio.Event
     _connection: aiosqlite.Connection | None = None
-
-    def __new__(cls, db_path: str = "data/bot.db") -> "DatabaseManager":
+    _reader_pool: "asyncio.Queue[aiosqlite.Connection] | None" = None
+    _readers: list[aiosqlite.Connection] = []
+    _write_queue: "asyncio.Queue[_WriteRequest | None] | None" = None
+    _write_flusher: "asyncio.Task[None] | None" = None
+    # Random per init(): data_version() tokens don't repeat across restarts
+    _session_id: str = ""
+    _commit_count: int = 0
+
+    def __new__(
+        cls,
+        db_path: str = "data/bot.db",
+        read_pool_size: int = 4,
+        group_commit_interval: float = 0.0,
+        group_commit_max_batch: int = 100,
+    ) -> "DatabaseManager":
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance.db_path = db_path
+            cls._instance.read_pool_size = read_pool_size
+            cls._instance.group_commit_interval = group_commit_interval
+            cls._instance.group_commit_max_batch = group_commit_max_batch
         return cls._instance
 
+    @classmethod
+    def from_config(cls, config: Config) -> "DatabaseManager":
+        """Get database manager configured from application config
+
+        Args:
+            config: Application configuration
+
+        Returns:
+            DatabaseManager singleton instance
+        """
+        return cls(
+            config.database_path,
+            read_pool_size=config.database_read_pool_size,
+            group_commit_interval=config.database_group_commit_ms / 1000,
+            group_commit_max_batch=config.database_group_commit_max_batch,
+        )
+
+    @property
+    def is_memory(self) -> bool:
+        """Whether the database lives in memory (readers can't be pooled)"""
+        return self.db_path == ":memory:"
+
     async def init(self) -> None:
-        """Initialize database connection and configure SQLite
+        """Initialize database connections and configure SQLite
 
         Sets up:
-        - Foreign key constraints (enabled)
+        - Writer connection with foreign key constraints (enabled)
         - WAL mode for better concurrency
+        - Pool of read-only connections (file databases only)
         - Row factory for dict-like access
         """
         # Skip if already initialized
@@ -42,29 +147,181 @@ class DatabaseManager:
         db_path = Path(self.db_path)
         db_path.parent.mkdir(parents=True, exist_ok=True)
 
-        # Open connection
+        # Open writer connection
         self._connection = await aiosqlite.connect(self.db_path)
+        self._write_lock = asyncio.Lock()
+        self._session_id = secrets.token_hex(4)
+        self._commit_count = 0
 
         # Enable foreign keys
         await self._connection.execute("PRAGMA foreign_keys = ON")
 
-        # Set WAL mode for better concurrency
-        await self._connection.execute("PRAGMA journal_mode = WAL")
+        # Set WAL mode for better concurrency. The result row must be read:
+        # until the statement finishes, readers of an existing database get
+        # "database is locked"
+        await self._connection.execute_fetchall("PRAGMA journal_mode = WAL")
 
         # Set row factory to return dicts
         self._connection.row_factory = aiosqlite.Row
 
-        logger.info(f"Database initialized: {self.db_path}")
+        # In-memory databases are private to a connection, so reads stay on the writer
+        if not self.is_memory and self.read_pool_size > 0:
+            reader_uri = f"{db_path.resolve().as_uri()}?mode=ro"
+            self._readers = []
+            self._reader_pool = asyncio.Queue()
+            for _ in range(self.read_pool_size):
+                reader = await aiosqlite.connect(reader_uri, uri=True)
+                reader.row_factory = aiosqlite.Row
+                self._readers.append(reader)
+                self._reader_pool.put_nowait(reader)
+
+        # Group commit is opt-in: writes are batched by a background flusher
+        if self.group_commit_interval > 0:
+            self._write_queue = asyncio.Queue()
+            self._batch_ready = asyncio.Event()
+            self._write_flusher = asyncio.create_task(self._group_commit_loop())
+
+        logger.info(f"Database initialized: {self.db_path} (read pool size: {len(self._readers)})")
 
     async def close(self) -> None:
-        """Close database connection"""
+        """Flush pending writes and close writer and reader connections"""
+        if self._write_queue is not None and self._write_flusher is not None:
+            # Sentinel stops the flusher after it commits everything queued before it
+            self._write_queue.put_nowait(None)
+            self._batch_ready.set()
+            await self._write_flusher
+            self._write_queue = None
+            self._write_flusher = None
+
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+        self._reader_pool = None
+
         if self._connection:
             await self._connection.close()
             self._connection = None
             logger.info("Database connection closed")
 
+    @asynccontextmanager
+    async def _read_connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool
+
+        Falls back to the writer connection when the pool is disabled or
+        when called inside transaction().
+
+        Yields:
+            Connection to run read queries on
+
+        Raises:
+            RuntimeError: If connection not initialized
+        """
+        if not self._connection:
+            raise RuntimeError("Database connection not initialized. Call init() first.")
+
+        # Inside a transaction read own uncommitted writes
+        transaction = _current_transaction.get()
+        if transaction is not None:
+            yield transaction.connection
+            return
+
+        if self._reader_pool is None:
+            yield self._connection
+            return
+
+        reader = await self._reader_pool.get()
+        try:
+            yield reader
+        finally:
+            self._reader_pool.put_nowait(reader)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        """Run repository calls in one transaction (unit of work)
+
+        All execute/fetch calls made by the current task inside the block share
+        one BEGIN IMMEDIATE ... COMMIT on the writer connection. An exception
+        rolls everything back. Nested blocks join the outer transaction.
+
+        Example:
+            async with db_manager.transaction():
+                await user_repo.get_or_create(chat_id, username, first_name)
+                await message_repo.create(chat_id, "user", text)
+
+        Raises:
+            RuntimeError: If connection not initialized
+        """
+        if not self._connection:
+            raise RuntimeError("Database connection not initialized. Call init() first.")
+
+        if _current_transaction.get() is not None:
+            yield
+            return
+
+        transaction = _Transaction(self._connection)
+        async with self._write_lock:
+            await self._connection.execute("BEGIN IMMEDIATE")
+            token = _current_transaction.set(transaction)
+            try:
+                yield
+            except BaseException:
+                await self._connection.rollback()
+                raise
+            else:
+                await self._connection.commit()
+                self._commit_count += 1
+            finally:
+                _current_transaction.reset(token)
+
+        for callback in transaction.after_commit:
+            callback()
+
+    async def data_version(self) -> str:
+        """Token that changes whenever the database content may have changed
+
+        Combines SQLite `PRAGMA data_version` of the writer connection, which
+        changes when other connections (e.g. the bot process) commit, with the
+        number of commits made through this manager, which the pragma doesn't
+        count. Costs one pragma, no table is read.
+
+        Returns:
+            Opaque version string, equal tokens mean unchanged data
+
+        Raises:
+            RuntimeError: If connection not initialized
+        """
+        if not self._connection:
+            raise RuntimeError("Database connection not initialized. Call init() first.")
+
+        rows = await self._connection.execute_fetchall("PRAGMA data_version")
+        return f"{self._session_id}-{next(iter(rows))[0]}-{self._commit_count}"
+
+    @property
+    def in_transaction(self) -> bool:
+        """Whether the current task runs inside transaction()"""
+        return _current_transaction.get() is not None
+
+    def call_after_commit(self, callback: Callable[[], None]) -> None:
+        """Run callback once the current write is durable
+
+        Inside transaction() the callback is deferred until COMMIT and dropped on
+        rollback; otherwise writes are already committed and it runs immediately.
+        Used to keep in-process caches consistent with the database.
+
+        Args:
+            callback: Function without arguments
+        """
+        transaction = _current_transaction.get()
+        if transaction is not None:
+            transaction.after_commit.append(callback)
+        else:
+            callback()
+
     async def execute(self, query: str, params: tuple[Any, ...] = ()) -> aiosqlite.Cursor:
-        """Execute SQL query
+        """Execute SQL query on the writer connection and commit
+
+        Inside transaction() the statement joins the open transaction and is
+        committed together with it.
 
         Args:
             query: SQL query string
@@ -76,68 +333,393 @@ class DatabaseManager:
         Raises:
             RuntimeError: If connection not initialized
         """
-        if not self._connection:
-            raise RuntimeError("Database connection not initialized. Call init() first.")
+        cursor: aiosqlite.Cursor = await self._write(query, params, returning=False)
+        return cursor
+
+    async def executemany(
+        self, query: str, params_seq: Iterable[tuple[Any, ...]]
+    ) -> aiosqlite.Cursor:
+        """Execute SQL query for every parameter tuple in one transaction
+
+        The whole batch costs a single commit. Inside transaction() it joins the
+        open transaction instead.
+
+        Args:
+            query: SQL query string (INSERT/UPDATE/DELETE without RETURNING)
+            params_seq: Parameter tuples, one per execution
 
-        cursor = await self._connection.execute(query, params)
-        await self._connection.commit()
+        Returns:
+            Cursor object
+
+        Raises:
+            RuntimeError: If connection not initialized
+        """
+        async with self.transaction():
+            transaction = _current_transaction.get()
+            assert transaction is not None
+            cursor = await transaction.connection.executemany(query, params_seq)
         return cursor
 
-    async def fetchone(self, query: str, params: tuple[Any, ...] = ()) -> dict[str, Any] | None:
-        """Execute query and fetch one row as dict
+    @overload
+    async def execute_returning(
+        self, query: str, params: tuple[Any, ...] = ()
+    ) -> list[dict[str, Any]]: ...
+
+    @overload
+    async def execute_returning(
+        self, query: str, params: tuple[Any, ...] = (), *, row_factory: RowFactory[T]
+    ) -> list[T]: ...
+
+    async def execute_returning(
+        self,
+        query: str,
+        params: tuple[Any, ...] = (),
+        *,
+        row_factory: RowFactory[Any] | None = None,
+    ) -> list[Any]:
+        """Execute write query with RETURNING clause and commit
+
+        Rows are fetched before the commit, so the write and the read cost a
+        single statement.
+
+        Args:
+            query: SQL query string (INSERT/UPDATE/DELETE ... RETURNING ...)
+            params: Query parameters
+            row_factory: Build rows with this factory instead of dicts
+
+        Returns:
+            List of returned rows (dicts by default)
+
+        Raises:
+            RuntimeError: If connection not initialized
+        """
+        rows: list[Any] = await self._write(query, params, True, row_factory)
+        return rows
+
+    async def _write(
+        self,
+        query: str,
+        params: tuple[Any, ...],
+        returning: bool,
+        row_factory: RowFactory[Any] | None = None,
+    ) -> Any:
+        """Route write to the open transaction, the group-commit queue or the writer
 
         Args:
             query: SQL query string
             params: Query parameters
+            returning: Fetch returned rows instead of returning the cursor
+            row_factory: Factory for returned rows (dicts if None)
 
         Returns:
-            Dict with row data or None if no results
+            Cursor or list of returned rows
+
+        Raises:
+            RuntimeError: If connection not initialized
         """
         if not self._connection:
             raise RuntimeError("Database connection not initialized. Call init() first.")
 
-        cursor = await self._connection.execute(query, params)
-        row = await cursor.fetchone()
-        if row:
-            return dict(row)
-        return None
+        transaction = _current_transaction.get()
+        if transaction is not None:
+            cursor = await transaction.connection.execute(query, params)
+            return await self._write_result(cursor, returning, row_factory)
+
+        if self._write_queue is not None:
+            future: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+            request = _WriteRequest(query, params, future, returning, row_factory)
+            self._write_queue.put_nowait(request)
+            if self._write_queue.qsize() >= self.group_commit_max_batch:
+                self._batch_ready.set()
+            return await future
+
+        async with self._write_lock:
+            cursor = await self._connection.execute(query, params)
+            result = await self._write_result(cursor, returning, row_factory)
+            await self._connection.commit()
+            self._commit_count += 1
+        return result
+
+    @staticmethod
+    async def _write_result(
+        cursor: aiosqlite.Cursor, returning: bool, row_factory: RowFactory[Any] | None
+    ) -> Any:
+        """Cursor itself or its returned rows (dicts unless row_factory is given)"""
+        if not returning:
+            return cursor
+        if row_factory is not None:
+            cursor.row_factory = row_factory  # type: ignore[assignment]
+            return await cursor.fetchall()
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    async def _group_commit_loop(self) -> None:
+        """Background flusher: commit queued writes in batches
 
-    async def fetchall(self, query: str, params: tuple[Any, ...] = ()) -> list[dict[str, Any]]:
-        """Execute query and fetch all rows as list of dicts
+        Waits for the first write, then gives concurrent handlers up to
+        group_commit_interval seconds (or until group_commit_max_batch writes
+        are queued) to join the batch before committing it.
+        """
+        assert self._write_queue is not None
+        queue = self._write_queue
+
+        while True:
+            first = await queue.get()
+            if first is None:
+                return
+
+            if queue.qsize() + 1 < self.group_commit_max_batch:
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(self._batch_ready.wait(), self.group_commit_interval)
+            self._batch_ready.clear()
+
+            batch = [first]
+            stop = False
+            while len(batch) < self.group_commit_max_batch and not queue.empty():
+                request = queue.get_nowait()
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+
+            await self._commit_batch(batch)
+            if stop:
+                # Writes queued while closing still get committed
+                leftovers = [queue.get_nowait() for _ in range(queue.qsize())]
+                pending = [request for request in leftovers if request is not None]
+                if pending:
+                    await self._commit_batch(pending)
+                return
+
+    async def _commit_batch(self, batch: list[_WriteRequest]) -> None:
+        """Execute queued writes in one transaction and resolve their futures
+
+        A failing statement only fails its own future; a failing commit rolls
+        back the whole batch and fails every future in it. So does a statement
+        error after which SQLite rolled back the transaction itself (e.g.
+        SQLITE_FULL, RAISE(ROLLBACK) in a trigger): the earlier writes of the
+        batch are gone, and later ones would run in a new transaction.
+
+        Args:
+            batch: Queued write requests
+        """
+        assert self._connection is not None
+        results: list[tuple[_WriteRequest, Any, BaseException | None]] = []
+        batch_error: BaseException | None = None
+
+        async with self._write_lock:
+            for request in batch:
+                try:
+                    cursor = await self._connection.execute(request.query, request.params)
+                    result = await self._write_result(
+                        cursor, request.returning, request.row_factory
+                    )
+                    results.append((request, result, None))
+                except Exception as e:
+                    results.append((request, None, e))
+                    wrote = any(error is None for _, _, error in results)
+                    if wrote and not self._connection.in_transaction:
+                        batch_error = e
+                        break
+
+            if batch_error is None:
+                try:
+                    await self._connection.commit()
+                    self._commit_count += 1
+                except Exception as e:
+                    batch_error = e
+                    await self._connection.rollback()
+            if batch_error is not None:
+                logger.error(
+                    f"Group commit of {len(batch)} writes failed: {batch_error}",
+                    exc_info=batch_error,
+                )
+                results = [(request, None, batch_error) for request in batch]
+
+        logger.debug(f"Group commit: {len(batch)} writes in one transaction")
+        for request, result, error in results:
+            if request.future.done():
+                continue
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                request.future.set_result(result)
+
+    @overload
+    async def fetchone(self, query: str, params: tuple[Any, ...] = ()) -> dict[str, Any] | None: ...
+
+    @overload
+    async def fetchone(
+        self, query: str, params: tuple[Any, ...] = (), *, row_factory: RowFactory[T]
+    ) -> T | None: ...
+
+    async def fetchone(
+        self,
+        query: str,
+        params: tuple[Any, ...] = (),
+        *,
+        row_factory: RowFactory[Any] | None = None,
+    ) -> Any:
+        """Execute query on a reader and fetch one row
 
         Args:
             query: SQL query string
             params: Query parameters
+            row_factory: Build the row with this factory instead of a dict
 
         Returns:
-            List of dicts with row data
+            Row (dict by default) or None if no results
         """
-        if not self._connection:
-            raise RuntimeError("Database connection not initialized. Call init() first.")
+        async with self._read_connection() as connection:
+            cursor = await connection.execute(query, params)
+            if row_factory is not None:
+                cursor.row_factory = row_factory  # type: ignore[assignment]
+            row = await cursor.fetchone()
+            await cursor.close()
+        if row is None or row_factory is not None:
+            return row
+        return dict(row)
+
+    @overload
+    async def fetchall(self, query: str, params: tuple[Any, ...] = ()) -> list[dict[str, Any]]: ...
+
+    @overload
+    async def fetchall(
+        self, query: str, params: tuple[Any, ...] = (), *, row_factory: RowFactory[T]
+    ) -> list[T]: ...
+
+    async def fetchall(
+        self,
+        query: str,
+        params: tuple[Any, ...] = (),
+        *,
+        row_factory: RowFactory[Any] | None = None,
+    ) -> list[Any]:
+        """Execute query on a reader and fetch all rows
+
+        With row_factory the rows are built straight from the cursor tuples,
+        skipping the intermediate sqlite3.Row and dict per row.
 
-        cursor = await self._connection.execute(query, params)
-        rows = await cursor.fetchall()
+        Args:
+            query: SQL query string
+            params: Query parameters
+            row_factory: Build rows with this factory instead of dicts
+
+        Returns:
+            List of rows (dicts by default)
+        """
+        async with self._read_connection() as connection:
+            cursor = await connection.execute(query, params)
+            if row_factory is not None:
+                cursor.row_factory = row_factory  # type: ignore[assignment]
+            rows = await cursor.fetchall()
+            await cursor.close()
+        if row_factory is not None:
+            return list(rows)
         return [dict(row) for row in rows]
 
+    @overload
+    def iterate(
+        self,
+        query: str,
+        params: tuple[Any, ...] = (),
+        batch_size: int = 500,
+        as_dict: Literal[True] = True,
+    ) -> AsyncGenerator[dict[str, Any], None]: ...
+
+    @overload
+    def iterate(
+        self,
+        query: str,
+        params: tuple[Any, ...] = (),
+        batch_size: int = 500,
+        *,
+        as_dict: Literal[False],
+    ) -> AsyncGenerator[tuple[Any, ...], None]: ...
+
+    async def iterate(
+        self,
+        query: str,
+        params: tuple[Any, ...] = (),
+        batch_size: int = 500,
+        as_dict: bool = True,
+    ) -> AsyncGenerator[dict[str, Any] | tuple[Any, ...], None]:
+        """Execute query on a reader and stream rows in batches
+
+        Rows are pulled with fetchmany(batch_size), so at most one batch is held
+        in memory. The reader stays borrowed until iteration finishes, so consume
+        the iterator promptly and wrap it in contextlib.aclosing() when the loop
+        may stop early.
+
+        Example:
+            async with aclosing(db_manager.iterate(query, batch_size=1000)) as rows:
+                async for row in rows:
+                    ...
+
+        Args:
+            query: SQL query string
+            params: Query parameters
+            batch_size: Number of rows fetched per round trip
+            as_dict: Yield dicts (default) or plain tuples (cheaper)
+
+        Yields:
+            Row as dict or tuple
+        """
+        async with self._read_connection() as connection:
+            cursor = await connection.execute(query, params)
+            if not as_dict:
+                cursor.row_factory = None
+            try:
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield dict(row) if as_dict else tuple(row)
+            finally:
+                await cursor.close()
+
 
 class UserRepository:
-    """Repository for user data access using direct SQL"""
+    """Repository for user data access using direct SQL
+
+    Keeps a bounded LRU cache of known users so that repeat users cost no
+    database reads, and debounces last_accessed updates into one batched
+    UPDATE per flush interval.
+    """
+
+    # SQLite limit on host parameters per statement (conservative)
+    _MAX_PARAMS_PER_QUERY = 500
 
-    def __init__(self, db_manager: DatabaseManager):
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        cache_size: int = 10000,
+        last_accessed_flush_interval: float = 60.0,
+    ):
         """Initialize repository
 
         Args:
             db_manager: Database manager instance
+            cache_size: Maximum number of users kept in the LRU cache (0 disables it)
+            last_accessed_flush_interval: Seconds between batched last_accessed writes
         """
         self.db = db_manager
+        self.cache_size = cache_size
+        self.last_accessed_flush_interval = last_accessed_flush_interval
+        self._cache: OrderedDict[int, UserRecord] = OrderedDict()
+        self._pending_last_accessed: set[int] = set()
+        self._last_flush = time.monotonic()
 
     async def get_or_create(
         self, chat_id: int, username: str | None, first_name: str
-    ) -> dict[str, Any]:
+    ) -> UserRecord:
         """Get existing user or create new one
 
-        Uses INSERT OR IGNORE to avoid conflicts, then fetches the user.
-        Updates last_accessed timestamp for existing users.
+        Cached users are returned without touching the database; their
+        last_accessed update is queued for the next batched flush. Otherwise a
+        single INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement creates
+        the user or bumps last_accessed and returns the row.
 
         Args:
             chat_id: Telegram chat ID
@@ -145,64 +727,113 @@ class UserRepository:
             first_name: User's first name
 
         Returns:
-            Dict with user data
+            User record
+
+        Raises:
+            RuntimeError: If user is soft deleted
         """
-        # Try to insert (will be ignored if exists)
-        await self.db.execute(
-            """
-            INSERT OR IGNORE INTO users (id, username, first_name, created_at, last_accessed)
+        cached = self._cache.get(chat_id)
+        if cached is not None:
+            self._cache.move_to_end(chat_id)
+            self._pending_last_accessed.add(chat_id)
+            await self._maybe_flush_last_accessed()
+            return cached
+
+        rows = await self.db.execute_returning(
+            f"""
+            INSERT INTO users (id, username, first_name, created_at, last_accessed)
             VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            ON CONFLICT(id) DO UPDATE SET last_accessed = CURRENT_TIMESTAMP
+            WHERE users.deleted_at IS NULL
+            RETURNING {UserRecord.COLUMNS}
             """,
             (chat_id, username, first_name),
+            row_factory=UserRecord.from_row,
         )
 
-        # Update last_accessed for existing user
-        await self.db.execute(
-            """
-            UPDATE users
-            SET last_accessed = CURRENT_TIMESTAMP
-            WHERE id = ? AND deleted_at IS NULL
-            """,
-            (chat_id,),
-        )
-
-        # Fetch and return user
-        user = await self.db.fetchone(
-            "SELECT * FROM users WHERE id = ? AND deleted_at IS NULL", (chat_id,)
-        )
-
-        if not user:
+        # No row returned means the conflicting user is soft deleted
+        if not rows:
             raise RuntimeError(f"Failed to get or create user with chat_id={chat_id}")
 
+        user = rows[0]
+        # Cache only committed users, otherwise a rolled back insert stays "known"
+        self.db.call_after_commit(lambda: self._cache_user(user))
         return user
 
-    async def get_by_id(self, chat_id: int) -> dict[str, Any] | None:
+    async def get_by_id(self, chat_id: int) -> UserRecord | None:
         """Get user by chat_id
 
         Args:
             chat_id: Telegram chat ID
 
         Returns:
-            Dict with user data or None if not found
+            User record or None if not found
         """
         return await self.db.fetchone(
-            "SELECT * FROM users WHERE id = ? AND deleted_at IS NULL", (chat_id,)
+            f"SELECT {UserRecord.COLUMNS} FROM users WHERE id = ? AND deleted_at IS NULL",
+            (chat_id,),
+            row_factory=UserRecord.from_row,
         )
 
-    async def update_last_accessed(self, chat_id: int) -> None:
-        """Update last_accessed timestamp
+    async def flush_last_accessed(self) -> None:
+        """Write queued last_accessed updates in one batched UPDATE
+
+        Runs from get_or_create() once the flush interval has passed, and from
+        run_last_accessed_flusher() so idle periods are flushed too. Call on
+        shutdown to persist updates queued since the last flush.
+
+        Users stay queued until the update commits: after a failed write, or
+        a rollback of the transaction the flush joined, the next flush
+        retries them.
+        """
+        self._last_flush = time.monotonic()
+        if not self._pending_last_accessed:
+            return
+
+        chat_ids = list(self._pending_last_accessed)
+        async with self.db.transaction():
+            for start in range(0, len(chat_ids), self._MAX_PARAMS_PER_QUERY):
+                chunk = chat_ids[start : start + self._MAX_PARAMS_PER_QUERY]
+                placeholders = ", ".join("?" * len(chunk))
+                await self.db.execute(
+                    f"""
+                    UPDATE users
+                    SET last_accessed = CURRENT_TIMESTAMP
+                    WHERE id IN ({placeholders}) AND deleted_at IS NULL
+                    """,
+                    tuple(chunk),
+                )
+            self.db.call_after_commit(
+                lambda: self._pending_last_accessed.difference_update(chat_ids)
+            )
+        logger.debug(f"Flushed last_accessed for {len(chat_ids)} users")
+
+    async def run_last_accessed_flusher(self, interval_seconds: float) -> None:
+        """Run flush_last_accessed() every interval until cancelled
 
         Args:
-            chat_id: Telegram chat ID
+            interval_seconds: Pause between flushes
         """
-        await self.db.execute(
-            """
-            UPDATE users
-            SET last_accessed = CURRENT_TIMESTAMP
-            WHERE id = ? AND deleted_at IS NULL
-            """,
-            (chat_id,),
-        )
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.flush_last_accessed()
+            except Exception as e:
+                logger.warning(f"Flushing last_accessed failed: {e}")
+
+    async def _maybe_flush_last_accessed(self) -> None:
+        """Flush queued last_accessed updates once the flush interval has passed"""
+        if time.monotonic() - self._last_flush >= self.last_accessed_flush_interval:
+            await self.flush_last_accessed()
+
+    def _cache_user(self, user: UserRecord) -> None:
+        """Put user into the LRU cache, evicting the least recently used one"""
+        if self.cache_size <= 0:
+            return
+        self._cache[user.id] = user
+        self._cache.move_to_end(user.id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
 
     async def soft_delete(self, chat_id: int) -> None:
         """Soft delete user by setting deleted_at timestamp
@@ -210,6 +841,8 @@ class UserRepository:
         Args:
             chat_id: Telegram chat ID
         """
+        self._cache.pop(chat_id, None)
+        self._pending_last_accessed.discard(chat_id)
         await self.db.execute(
             """
             UPDATE users
@@ -221,15 +854,54 @@ class UserRepository:
 
 
 class MessageRepository:
-    """Repository for message data access using direct SQL"""
+    """Repository for message data access using direct SQL
+
+    With a ConversationCache attached, get_recent() for context-sized limits is
+    served from memory; create() and soft deletes keep the cache in sync once
+    their writes are committed.
+
+    With compression_threshold set, content of at least that many bytes is
+    stored zlib-compressed in content_z (content is then ''). Records
+    decompress it when the text is read (MessageRecord.content); length and
+    the full-text index are computed from the plain text. New compressed
+    messages are indexed here, other index changes of compressed messages
+    wait in messages_fts_queue for FTSMaintenance.apply_queue().
+
+    Old messages may be moved to messages_archive (see MessageArchiver).
+    get_recent() and get_page() continue into the archive when the hot table
+    has no more messages for the request, so callers see one history.
+    """
+
+    # SQLite limit on host parameters per statement (conservative)
+    _MAX_PARAMS_PER_QUERY = 500
 
-    def __init__(self, db_manager: DatabaseManager):
+    # Hard cap on search results per page, whatever the requested limit
+    MAX_SEARCH_RESULTS = 100
+
+    # Messages soft deleted per UPDATE by the /clear sweeper
+    SWEEP_BATCH_SIZE = 500
+
+    # Messages below the user's /clear marker are not part of the conversation
+    # (uncorrelated, so it's evaluated once and bounds the (user_id, id) range)
+    _NOT_CLEARED = "id >= COALESCE((SELECT cleared_before_id FROM users WHERE id = ?), 0)"
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        context_cache: ConversationCache | None = None,
+        compression_threshold: int = 0,
+    ):
         """Initialize repository
 
         Args:
             db_manager: Database manager instance
+            context_cache: Optional cache of recent messages per user
+            compression_threshold: Compress content of at least this many UTF-8
+                bytes (0 - store everything as plain text)
         """
         self.db = db_manager
+        self.context_cache = context_cache
+        self.compression_threshold = compression_threshold
 
     async def create(self, user_id: int, role: str, content: str) -> int:
         """Create new message
@@ -245,38 +917,283 @@ class MessageRepository:
             ID of created message
         """
         length = len(content)
-        cursor = await self.db.execute(
-            """
-            INSERT INTO messages (user_id, role, content, length, created_at)
-            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-            """,
-            (user_id, role, content, length),
+        stored, content_z = compress_content(content, self.compression_threshold)
+        insert = """
+            INSERT INTO messages (user_id, role, content, content_z, length, created_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            RETURNING id, created_at
+        """
+        params = (user_id, role, stored, content_z, length)
+        if content_z is None:
+            rows = await self.db.execute_returning(insert, params)
+        else:
+            async with self.db.transaction():
+                rows = await self.db.execute_returning(insert, params)
+                await self._index_compressed([(row["id"], content) for row in rows])
+        if not rows:
+            raise RuntimeError("Failed to create message: no row returned")
+
+        message = MessageRecord(
+            rows[0]["id"], user_id, role, content, length, rows[0]["created_at"], None
         )
-        if cursor.lastrowid is None:
-            raise RuntimeError("Failed to create message: no lastrowid returned")
-        return cursor.lastrowid
+        cache = self.context_cache
+        if cache is not None:
+            self.db.call_after_commit(lambda: cache.append(user_id, message))
+        return message.id
+
+    async def create_many(self, messages: Sequence[tuple[int, str, str]]) -> list[int]:
+        """Create many messages with one executemany and one commit
+
+        Used for imports of historical conversations, where a commit per row
+        would dominate. Assigned IDs are contiguous because the insert runs in
+        one transaction on the single writer connection.
 
-    async def get_recent(self, user_id: int, limit: int) -> list[dict[str, Any]]:
+        Args:
+            messages: (user_id, role, content) tuples in insertion order
+
+        Returns:
+            IDs of created messages in the same order
+        """
+        if not messages:
+            return []
+
+        rows = [
+            (user_id, role, *compress_content(content, self.compression_threshold), len(content))
+            for user_id, role, content in messages
+        ]
+        async with self.db.transaction():
+            await self.db.executemany(
+                """
+                INSERT INTO messages (user_id, role, content, content_z, length, created_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                rows,
+            )
+            row = await self.db.fetchone("SELECT last_insert_rowid() AS id")
+            assert row is not None
+            last_id = int(row["id"])
+            ids = list(range(last_id - len(rows) + 1, last_id + 1))
+            await self._index_compressed(
+                [
+                    (message_id, content)
+                    for message_id, (_, _, content), (_, _, _, content_z, _) in zip(
+                        ids, messages, rows, strict=True
+                    )
+                    if content_z is not None
+                ]
+            )
+            for user_id in {user_id for user_id, _, _ in messages}:
+                self._invalidate_cache(user_id)
+        return ids
+
+    async def _index_compressed(self, messages: Sequence[tuple[int, str]]) -> None:
+        """Index new compressed messages with the plain text at hand
+
+        The insert trigger queued them in messages_fts_queue, SQL can't
+        decompress; their queue entries are replaced by indexing the text
+        directly. Runs in the inserting transaction.
+
+        Args:
+            messages: (message ID, plain text) of compressed messages
+        """
+        if not messages:
+            return
+        await self.db.executemany(
+            "DELETE FROM messages_fts_queue WHERE message_id = ? AND action = 'index'",
+            [(message_id,) for message_id, _ in messages],
+        )
+        await self.db.executemany(
+            "INSERT INTO messages_fts(rowid, content) VALUES (?, ?)", messages
+        )
+
+    async def get_recent(self, user_id: int, limit: int) -> list[MessageRecord]:
         """Get recent messages for user
 
         Returns messages ordered by created_at DESC (most recent first).
+        Served from the context cache when possible.
 
         Args:
             user_id: User's chat ID
             limit: Maximum number of messages to return
 
         Returns:
-            List of message dicts (most recent first)
+            List of message records (most recent first)
         """
-        return await self.db.fetchall(
-            """
-            SELECT * FROM messages
-            WHERE user_id = ? AND deleted_at IS NULL
-            ORDER BY created_at DESC
+        cache = self.context_cache
+        # Inside a transaction rows may be uncommitted, so the cache is bypassed
+        if cache is None or limit > cache.capacity or self.db.in_transaction:
+            return await self._fetch_recent(user_id, limit)
+
+        cached = cache.get(user_id, limit)
+        if cached is not None:
+            return cached
+
+        cache.start_fill(user_id)
+        try:
+            messages = await self._fetch_recent(user_id, cache.capacity)
+        except BaseException:
+            cache.cancel_fill(user_id)
+            raise
+        cache.finish_fill(user_id, messages)
+        return messages[:limit]
+
+    async def _fetch_recent(self, user_id: int, limit: int) -> list[MessageRecord]:
+        """Load recent messages for user from the database (most recent first)"""
+        messages = await self.db.fetchall(
+            f"""
+            SELECT {MessageRecord.COLUMNS} FROM messages
+            WHERE user_id = ? AND deleted_at IS NULL AND {self._NOT_CLEARED}
+            ORDER BY created_at_ts DESC, id DESC
             LIMIT ?
             """,
-            (user_id, limit),
+            (user_id, user_id, limit),
+            row_factory=MessageRecord.from_row,
         )
+        if len(messages) < limit:
+            before_id = min(m.id for m in messages) if messages else None
+            messages += await self._fetch_archived(user_id, limit - len(messages), before_id)
+        return messages
+
+    async def _fetch_archived(
+        self,
+        user_id: int,
+        limit: int,
+        before_id: int | None = None,
+        after_id: int | None = None,
+    ) -> list[MessageRecord]:
+        """Load archived messages of user from messages_archive
+
+        Blobs are read and decompressed one month at a time, only as many
+        as the requested messages need.
+
+        Args:
+            user_id: User's chat ID
+            limit: Maximum number of messages to return
+            before_id: Return messages with id < before_id, newest first
+            after_id: Return messages with id > after_id, oldest first
+
+        Returns:
+            List of message records
+        """
+        cleared = "COALESCE((SELECT cleared_before_id FROM users WHERE id = ?), 0)"
+        if after_id is not None:
+            query = f"""
+                SELECT data, {cleared} AS cleared_before_id FROM messages_archive
+                WHERE user_id = ? AND last_id > ? AND last_id >= {cleared}
+                ORDER BY month ASC
+            """
+            params: tuple[Any, ...] = (user_id, user_id, after_id, user_id)
+        else:
+            query = f"""
+                SELECT data, {cleared} AS cleared_before_id FROM messages_archive
+                WHERE user_id = ? AND first_id < ? AND last_id >= {cleared}
+                ORDER BY month DESC
+            """
+            upper = before_id if before_id is not None else 2**63 - 1
+            params = (user_id, user_id, upper, user_id)
+
+        messages: list[MessageRecord] = []
+        async with aclosing(self.db.iterate(query, params, batch_size=1)) as rows:
+            async for row in rows:
+                month = unpack_messages(user_id, row["data"])
+                if after_id is None:
+                    month.reverse()
+                for message in month:
+                    if message.id < row["cleared_before_id"]:
+                        continue
+                    if before_id is not None and message.id >= before_id:
+                        continue
+                    if after_id is not None and message.id <= after_id:
+                        continue
+                    messages.append(message)
+                    if len(messages) == limit:
+                        return messages
+        return messages
+
+    async def get_page(
+        self,
+        user_id: int,
+        limit: int,
+        before_id: int | None = None,
+        after_id: int | None = None,
+    ) -> tuple[list[MessageRecord], int | None]:
+        """Get page of user messages using keyset pagination
+
+        Without cursors returns the newest messages. `before_id` pages back to
+        older messages, `after_id` pages forward to newer ones. Each page is an
+        index range scan on (user_id, id), so its cost does not depend on how
+        far back the page is. Pages reaching past the hot table are completed
+        from messages_archive.
+
+        Args:
+            user_id: User's chat ID
+            limit: Maximum number of messages in the page
+            before_id: Return messages with id < before_id
+            after_id: Return messages with id > after_id
+
+        Returns:
+            Tuple of (messages ordered by id ASC, cursor for the next page in the
+            same direction or None if there are no more messages)
+
+        Raises:
+            ValueError: If both before_id and after_id are given
+        """
+        if before_id is not None and after_id is not None:
+            raise ValueError("Only one of before_id and after_id can be given")
+
+        if after_id is not None:
+            rows = await self.db.fetchall(
+                f"""
+                SELECT {MessageRecord.COLUMNS} FROM messages
+                WHERE user_id = ? AND deleted_at IS NULL AND {self._NOT_CLEARED} AND id > ?
+                ORDER BY id ASC
+                LIMIT ?
+                """,
+                (user_id, user_id, after_id, limit + 1),
+                row_factory=MessageRecord.from_row,
+            )
+            # Archived messages are older than the hot ones, the archive is
+            # read only while the cursor hasn't passed its last message
+            archived_last = await self.db.fetchone(
+                "SELECT MAX(last_id) AS last_id FROM messages_archive WHERE user_id = ?",
+                (user_id,),
+            )
+            if archived_last and (archived_last["last_id"] or 0) > after_id:
+                archived = await self._fetch_archived(user_id, limit + 1, after_id=after_id)
+                rows = (archived + rows)[: limit + 1]
+            has_more = len(rows) > limit
+            messages = rows[:limit]
+            return messages, messages[-1].id if has_more else None
+
+        if before_id is not None:
+            rows = await self.db.fetchall(
+                f"""
+                SELECT {MessageRecord.COLUMNS} FROM messages
+                WHERE user_id = ? AND deleted_at IS NULL AND {self._NOT_CLEARED} AND id < ?
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                (user_id, user_id, before_id, limit + 1),
+                row_factory=MessageRecord.from_row,
+            )
+        else:
+            rows = await self.db.fetchall(
+                f"""
+                SELECT {MessageRecord.COLUMNS} FROM messages
+                WHERE user_id = ? AND deleted_at IS NULL AND {self._NOT_CLEARED}
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                (user_id, user_id, limit + 1),
+                row_factory=MessageRecord.from_row,
+            )
+        if len(rows) <= limit:
+            oldest_id = rows[-1].id if rows else before_id
+            rows += await self._fetch_archived(user_id, limit + 1 - len(rows), oldest_id)
+        has_more = len(rows) > limit
+        messages = rows[:limit]
+        messages.reverse()
+        return messages, messages[0].id if has_more else None
 
     async def soft_delete(self, message_id: int) -> None:
         """Soft delete message by setting deleted_at timestamp
@@ -284,47 +1201,281 @@ class MessageRepository:
         Args:
             message_id: Message ID
         """
-        await self.db.execute(
+        rows = await self.db.execute_returning(
             """
             UPDATE messages
             SET deleted_at = CURRENT_TIMESTAMP
             WHERE id = ?
+            RETURNING user_id
             """,
             (message_id,),
         )
+        for row in rows:
+            self._invalidate_cache(row["user_id"])
 
-    async def soft_delete_all_for_user(self, user_id: int) -> None:
-        """Soft delete all messages for user
+    async def soft_delete_many(self, message_ids: Sequence[int], chunk_size: int = 0) -> int:
+        """Soft delete many messages by ID
 
-        Used for /clear command.
+        Messages are deleted in chunks of `chunk_size` IDs, one UPDATE and one
+        commit per chunk, so a large delete does not hold the writer for long.
+        Inside transaction() all chunks join the open transaction.
+
+        Args:
+            message_ids: Message IDs
+            chunk_size: IDs per UPDATE (defaults to the host parameter limit)
+
+        Returns:
+            Number of messages deleted (already deleted ones are not counted)
+        """
+        chunk_size = min(chunk_size or self._MAX_PARAMS_PER_QUERY, self._MAX_PARAMS_PER_QUERY)
+        deleted = 0
+        for start in range(0, len(message_ids), chunk_size):
+            chunk = message_ids[start : start + chunk_size]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = await self.db.execute_returning(
+                f"""
+                UPDATE messages
+                SET deleted_at = CURRENT_TIMESTAMP
+                WHERE id IN ({placeholders}) AND deleted_at IS NULL
+                RETURNING user_id
+                """,
+                tuple(chunk),
+            )
+            deleted += len(rows)
+            for user_id in {row["user_id"] for row in rows}:
+                self._invalidate_cache(user_id)
+        return deleted
+
+    async def clear_history(self, user_id: int) -> bool:
+        """Clear conversation of user in constant time
+
+        Used for /clear command. Instead of soft deleting every message, moves
+        the user's cleared_before_id marker past the newest message with one
+        row write; messages below it are hidden from get_recent(), get_page()
+        and search() and soft deleted later by sweep_cleared(). Archived
+        messages below the marker stay hidden in messages_archive.
 
         Args:
             user_id: User's chat ID
+
+        Returns:
+            True if the conversation had messages, False if it was already empty
         """
-        await self.db.execute(
+        rows = await self.db.execute_returning(
             """
-            UPDATE messages
-            SET deleted_at = CURRENT_TIMESTAMP
-            WHERE user_id = ? AND deleted_at IS NULL
+            UPDATE users
+            SET cleared_before_id = MAX(
+                    COALESCE((
+                        SELECT MAX(id) FROM messages
+                        WHERE user_id = users.id AND deleted_at IS NULL
+                    ), 0),
+                    COALESCE((
+                        SELECT MAX(last_id) FROM messages_archive WHERE user_id = users.id
+                    ), 0)
+                ) + 1,
+                cleared_swept = 0
+            WHERE id = ? AND (
+                EXISTS (
+                    SELECT 1 FROM messages
+                    WHERE user_id = users.id AND deleted_at IS NULL
+                    AND id >= users.cleared_before_id
+                )
+                OR EXISTS (
+                    SELECT 1 FROM messages_archive
+                    WHERE user_id = users.id AND last_id >= users.cleared_before_id
+                )
+            )
+            RETURNING cleared_before_id
             """,
             (user_id,),
         )
+        if not rows:
+            return False
+        self._invalidate_cache(user_id)
+        return True
+
+    async def sweep_cleared(self, max_users: int = 100) -> int:
+        """Soft delete messages hidden by clear_history()
+
+        Works in batches of SWEEP_BATCH_SIZE messages, one UPDATE and commit
+        per batch, so the writer is never held for long. A user is marked as
+        swept only if the marker didn't move during the sweep.
+
+        Args:
+            max_users: Maximum number of users swept by this call
 
-    async def search_fts(self, query: str) -> list[dict[str, Any]]:
+        Returns:
+            Number of soft deleted messages
+        """
+        users = await self.db.fetchall(
+            "SELECT id, cleared_before_id FROM users WHERE cleared_swept = 0 LIMIT ?",
+            (max_users,),
+        )
+        swept = 0
+        for user in users:
+            while True:
+                cursor = await self.db.execute(
+                    """
+                    UPDATE messages
+                    SET deleted_at = CURRENT_TIMESTAMP
+                    WHERE id IN (
+                        SELECT id FROM messages
+                        WHERE user_id = ? AND deleted_at IS NULL AND id < ?
+                        LIMIT ?
+                    )
+                    """,
+                    (user["id"], user["cleared_before_id"], self.SWEEP_BATCH_SIZE),
+                )
+                swept += cursor.rowcount
+                if cursor.rowcount < self.SWEEP_BATCH_SIZE:
+                    break
+            await self.db.execute(
+                "UPDATE users SET cleared_swept = 1 WHERE id = ? AND cleared_before_id = ?",
+                (user["id"], user["cleared_before_id"]),
+            )
+        if swept:
+            logger.info(f"Swept {swept} cleared messages of {len(users)} users")
+        return swept
+
+    async def run_clear_sweeper(self, interval_seconds: float) -> None:
+        """Run sweep_cleared() every interval until cancelled
+
+        Args:
+            interval_seconds: Pause between sweeps
+        """
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.sweep_cleared()
+            except Exception as e:
+                logger.warning(f"Sweeping cleared messages failed: {e}")
+
+    def _invalidate_cache(self, user_id: int) -> None:
+        """Drop cached context of user once the current write is committed"""
+        cache = self.context_cache
+        if cache is not None:
+            self.db.call_after_commit(lambda: cache.invalidate(user_id))
+
+    async def search_fts(self, query: str) -> list[MessageRecord]:
         """Full-text search in messages using FTS5
 
         Args:
             query: Search query
 
         Returns:
-            List of matching message dicts
+            List of matching message records
         """
         return await self.db.fetchall(
-            """
-            SELECT m.* FROM messages m
-            JOIN messages_fts fts ON m.id = fts.rowid
-            WHERE messages_fts MATCH ? AND m.deleted_at IS NULL
-            ORDER BY m.created_at DESC
+            f"""
+            SELECT {MessageRecord.COLUMNS} FROM messages
+            WHERE id IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)
+            AND deleted_at IS NULL
+            ORDER BY created_at_ts DESC
             """,
             (query,),
+            row_factory=MessageRecord.from_row,
+        )
+
+    async def search(
+        self,
+        query: str,
+        limit: int,
+        user_id: int | None = None,
+        cursor: str | None = None,
+        highlight: tuple[str, str] = ("<mark>", "</mark>"),
+    ) -> tuple[list[SearchHitRecord], str | None]:
+        """Ranked full-text search with keyset pagination
+
+        Words of the query are matched as quoted terms, all of which must
+        occur; FTS5 query syntax is not interpreted, so user input can't fail
+        to parse. Hits are ordered by bm25 relevance (then id) and the page
+        ends after `limit + 1` rows instead of returning every match. The
+        next page continues after the (rank, id) of the last hit.
+
+        Args:
+            query: Search text
+            limit: Maximum number of hits in the page (capped at MAX_SEARCH_RESULTS)
+            user_id: Search only messages of this user
+            cursor: `next_cursor` of the previous page
+            highlight: Markers inserted around matched terms in the snippet
+
+        Returns:
+            Tuple of (hits, most relevant first; cursor for the next page or
+            None if there are no more hits)
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+        if not terms:
+            return [], None
+        limit = min(limit, self.MAX_SEARCH_RESULTS)
+
+        filters = ""
+        params: list[Any] = [*highlight, " ".join(terms)]
+        if user_id is not None:
+            filters += " AND m.user_id = ?"
+            params.append(user_id)
+        if cursor is not None:
+            after_rank, after_id = self._parse_search_cursor(cursor)
+            filters += " AND (fts.rank > ? OR (fts.rank = ? AND m.id > ?))"
+            params.extend((after_rank, after_rank, after_id))
+        params.append(limit + 1)
+
+        hits = await self.db.fetchall(
+            f"""
+            SELECT m.id, m.user_id, m.role,
+                   snippet(messages_fts, 0, ?, ?, '…', 16) AS snippet,
+                   m.created_at, fts.rank AS rank
+            FROM messages_fts fts
+            JOIN messages m ON m.id = fts.rowid
+            LEFT JOIN users u ON u.id = m.user_id
+            WHERE messages_fts MATCH ? AND m.deleted_at IS NULL
+            AND m.id >= COALESCE(u.cleared_before_id, 0){filters}
+            ORDER BY fts.rank, m.id
+            LIMIT ?
+            """,
+            tuple(params),
+            row_factory=SearchHitRecord.from_row,
+        )
+        next_cursor = None
+        if len(hits) > limit:
+            hits = hits[:limit]
+            next_cursor = f"{hits[-1].rank!r}:{hits[-1].id}"
+        await self._snippet_compressed(hits, query.split(), highlight)
+        return hits, next_cursor
+
+    async def _snippet_compressed(
+        self, hits: list[SearchHitRecord], words: list[str], highlight: tuple[str, str]
+    ) -> None:
+        """Build snippets of compressed hits from their decompressed text
+
+        snippet() reads messages.content, which is empty for compressed
+        messages; only the hits of the page are decompressed.
+        """
+        if not hits:
+            return
+        by_id = {hit.id: hit for hit in hits}
+        placeholders = ", ".join("?" * len(by_id))
+        rows = await self.db.fetchall(
+            f"""
+            SELECT id, content_z FROM messages
+            WHERE id IN ({placeholders}) AND content_z IS NOT NULL
+            """,
+            tuple(by_id),
         )
+        for row in rows:
+            text = decompress_content("", row["content_z"])
+            by_id[row["id"]].snippet = text_snippet(text, words, highlight)
+
+    @staticmethod
+    def _parse_search_cursor(cursor: str) -> tuple[float, int]:
+        """Split search cursor "<rank>:<id>" into its parts
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        rank, separator, message_id = cursor.rpartition(":")
+        if not separator:
+            raise ValueError(f"Invalid search cursor: {cursor!r}")
+        return float(rank), int(message_id)
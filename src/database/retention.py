@@ -0,0 +1,212 @@
+"""Hard deletion of old soft deleted rows and incremental vacuum"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from src.database.repository import DatabaseManager
+
+logger = logging.getLogger("telegram_bot")
+
+# Width of one id range deleted by a single statement (and commit)
+DEFAULT_BATCH_SIZE = 1000
+
+# Pause between batches, lets other writers take the lock
+DEFAULT_PAUSE_SECONDS = 0.05
+
+# Pages released by one `PRAGMA incremental_vacuum` call
+DEFAULT_VACUUM_PAGES = 1000
+
+# Lower bound of users.id (Telegram chat IDs of groups are negative)
+_MIN_USER_ID = -(2**63)
+
+
+@dataclass
+class PurgeResult:
+    """Result of one retention run"""
+
+    messages: int
+    users: int
+    vacuumed_pages: int
+
+
+class RetentionPurger:
+    """Hard deletes rows soft deleted more than retention_days ago
+
+    Every statement deletes at most batch_size rows and commits on its own,
+    with a pause after it, so the writer is never held for long and the
+    bot's writes interleave with the purge.
+
+    - Messages: windows of batch_size ids, each starting at the next
+      expired id, so empty stretches of the id range cost one lookup
+      instead of an empty delete per window. Each window is deleted by
+      a rowid range search.
+    - Users: walked by id; messages of an expired user are deleted in
+      batches first, so ON DELETE CASCADE has nothing left to do.
+
+    Soft deleted messages aren't in messages_fts, their hard delete doesn't
+    touch the index. message_stats_hourly keeps the counts of purged hours.
+
+    With auto_vacuum = INCREMENTAL (migration 008) the freed pages are
+    returned to the file system by incremental_vacuum().
+    """
+
+    def __init__(
+        self,
+        db_manager: DatabaseManager,
+        retention_days: int,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        pause_seconds: float = DEFAULT_PAUSE_SECONDS,
+    ):
+        """Initialize purger
+
+        Args:
+            db_manager: Database manager instance
+            retention_days: Keep soft deleted rows for this many days
+            batch_size: Rows (message ids) per delete statement
+            pause_seconds: Pause after every batch that deleted rows
+
+        Raises:
+            ValueError: If retention_days or batch_size is less than 1
+        """
+        if retention_days < 1:
+            raise ValueError("retention_days must be greater than 0")
+        if batch_size < 1:
+            raise ValueError("batch_size must be greater than 0")
+        self.db = db_manager
+        self.retention_days = retention_days
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+
+    def _cutoff(self) -> int:
+        """Unix time before which soft deleted rows are expired"""
+        return int(time.time()) - self.retention_days * 86400
+
+    async def purge_messages(self) -> int:
+        """Hard delete expired soft deleted messages
+
+        Returns:
+            Number of deleted messages
+        """
+        cutoff = self._cutoff()
+        deleted = 0
+        last_id = 0
+        while True:
+            row = await self.db.fetchone(
+                """
+                SELECT MIN(id) AS next_id FROM messages
+                WHERE id > ? AND deleted_at IS NOT NULL AND deleted_at_ts < ?
+                """,
+                (last_id, cutoff),
+            )
+            if not row or row["next_id"] is None:
+                return deleted
+
+            start = row["next_id"]
+            cursor = await self.db.execute(
+                """
+                DELETE FROM messages
+                WHERE id >= ? AND id < ? AND deleted_at IS NOT NULL AND deleted_at_ts < ?
+                """,
+                (start, start + self.batch_size, cutoff),
+            )
+            deleted += cursor.rowcount
+            last_id = start + self.batch_size - 1
+            await asyncio.sleep(self.pause_seconds)
+
+    async def purge_users(self) -> int:
+        """Hard delete expired soft deleted users with all their messages
+
+        Returns:
+            Number of deleted users
+        """
+        cutoff = self._cutoff()
+        # Re-checked by every statement: the user may come back meanwhile
+        expired = "deleted_at IS NOT NULL AND deleted_at < datetime(?, 'unixepoch')"
+        deleted = 0
+        last_id = _MIN_USER_ID
+        while True:
+            rows = await self.db.fetchall(
+                f"SELECT id FROM users WHERE id > ? AND {expired} ORDER BY id LIMIT ?",
+                (last_id, cutoff, self.batch_size),
+            )
+            for row in rows:
+                while True:
+                    cursor = await self.db.execute(
+                        f"""
+                        DELETE FROM messages
+                        WHERE id IN (SELECT id FROM messages WHERE user_id = ? LIMIT ?)
+                        AND EXISTS (SELECT 1 FROM users WHERE id = ? AND {expired})
+                        """,
+                        (row["id"], self.batch_size, row["id"], cutoff),
+                    )
+                    if cursor.rowcount < self.batch_size:
+                        break
+                    await asyncio.sleep(self.pause_seconds)
+
+                cursor = await self.db.execute(
+                    f"DELETE FROM users WHERE id = ? AND {expired}", (row["id"], cutoff)
+                )
+                deleted += cursor.rowcount
+            if len(rows) < self.batch_size:
+                return deleted
+            last_id = rows[-1]["id"]
+            await asyncio.sleep(self.pause_seconds)
+
+    async def incremental_vacuum(self, pages: int = DEFAULT_VACUUM_PAGES) -> int:
+        """Release free pages to the file system, `pages` pages per step
+
+        Does nothing unless auto_vacuum is INCREMENTAL. In WAL mode the file
+        shrinks at the next checkpoint.
+
+        Args:
+            pages: Pages released by one step
+
+        Returns:
+            Number of released pages
+        """
+        released = 0
+        while True:
+            row = await self.db.fetchone("PRAGMA freelist_count")
+            before = int(row["freelist_count"]) if row else 0
+            if before == 0:
+                return released
+            # Returning mode steps the pragma to completion
+            await self.db.execute_returning(f"PRAGMA incremental_vacuum({int(pages)})")
+            row = await self.db.fetchone("PRAGMA freelist_count")
+            after = int(row["freelist_count"]) if row else 0
+            if after >= before:
+                return released
+            released += before - after
+            await asyncio.sleep(self.pause_seconds)
+
+    async def run(self) -> PurgeResult:
+        """Purge messages and users, then vacuum
+
+        Returns:
+            Deleted rows and released pages
+        """
+        messages = await self.purge_messages()
+        users = await self.purge_users()
+        vacuumed_pages = await self.incremental_vacuum()
+        result = PurgeResult(messages=messages, users=users, vacuumed_pages=vacuumed_pages)
+        if messages or users or vacuumed_pages:
+            logger.info(
+                f"Retention purge: {messages} messages, {users} users, "
+                f"{vacuumed_pages} pages released"
+            )
+        return result
+
+    async def run_periodically(self, interval_seconds: float) -> None:
+        """Run run() every interval until cancelled
+
+        Args:
+            interval_seconds: Pause between runs
+        """
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.run()
+            except Exception as e:
+                logger.warning(f"Retention purge failed: {e}")
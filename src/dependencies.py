@@ -3,7 +3,7 @@
 from dataclasses import dataclass
 
 from src.config import Config
-from src.database import MessageRepository, UserRepository
+from src.database import DatabaseManager, MessageRepository, UserRepository
 from src.protocols import ILLMClient, IRoleManager
 
 
@@ -20,6 +20,7 @@ class BotDependencies:
         llm_client: Клиент для работы с LLM
         role_manager: Менеджер ролей и системных промптов
         config: Конфигурация бота
+        db_manager: Менеджер БД (для транзакций)
     """
 
     user_repo: UserRepository
@@ -27,3 +28,4 @@ class BotDependencies:
     llm_client: ILLMClient
     role_manager: IRoleManager
     config: Config
+    db_manager: DatabaseManager
@@ -40,7 +40,7 @@ async def cmd_start(message: Message, deps: BotDependencies) -> None:
     )
 
     # Отправляем приветствие из конфига с именем пользователя
-    await message.answer(f"Привет, {user['first_name']}! {deps.config.welcome_message}")
+    await message.answer(f"Привет, {user.first_name}! {deps.config.welcome_message}")
 
 
 @router.message(Command("clear"))
@@ -55,16 +55,9 @@ async def cmd_clear(message: Message, deps: BotDependencies) -> None:
         f"Received /clear command from user {message.from_user.id if message.from_user else 'unknown'}"
     )
 
-    # Получаем текущие сообщения для подсчета
-    messages = await deps.message_repo.get_recent(message.chat.id, limit=10000)
-    messages_count = len(messages)
-
-    if messages_count > 0:
-        # Soft delete всех сообщений пользователя
-        await deps.message_repo.soft_delete_all_for_user(message.chat.id)
-        logger.info(
-            f"Cleared conversation history for chat {message.chat.id} ({messages_count} messages)"
-        )
+    # Сдвигаем маркер очистки одной записью, сами сообщения удаляются в фоне
+    if await deps.message_repo.clear_history(message.chat.id):
+        logger.info(f"Cleared conversation history for chat {message.chat.id}")
         await message.answer("✅ История диалога очищена. Начнем сначала!")
     else:
         await message.answer("История диалога уже пуста.")
@@ -140,35 +133,34 @@ async def message_handler(message: Message, deps: BotDependencies) -> None:
         f"(@{message.from_user.username}): {text[:50]}{'...' if len(text) > 50 else ''}"
     )
 
-    # Получаем или создаем пользователя (для трекинга)
-    await deps.user_repo.get_or_create(
-        chat_id=message.chat.id,
-        username=message.from_user.username,
-        first_name=message.from_user.first_name,
-    )
-
-    # Сохраняем сообщение пользователя в БД
-    user_message_id = await deps.message_repo.create(
-        user_id=message.chat.id, role="user", content=text
-    )
-
     try:
-        # Получаем последние сообщения из БД
+        # Получаем историю из БД (текущее сообщение еще не сохранено)
         recent_messages = await deps.message_repo.get_recent(
-            user_id=message.chat.id, limit=deps.config.max_context_messages
+            user_id=message.chat.id, limit=deps.config.max_context_messages - 1
         )
 
         # Формируем контекст для LLM (сообщения в обратном порядке - от старых к новым)
         context = [{"role": "system", "content": deps.role_manager.get_system_prompt()}]
         context.extend(
-            [{"role": msg["role"], "content": msg["content"]} for msg in reversed(recent_messages)]
+            {"role": msg.role, "content": msg.content} for msg in reversed(recent_messages)
         )
+        context.append({"role": "user", "content": text})
 
         # Отправляем запрос к LLM
         response = await deps.llm_client.send_message(context)
 
-        # Сохраняем ответ ассистента в БД
-        await deps.message_repo.create(user_id=message.chat.id, role="assistant", content=response)
+        # Пользователь, его сообщение и ответ ассистента сохраняются одной транзакцией:
+        # при ошибке LLM в БД ничего не попадает
+        async with deps.db_manager.transaction():
+            await deps.user_repo.get_or_create(
+                chat_id=message.chat.id,
+                username=message.from_user.username,
+                first_name=message.from_user.first_name,
+            )
+            await deps.message_repo.create(user_id=message.chat.id, role="user", content=text)
+            await deps.message_repo.create(
+                user_id=message.chat.id, role="assistant", content=response
+            )
 
         logger.info(
             f"Successfully processed message for user {message.from_user.id}, "
@@ -186,5 +178,3 @@ async def message_handler(message: Message, deps: BotDependencies) -> None:
         await message.answer(
             "😔 Извините, произошла ошибка при обработке вашего запроса. Попробуйте еще раз."
         )
-        # Удаляем сообщение пользователя из БД при ошибке (soft delete)
-        await deps.message_repo.soft_delete(user_message_id)
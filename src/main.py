@@ -1,6 +1,7 @@
 """Точка входа приложения - запуск Telegram бота"""
 
 import asyncio
+import contextlib
 import signal
 import sys
 
@@ -9,7 +10,15 @@ from aiogram.exceptions import TelegramNetworkError
 from llm.client import LLMClient
 from src.bot import TelegramBot
 from src.config import Config
-from src.database import DatabaseManager, MessageRepository, UserRepository
+from src.database import (
+    ConversationCache,
+    DatabaseManager,
+    FTSMaintenance,
+    MessageArchiver,
+    MessageRepository,
+    RetentionPurger,
+    UserRepository,
+)
 from src.dependencies import BotDependencies
 from src.handlers.handlers import router
 from src.logger import setup_logger
@@ -67,14 +76,27 @@ async def main() -> None:
 
     # Инициализация DatabaseManager
     logger.info(f"Initializing database: {config.database_path}")
-    db_manager = DatabaseManager(config.database_path)
+    db_manager = DatabaseManager.from_config(config)
     await db_manager.init()
     logger.info("Database initialized successfully")
 
     # Создание repositories
     logger.info("Setting up data repositories...")
-    user_repo = UserRepository(db_manager)
-    message_repo = MessageRepository(db_manager)
+    user_repo = UserRepository(
+        db_manager,
+        cache_size=config.user_cache_size,
+        last_accessed_flush_interval=config.last_accessed_flush_seconds,
+    )
+    context_cache = None
+    if config.context_cache_max_bytes > 0:
+        context_cache = ConversationCache(
+            capacity=config.max_context_messages, max_bytes=config.context_cache_max_bytes
+        )
+    message_repo = MessageRepository(
+        db_manager,
+        context_cache=context_cache,
+        compression_threshold=config.message_compression_threshold,
+    )
     logger.info("Repositories created successfully")
 
     # Инициализация LLM клиента
@@ -103,6 +125,7 @@ async def main() -> None:
         llm_client=llm_client,
         role_manager=role_manager,
         config=config,
+        db_manager=db_manager,
     )
 
     # Инициализация бота
@@ -140,6 +163,46 @@ async def main() -> None:
         for sig in (signal.SIGTERM, signal.SIGINT):
             loop.add_signal_handler(sig, signal_handler)
 
+    # Фоновые задачи обслуживания БД
+    background_tasks: list[asyncio.Task[None]] = []
+    # Слияние сегментов полнотекстового индекса
+    if config.fts_merge_interval_seconds > 0:
+        background_tasks.append(
+            asyncio.create_task(
+                FTSMaintenance(db_manager).run_periodically(config.fts_merge_interval_seconds)
+            )
+        )
+    # Пакетная запись last_accessed пользователей из кэша
+    if config.last_accessed_flush_seconds > 0:
+        background_tasks.append(
+            asyncio.create_task(
+                user_repo.run_last_accessed_flusher(config.last_accessed_flush_seconds)
+            )
+        )
+    # Удаление сообщений, скрытых командой /clear
+    if config.clear_sweep_interval_seconds > 0:
+        background_tasks.append(
+            asyncio.create_task(message_repo.run_clear_sweeper(config.clear_sweep_interval_seconds))
+        )
+    # Окончательное удаление старых soft deleted записей и incremental vacuum
+    if config.retention_days > 0 and config.retention_interval_seconds > 0:
+        background_tasks.append(
+            asyncio.create_task(
+                RetentionPurger(db_manager, config.retention_days).run_periodically(
+                    config.retention_interval_seconds
+                )
+            )
+        )
+    # Перенос старых сообщений в архив messages_archive
+    if config.archive_after_days > 0 and config.archive_interval_seconds > 0:
+        background_tasks.append(
+            asyncio.create_task(
+                MessageArchiver(db_manager, config.archive_after_days).run_periodically(
+                    config.archive_interval_seconds
+                )
+            )
+        )
+
     # Запуск бота с retry logic
     print("Bot started. Press Ctrl+C to stop.")
     try:
@@ -159,6 +222,14 @@ async def main() -> None:
         await bot.stop()
         logger.info("Bot stopped successfully")
 
+        for task in background_tasks:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+        # Сохраняем отложенные обновления last_accessed
+        await user_repo.flush_last_accessed()
+
         # Закрываем соединение с БД
         logger.info("Closing database connection...")
         await db_manager.close()
@@ -0,0 +1,167 @@
+"""Служебные команды обслуживания базы данных
+
+Запуск:
+    python -m src.maintenance rebuild-stats [--database data/bot.db]
+    python -m src.maintenance fts-optimize
+    python -m src.maintenance fts-rebuild
+    python -m src.maintenance purge [--days 30]
+    python -m src.maintenance archive [--days 180]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from collections.abc import Awaitable, Callable
+
+from dotenv import load_dotenv
+
+from src.database import (
+    DatabaseManager,
+    FTSMaintenance,
+    MessageArchiver,
+    MessageStatsRepository,
+    RetentionPurger,
+)
+from src.logger import setup_logger
+
+logger = logging.getLogger(__name__)
+
+
+async def rebuild_stats(db_manager: DatabaseManager, args: argparse.Namespace) -> None:
+    """Пересчитывает почасовую статистику сообщений (message_stats_hourly)
+
+    Args:
+        db_manager: Инициализированный менеджер БД
+        args: Разобранные аргументы командной строки
+    """
+    hours = await MessageStatsRepository(db_manager).rebuild()
+    print(f"message_stats_hourly rebuilt: {hours} hours")
+
+
+async def fts_optimize(db_manager: DatabaseManager, args: argparse.Namespace) -> None:
+    """Сливает все сегменты полнотекстового индекса messages_fts
+
+    Args:
+        db_manager: Инициализированный менеджер БД
+        args: Разобранные аргументы командной строки
+    """
+    await FTSMaintenance(db_manager).optimize()
+    print("messages_fts optimized")
+
+
+async def fts_rebuild(db_manager: DatabaseManager, args: argparse.Namespace) -> None:
+    """Переиндексирует активные сообщения в messages_fts
+
+    Args:
+        db_manager: Инициализированный менеджер БД
+        args: Разобранные аргументы командной строки
+    """
+    count = await FTSMaintenance(db_manager).rebuild()
+    print(f"messages_fts rebuilt: {count} messages")
+
+
+async def purge(db_manager: DatabaseManager, args: argparse.Namespace) -> None:
+    """Окончательно удаляет записи, удаленные (soft delete) больше args.days дней назад,
+    и возвращает освободившиеся страницы файловой системе
+
+    Args:
+        db_manager: Инициализированный менеджер БД
+        args: Разобранные аргументы командной строки (days)
+    """
+    result = await RetentionPurger(db_manager, args.days).run()
+    print(
+        f"Purged {result.messages} messages, {result.users} users, "
+        f"released {result.vacuumed_pages} pages"
+    )
+
+
+async def archive(db_manager: DatabaseManager, args: argparse.Namespace) -> None:
+    """Переносит сообщения старше args.days дней в архив messages_archive
+
+    Args:
+        db_manager: Инициализированный менеджер БД
+        args: Разобранные аргументы командной строки (days)
+    """
+    count = await MessageArchiver(db_manager, args.days).archive()
+    print(f"Archived {count} messages")
+
+
+# Подкоманды: имя -> (обработчик, описание)
+COMMANDS: dict[
+    str, tuple[Callable[[DatabaseManager, argparse.Namespace], Awaitable[None]], str]
+] = {
+    "rebuild-stats": (rebuild_stats, "Recalculate hourly message statistics from messages"),
+    "fts-optimize": (fts_optimize, "Merge the full-text index into one segment"),
+    "fts-rebuild": (fts_rebuild, "Reindex active messages in the full-text index"),
+    "purge": (purge, "Hard delete rows soft deleted more than --days days ago and vacuum"),
+    "archive": (archive, "Move messages older than --days days to messages_archive"),
+}
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки
+
+    Args:
+        argv: Аргументы (по умолчанию sys.argv)
+
+    Returns:
+        Namespace с полями command, database (и days для purge и archive)
+    """
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog="python -m src.maintenance", description=__doc__)
+    parser.add_argument(
+        "--database",
+        default=os.getenv("DATABASE_PATH", "data/bot.db"),
+        help="Path to SQLite database (default: DATABASE_PATH or data/bot.db)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text)
+    subparsers.choices["purge"].add_argument(
+        "--days",
+        type=int,
+        default=int(os.getenv("RETENTION_DAYS") or 0) or 30,
+        help="Retention period in days (default: RETENTION_DAYS, 30 if unset or 0)",
+    )
+    subparsers.choices["archive"].add_argument(
+        "--days",
+        type=int,
+        default=int(os.getenv("ARCHIVE_AFTER_DAYS") or 0) or 180,
+        help="Archive messages older than this (default: ARCHIVE_AFTER_DAYS, 180 if unset or 0)",
+    )
+    args = parser.parse_args(argv)
+    if args.command in ("purge", "archive") and args.days < 1:
+        parser.error("--days must be greater than 0")
+    return args
+
+
+async def run(args: argparse.Namespace) -> None:
+    """Выполняет подкоманду на отдельном подключении к БД
+
+    Args:
+        args: Разобранные аргументы командной строки
+    """
+    handler, _ = COMMANDS[args.command]
+    db_manager = DatabaseManager(args.database, read_pool_size=0)
+    await db_manager.init()
+    try:
+        logger.info(f"Running maintenance command: {args.command}")
+        await handler(db_manager, args)
+    finally:
+        await db_manager.close()
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Точка входа CLI
+
+    Args:
+        argv: Аргументы (по умолчанию sys.argv)
+    """
+    args = parse_args(argv)
+    setup_logger()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Общие фикстуры тестов"""
+
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from alembic.config import Config as AlembicConfig
+
+from alembic import command
+from src.database import DatabaseManager
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def alembic_config(tmp_path: Path) -> AlembicConfig:
+    """Конфигурация Alembic для файловой БД tmp_path / "bot.db"
+
+    Миграции запускаются синхронно: alembic/env.py сам запускает event loop
+    через asyncio.run().
+    """
+    pytest.importorskip("greenlet", reason="alembic env.py uses the SQLAlchemy asyncio engine")
+
+    # Без alembic.ini: fileConfig() в env.py перенастроил бы логирование тестов
+    config = AlembicConfig()
+    config.set_main_option("script_location", str(PROJECT_ROOT / "alembic"))
+    config.set_main_option("sqlalchemy.url", f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}")
+    return config
+
+
+@pytest.fixture
+def migrated_db_path(tmp_path: Path, alembic_config: AlembicConfig) -> str:
+    """Путь к файловой БД со схемой, созданной миграциями Alembic (upgrade head)"""
+    command.upgrade(alembic_config, "head")
+    return str(tmp_path / "bot.db")
+
+
+@pytest_asyncio.fixture
+async def db_manager(migrated_db_path: str, monkeypatch) -> AsyncIterator[DatabaseManager]:
+    """DatabaseManager на мигрированной БД, свой экземпляр синглтона на каждый тест
+
+    Модули, которым нужны пользователи, переопределяют фикстуру и добавляют их.
+    """
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+    manager = DatabaseManager(migrated_db_path, read_pool_size=1)
+    await manager.init()
+    yield manager
+    await manager.close()
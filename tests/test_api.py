@@ -1,16 +1,50 @@
 """Tests for API endpoints and statistics collectors"""
 
+import asyncio
+import calendar
+import json
+import time
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock
+
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 
-from api.api_main import app
+from api.api_main import app, stream_stats
+from api.chat_manager import ChatManager
+from api.collectors.cached_collector import CachedStatCollector
 from api.collectors.mock_collector import MockStatCollector
-from api.models import PeriodEnum
+from api.collectors.real_collector import RealStatCollector
+from api.dependencies import APIResources, get_chat_manager, get_stat_collector
+from api.etag import etag_matches, get_stats_version
+from api.models import BucketEnum, KPIMetric, PeriodEnum, StatsResponse, TimelinePoint
+from api.sql_executor import QueryResult, SQLExecutor
+from api.stats_stream import StatsBroadcaster, diff_stats
+from src.database.records import MessageRecord, SearchHitRecord
+from src.database.repository import DatabaseManager, MessageRepository
 
 # Create test client
 client = TestClient(app)
 
 
+@pytest.fixture
+def app_env(migrated_db_path, monkeypatch):
+    """Configure the application to use a migrated database"""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setenv("DATABASE_PATH", migrated_db_path)
+    # The app gets its own DatabaseManager, not leaked into other tests
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+
+
+@pytest.fixture
+def app_lifespan(app_env):
+    """Run application startup and shutdown around the test"""
+    with client:
+        yield app.state.resources
+
+
 class TestAPIEndpoints:
     """Test API endpoints"""
 
@@ -30,6 +64,7 @@ class TestAPIEndpoints:
         data = response.json()
         assert data["status"] == "ok"
 
+    @pytest.mark.usefixtures("app_lifespan")
     def test_stats_endpoint_default_period(self) -> None:
         """Test stats endpoint with default period (week)"""
         response = client.get("/stats")
@@ -54,6 +89,7 @@ class TestAPIEndpoints:
             assert "date" in point
             assert "value" in point
 
+    @pytest.mark.usefixtures("app_lifespan")
     def test_stats_endpoint_day_period(self) -> None:
         """Test stats endpoint with day period"""
         response = client.get("/stats?period=day")
@@ -63,6 +99,7 @@ class TestAPIEndpoints:
         # Check timeline has 24 points (hourly)
         assert len(data["timeline"]) == 24
 
+    @pytest.mark.usefixtures("app_lifespan")
     def test_stats_endpoint_week_period(self) -> None:
         """Test stats endpoint with week period"""
         response = client.get("/stats?period=week")
@@ -72,6 +109,7 @@ class TestAPIEndpoints:
         # Check timeline has 7 points (daily)
         assert len(data["timeline"]) == 7
 
+    @pytest.mark.usefixtures("app_lifespan")
     def test_stats_endpoint_month_period(self) -> None:
         """Test stats endpoint with month period"""
         response = client.get("/stats?period=month")
@@ -81,6 +119,7 @@ class TestAPIEndpoints:
         # Check timeline has 30 points (daily)
         assert len(data["timeline"]) == 30
 
+    @pytest.mark.usefixtures("app_lifespan")
     def test_stats_endpoint_invalid_period(self) -> None:
         """Test stats endpoint with invalid period defaults to week"""
         response = client.get("/stats?period=invalid")
@@ -90,6 +129,7 @@ class TestAPIEndpoints:
         # Should default to week (7 days)
         assert len(data["timeline"]) == 7
 
+    @pytest.mark.usefixtures("app_lifespan")
     def test_kpi_metrics_labels(self) -> None:
         """Test that KPI metrics have correct labels"""
         response = client.get("/stats")
@@ -102,6 +142,7 @@ class TestAPIEndpoints:
         assert "Deleted Messages" in labels
         assert "Avg Message Length" in labels
 
+    @pytest.mark.usefixtures("app_lifespan")
     def test_kpi_metrics_trends(self) -> None:
         """Test that KPI metrics have valid trend values"""
         response = client.get("/stats")
@@ -113,6 +154,208 @@ class TestAPIEndpoints:
             assert metric["trend"] in valid_trends
 
 
+class TestAppLifespan:
+    """Test shared resources created by the lifespan handler"""
+
+    def test_resources_shared_and_closed(self, app_lifespan) -> None:
+        """Test that requests reuse resources built once at startup"""
+        resources = app_lifespan
+        chat_manager = resources.chat_manager
+
+        assert client.get("/stats").status_code == 200
+        assert client.get("/api/chat/history/1").status_code == 200
+        assert app.state.resources is resources
+        assert resources.chat_manager is chat_manager
+        assert resources.db_manager._connection is not None
+
+    @pytest.mark.usefixtures("app_env")
+    def test_shutdown_closes_database(self) -> None:
+        """Test that shutdown closes database connections"""
+        with client:
+            resources = app.state.resources
+            assert resources.db_manager._connection is not None
+
+        assert resources.db_manager._connection is None
+
+    @pytest.mark.asyncio
+    async def test_warm_up_fills_stats_cache(self) -> None:
+        """Test that warm-up computes the default dashboard statistics"""
+        inner = CountingCollector()
+        resources = MagicMock()
+        resources.stat_collector = CachedStatCollector(inner, ttl_seconds=30)
+
+        await APIResources.warm_up(resources)
+
+        assert inner.calls == [("week", "1d")]
+        await resources.stat_collector.get_stats("week")
+        assert len(inner.calls) == 1
+
+
+class TestChatHistoryEndpoint:
+    """Test chat history endpoint pagination"""
+
+    @pytest.fixture
+    def chat_manager(self):
+        """Override chat manager dependency with a mock"""
+        manager = MagicMock()
+        manager.db.data_version = AsyncMock(return_value="v1")
+        manager.message_repo.get_page = AsyncMock(
+            return_value=(
+                [
+                    MessageRecord(5, 1, "user", "Hi", 2, "2025-10-17", None),
+                    MessageRecord(6, 1, "assistant", "Hello", 5, "2025-10-17", None),
+                ],
+                5,
+            )
+        )
+        app.dependency_overrides[get_chat_manager] = lambda: manager
+        yield manager
+        app.dependency_overrides.clear()
+
+    def test_history_returns_next_cursor(self, chat_manager) -> None:
+        """Test history page with cursor"""
+        response = client.get("/api/chat/history/1?limit=2&before_id=7")
+        assert response.status_code == 200
+        data = response.json()
+
+        assert [msg["id"] for msg in data["messages"]] == [5, 6]
+        assert data["next_cursor"] == 5
+        chat_manager.message_repo.get_page.assert_awaited_once_with(
+            1, 2, before_id=7, after_id=None
+        )
+
+    def test_history_rejects_both_cursors(self, chat_manager) -> None:
+        """Test that before_id and after_id can't be combined"""
+        response = client.get("/api/chat/history/1?before_id=7&after_id=2")
+        assert response.status_code == 400
+
+    def test_history_not_modified(self, chat_manager) -> None:
+        """Test conditional GET: 304 without querying messages"""
+        response = client.get("/api/chat/history/1")
+        assert response.headers["etag"] == '"v1"'
+
+        response = client.get("/api/chat/history/1", headers={"If-None-Match": '"v1"'})
+        assert response.status_code == 304
+        assert response.content == b""
+        chat_manager.message_repo.get_page.assert_awaited_once()
+
+        chat_manager.db.data_version.return_value = "v2"
+        response = client.get("/api/chat/history/1", headers={"If-None-Match": '"v1"'})
+        assert response.status_code == 200
+        assert response.headers["etag"] == '"v2"'
+
+
+class TestSearchEndpoint:
+    """Test full-text search endpoint"""
+
+    @pytest.fixture
+    def chat_manager(self):
+        """Override chat manager dependency with a mock"""
+        manager = MagicMock()
+        manager.message_repo.search = AsyncMock(
+            return_value=(
+                [SearchHitRecord(7, 1, "user", "<mark>pizza</mark>", "2025-10-17", -1.5)],
+                "-1.5:7",
+            )
+        )
+        app.dependency_overrides[get_chat_manager] = lambda: manager
+        yield manager
+        app.dependency_overrides.clear()
+
+    def test_search_returns_hits_and_cursor(self, chat_manager) -> None:
+        """Test search page with user filter and cursor"""
+        response = client.get("/api/search?q=pizza&user_id=1&limit=5&cursor=-2.0:3")
+        assert response.status_code == 200
+        data = response.json()
+
+        assert data["results"][0]["snippet"] == "<mark>pizza</mark>"
+        assert data["results"][0]["rank"] == -1.5
+        assert data["next_cursor"] == "-1.5:7"
+        chat_manager.message_repo.search.assert_awaited_once_with(
+            "pizza", 5, user_id=1, cursor="-2.0:3"
+        )
+
+    def test_search_validates_parameters(self, chat_manager) -> None:
+        """Test empty query, limit above the cap and malformed cursor"""
+        assert client.get("/api/search?q=").status_code == 422
+        assert client.get("/api/search?q=pizza&limit=1000").status_code == 422
+
+        chat_manager.message_repo.search.side_effect = ValueError("Invalid search cursor")
+        response = client.get("/api/search?q=pizza&cursor=bad")
+        assert response.status_code == 400
+
+
+class TestStatsETag:
+    """Test conditional GET of /stats"""
+
+    @pytest.fixture
+    def db_manager(self):
+        """Override stats collector with a cached counting collector and mocked version"""
+        inner, clock = CountingCollector(), FakeClock()
+        db_manager = MagicMock()
+        db_manager.data_version = AsyncMock(return_value="v1")
+        collector = CachedStatCollector(
+            inner,
+            ttl_seconds=30,
+            clock=clock,
+            version=lambda bucket: get_stats_version(db_manager, bucket),
+        )
+        app.dependency_overrides[get_stat_collector] = lambda: collector
+        yield db_manager, inner, clock
+        app.dependency_overrides.clear()
+
+    def test_stats_not_modified(self, db_manager) -> None:
+        """Test that matching If-None-Match is answered from the cached entry"""
+        _, collector, _ = db_manager
+        response = client.get("/stats?period=day")
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+        assert response.headers["cache-control"] == "no-cache"
+
+        response = client.get("/stats?period=day", headers={"If-None-Match": f"W/{etag}"})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert len(collector.calls) == 1
+
+    def test_stats_etag_kept_until_ttl(self, db_manager) -> None:
+        """Test that a write keeps the cached entry and its ETag until the TTL expires"""
+        db, collector, clock = db_manager
+        etag = client.get("/stats?period=day").headers["etag"]
+
+        db.data_version.return_value = "v2"
+        response = client.get("/stats?period=day", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert len(collector.calls) == 1
+
+        clock.now = 30
+        response = client.get("/stats?period=day", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert len(collector.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_stats_version_follows_bucket(self, mocker) -> None:
+        """Test that the time part is the current UTC bucket, at most an hour"""
+        db = MagicMock()
+        db.data_version = AsyncMock(return_value="v1")
+        clock = mocker.patch("api.etag.time.time", return_value=1_700_000_000)  # 22:13:20 UTC
+
+        assert await get_stats_version(db, "5m") == "v1-202311142210"
+        assert await get_stats_version(db, "1h") == "v1-202311142200"
+        assert await get_stats_version(db, "1d") == "v1-202311142200"
+
+        clock.return_value += 5 * 60
+        assert await get_stats_version(db, "5m") == "v1-202311142215"
+        assert await get_stats_version(db, "1d") == "v1-202311142200"
+
+    def test_etag_matches(self) -> None:
+        """Test If-None-Match parsing"""
+        assert etag_matches('"a", W/"b"', '"b"')
+        assert etag_matches("*", '"b"')
+        assert not etag_matches('"a"', '"b"')
+        assert not etag_matches(None, '"b"')
+
+
 class TestMockStatCollector:
     """Test MockStatCollector"""
 
@@ -154,6 +397,19 @@ class TestMockStatCollector:
         # Month period should have 30 timeline points (daily)
         assert len(stats.timeline) == 30
 
+    @pytest.mark.asyncio
+    async def test_get_stats_custom_bucket(self) -> None:
+        """Test get_stats with explicit bucket width"""
+        collector = MockStatCollector()
+
+        stats = await collector.get_stats(PeriodEnum.DAY.value, BucketEnum.FIVE_MINUTES.value)
+        assert len(stats.timeline) == 24 * 12
+        assert stats.timeline[1].date.endswith("T00:05:00")
+
+        # 30 days in weekly buckets, the last one is partial
+        stats = await collector.get_stats(PeriodEnum.MONTH.value, BucketEnum.WEEK.value)
+        assert len(stats.timeline) == 5
+
     @pytest.mark.asyncio
     async def test_kpi_metrics_format(self) -> None:
         """Test that KPI metrics are formatted correctly"""
@@ -208,3 +464,457 @@ class TestMockStatCollector:
         assert collector._format_number(1234567) == "1,234,567"
         assert collector._format_number(999) == "999"
         assert collector._format_number(1000) == "1,000"
+
+
+class TestRealStatCollector:
+    """Test RealStatCollector aggregation queries"""
+
+    @pytest_asyncio.fixture
+    async def db_manager(self, db_manager):
+        """Shared migrated database with one user"""
+        await db_manager.execute("INSERT INTO users (id, first_name) VALUES (1, 'User')")
+        return db_manager
+
+    async def add_message(
+        self,
+        db_manager: DatabaseManager,
+        created_at: datetime,
+        content: str = "text",
+        deleted_at: datetime | None = None,
+    ) -> None:
+        """Insert message with given creation (and deletion) time"""
+        await db_manager.execute(
+            """
+            INSERT INTO messages (user_id, role, content, length, created_at, deleted_at)
+            VALUES (1, 'user', ?, ?, ?, ?)
+            """,
+            (
+                content,
+                len(content),
+                created_at.strftime("%Y-%m-%d %H:%M:%S"),
+                deleted_at.strftime("%Y-%m-%d %H:%M:%S") if deleted_at else None,
+            ),
+        )
+
+    @pytest.mark.asyncio
+    async def test_kpi_metrics_single_query(self, db_manager, mocker) -> None:
+        """Test that all KPIs for both periods come from one query"""
+        now = datetime.now(UTC)
+        # Current week: 2 active messages and 1 deleted
+        await self.add_message(db_manager, now - timedelta(hours=1), "x" * 10)
+        await self.add_message(db_manager, now - timedelta(days=2), "x" * 20)
+        await self.add_message(
+            db_manager, now - timedelta(days=3), deleted_at=now - timedelta(hours=2)
+        )
+        # Previous week: 1 active message
+        await self.add_message(db_manager, now - timedelta(days=10), "x" * 30)
+
+        collector = RealStatCollector(db_manager)
+        fetchone = mocker.spy(db_manager, "fetchone")
+
+        metrics = await collector._generate_kpi_metrics(PeriodEnum.WEEK.value)
+
+        assert fetchone.call_count == 1
+        assert [(m.label, m.value, m.change, m.trend) for m in metrics] == [
+            ("Total Users", "1", 0.0, "stable"),
+            ("Total Messages", "2", 100.0, "up"),
+            ("Deleted Messages", "1", 0.0, "stable"),
+            ("Avg Message Length", "15 chars", -50.0, "down"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_kpi_metrics_empty_database(self, db_manager) -> None:
+        """Test KPIs without messages"""
+        metrics = await RealStatCollector(db_manager)._generate_kpi_metrics(PeriodEnum.DAY.value)
+
+        assert [m.value for m in metrics] == ["1", "0", "0", "0 chars"]
+        assert all(m.change == 0.0 for m in metrics)
+
+    @pytest.mark.asyncio
+    async def test_timeline_single_query_with_empty_buckets(self, db_manager, mocker) -> None:
+        """Test that all buckets come from one query and gaps are zero"""
+        midnight = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+        await self.add_message(db_manager, midnight + timedelta(minutes=10))
+        await self.add_message(db_manager, midnight + timedelta(minutes=12))
+        await self.add_message(db_manager, midnight + timedelta(hours=2))
+        # Outside of the window
+        await self.add_message(db_manager, midnight - timedelta(minutes=1))
+
+        collector = RealStatCollector(db_manager)
+        fetchall = mocker.spy(db_manager, "fetchall")
+
+        timeline = await collector._generate_timeline(PeriodEnum.DAY.value, BucketEnum.HOUR.value)
+
+        assert fetchall.call_count == 1
+        assert len(timeline) == 24
+        assert timeline[0].date == midnight.strftime("%Y-%m-%dT00:00:00")
+        assert [point.value for point in timeline[:4]] == [2, 0, 1, 0]
+        assert sum(point.value for point in timeline) == 3
+
+        timeline = await collector._generate_timeline(
+            PeriodEnum.DAY.value, BucketEnum.FIVE_MINUTES.value
+        )
+        assert len(timeline) == 24 * 12
+        assert timeline[2].value == 2
+        assert timeline[24].value == 1
+
+    @pytest.mark.asyncio
+    async def test_windows_are_utc_on_non_utc_host(self, db_manager, monkeypatch) -> None:
+        """Test that period and timeline bounds don't depend on the local time zone"""
+        midnight = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+        # 12 hours off UTC, so the local date is never the UTC date
+        zone = "Etc/GMT+12" if datetime.now(UTC).hour < 12 else "Etc/GMT-12"
+        try:
+            with monkeypatch.context() as patch:
+                patch.setenv("TZ", zone)
+                time.tzset()
+                await self.add_message(db_manager, midnight + timedelta(minutes=10))
+                collector = RealStatCollector(db_manager)
+
+                timeline = await collector._generate_timeline(
+                    PeriodEnum.DAY.value, BucketEnum.HOUR.value
+                )
+                bounds = collector._get_period_dates(PeriodEnum.DAY.value)
+        finally:
+            time.tzset()
+
+        assert timeline[0].date == midnight.strftime("%Y-%m-%dT00:00:00")
+        assert timeline[0].value == 1
+        assert bounds.current_start == calendar.timegm(midnight.timetuple()) // 3600
+
+    @pytest.mark.asyncio
+    async def test_timeline_ignores_deleted_messages(self, db_manager) -> None:
+        """Test that soft deleted messages are not counted"""
+        await self.add_message(db_manager, datetime.now(UTC).replace(hour=0, minute=30))
+        await db_manager.execute("UPDATE messages SET deleted_at = CURRENT_TIMESTAMP")
+
+        stats = await RealStatCollector(db_manager).get_stats(PeriodEnum.WEEK.value)
+
+        assert len(stats.timeline) == 7
+        assert all(point.value == 0 for point in stats.timeline)
+
+
+class TestSQLExecutor:
+    """Test admin SQL execution"""
+
+    @pytest.mark.asyncio
+    async def test_truncated_result_is_flagged(self, db_manager, monkeypatch) -> None:
+        """Test that rows over MAX_ROWS are dropped and reported"""
+        await db_manager.execute(
+            "INSERT INTO users (id, first_name) VALUES (1, 'A'), (2, 'B'), (3, 'C')"
+        )
+        monkeypatch.setattr(SQLExecutor, "MAX_ROWS", 2)
+        executor = SQLExecutor(db_manager)
+
+        result = await executor.execute_safe("SELECT id FROM users ORDER BY id LIMIT 100")
+        assert result == QueryResult(rows=[{"id": 1}, {"id": 2}], truncated=True)
+
+        result = await executor.execute_safe("SELECT id FROM users ORDER BY id LIMIT 2")
+        assert result == QueryResult(rows=[{"id": 1}, {"id": 2}], truncated=False)
+
+    @pytest.mark.asyncio
+    async def test_admin_query_over_compressed_messages(self, db_manager) -> None:
+        """Test that compressed message text reaches the LLM as plain text"""
+        long_text = "pizza with extra cheese " * 10
+        await db_manager.execute("INSERT INTO users (id, first_name) VALUES (1, 'User')")
+        await MessageRepository(db_manager, compression_threshold=64).create(1, "user", long_text)
+        llm = MagicMock()
+        llm.send_message = AsyncMock(side_effect=["SELECT * FROM messages LIMIT 10", "answer"])
+        manager = ChatManager(llm, db_manager, compression_threshold=64)
+
+        assert await manager.handle_admin(1, "What did users write?") == (
+            "answer",
+            "SELECT * FROM messages LIMIT 10",
+        )
+
+        prompt = llm.send_message.call_args_list[1].args[0][0]["content"]
+        assert long_text in prompt
+        assert "content_z" not in prompt
+
+    @pytest.mark.asyncio
+    async def test_truncation_is_passed_to_llm(self) -> None:
+        """Test that the answer prompt doesn't present a truncated count as the total"""
+        llm = MagicMock()
+        llm.send_message = AsyncMock(return_value="answer")
+        manager = ChatManager(llm, MagicMock())
+
+        result = QueryResult(rows=[{"id": 1}, {"id": 2}], truncated=True)
+        assert await manager._results_to_answer("How many?", "SELECT id", result) == "answer"
+
+        prompt = llm.send_message.call_args.args[0][0]["content"]
+        assert "Всего строк: больше 2 (результат обрезан до 2 строк)" in prompt
+
+
+class CountingCollector:
+    """Collector counting computations, optionally blocked until released"""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, str | None]] = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.error: Exception | None = None
+
+    async def get_stats(self, period: str, bucket: str | None = None) -> StatsResponse:
+        self.calls.append((period, bucket))
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return StatsResponse(kpi_metrics=[], timeline=[])
+
+
+class FakeClock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCachedStatCollector:
+    """Test CachedStatCollector TTL cache and single-flight"""
+
+    @pytest.mark.asyncio
+    async def test_response_cached_until_ttl(self) -> None:
+        """Test that responses are reused within TTL and recomputed after it"""
+        inner, clock = CountingCollector(), FakeClock()
+        collector = CachedStatCollector(inner, ttl_seconds=30, clock=clock)
+
+        first = await collector.get_stats("week")
+        clock.now = 29
+        assert await collector.get_stats("week") is first
+        assert len(inner.calls) == 1
+
+        clock.now = 30
+        assert await collector.get_stats("week") is not first
+        assert len(inner.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_cache_key_includes_period_and_resolved_bucket(self) -> None:
+        """Test that default bucket shares entry with explicit default"""
+        inner = CountingCollector()
+        collector = CachedStatCollector(inner, ttl_seconds=30, clock=FakeClock())
+
+        await collector.get_stats("day")
+        await collector.get_stats("day", "1h")
+        await collector.get_stats("day", "5m")
+        await collector.get_stats("week")
+
+        assert inner.calls == [("day", "1h"), ("day", "5m"), ("week", "1d")]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_computation(self) -> None:
+        """Test single-flight: a burst of misses computes statistics once"""
+        inner = CountingCollector()
+        inner.release.clear()
+        collector = CachedStatCollector(inner, ttl_seconds=30, clock=FakeClock())
+
+        waiters = [asyncio.create_task(collector.get_stats("month")) for _ in range(10)]
+        await asyncio.sleep(0)
+        inner.release.set()
+        responses = await asyncio.gather(*waiters)
+
+        assert len(inner.calls) == 1
+        assert all(response is responses[0] for response in responses)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_request_does_not_cancel_computation(self) -> None:
+        """Test that a disconnected waiter leaves the shared computation running"""
+        inner = CountingCollector()
+        inner.release.clear()
+        collector = CachedStatCollector(inner, ttl_seconds=30, clock=FakeClock())
+
+        cancelled = asyncio.create_task(collector.get_stats("week"))
+        waiting = asyncio.create_task(collector.get_stats("week"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        inner.release.set()
+
+        assert (await waiting).timeline == []
+        assert len(inner.calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_failure_is_not_cached(self) -> None:
+        """Test that errors reach waiters and the next request retries"""
+        inner = CountingCollector()
+        inner.error = RuntimeError("database is locked")
+        collector = CachedStatCollector(inner, ttl_seconds=30, clock=FakeClock())
+
+        with pytest.raises(RuntimeError):
+            await collector.get_stats("week")
+
+        inner.error = None
+        await collector.get_stats("week")
+        assert len(inner.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_refresh_ahead_serves_cached_response(self) -> None:
+        """Test background refresh before expiry"""
+        inner, clock = CountingCollector(), FakeClock()
+        collector = CachedStatCollector(
+            inner, ttl_seconds=30, refresh_ahead_seconds=10, clock=clock
+        )
+        first = await collector.get_stats("week")
+
+        clock.now = 25
+        inner.release.clear()
+        assert await collector.get_stats("week") is first
+        assert await collector.get_stats("week") is first
+        await asyncio.sleep(0)
+        assert len(inner.calls) == 2
+
+        inner.release.set()
+        await asyncio.sleep(0)
+        clock.now = 40
+        assert await collector.get_stats("week") is not first
+        assert len(inner.calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_entry_keeps_its_data_version(self) -> None:
+        """Test that a new data version doesn't drop the entry before its TTL"""
+        inner, clock = CountingCollector(), FakeClock()
+        version = AsyncMock(return_value="v1")
+        collector = CachedStatCollector(inner, ttl_seconds=30, clock=clock, version=version)
+
+        first, first_version = await collector.get_versioned_stats("week")
+        assert first_version == "v1"
+
+        version.return_value = "v2"
+        assert await collector.get_versioned_stats("week") == (first, "v1")
+        assert len(inner.calls) == 1
+
+        clock.now = 30
+        response, new_version = await collector.get_versioned_stats("week")
+        assert response is not first
+        assert new_version == "v2"
+        version.assert_awaited_with("1d")
+
+    @pytest.mark.asyncio
+    async def test_zero_ttl_disables_cache(self) -> None:
+        """Test that ttl_seconds=0 passes every request through"""
+        inner = CountingCollector()
+        collector = CachedStatCollector(inner, ttl_seconds=0)
+
+        await collector.get_stats("week")
+        await collector.get_stats("week")
+        assert len(inner.calls) == 2
+
+
+def make_stats(values: dict[str, int], users: str = "1") -> StatsResponse:
+    """Build response with given timeline values and Total Users card"""
+    return StatsResponse(
+        kpi_metrics=[KPIMetric(label="Total Users", value=users, change=0.0, trend="stable")],
+        timeline=[TimelinePoint(date=date, value=value) for date, value in values.items()],
+    )
+
+
+class SequenceCollector:
+    """Collector returning prepared responses, the last one repeatedly"""
+
+    def __init__(self, *responses: StatsResponse) -> None:
+        self.responses = list(responses)
+        self.calls = 0
+
+    async def get_stats(self, period: str, bucket: str | None = None) -> StatsResponse:
+        self.calls += 1
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+
+def parse_event(event: str) -> tuple[str, dict]:
+    """Split SSE event into its name and JSON data"""
+    name_line, data_line = event.strip().split("\n")
+    return name_line.removeprefix("event: "), json.loads(data_line.removeprefix("data: "))
+
+
+class TestStatsBroadcaster:
+    """Test /stats/stream broadcaster"""
+
+    def test_diff_stats(self) -> None:
+        """Test delta of timeline points and KPI cards"""
+        old = make_stats({"2025-10-10": 1, "2025-10-11": 2})
+
+        assert diff_stats(old, make_stats({"2025-10-10": 1, "2025-10-11": 2})) is None
+
+        delta = diff_stats(old, make_stats({"2025-10-11": 3, "2025-10-12": 0}, users="2"))
+        assert delta is not None
+        assert delta.kpi_metrics is not None and delta.kpi_metrics[0].value == "2"
+        assert [(point.date, point.value) for point in delta.timeline] == [
+            ("2025-10-11", 3),
+            ("2025-10-12", 0),
+        ]
+        assert delta.removed_dates == ["2025-10-10"]
+
+    @pytest.mark.asyncio
+    async def test_snapshot_then_deltas(self) -> None:
+        """Test that subscriber gets snapshot and only changed data afterwards"""
+        collector = SequenceCollector(
+            make_stats({"2025-10-10": 1}),
+            make_stats({"2025-10-10": 1}),
+            make_stats({"2025-10-10": 5}),
+        )
+        broadcaster = StatsBroadcaster(collector, interval_seconds=0.01)
+        stream = broadcaster.subscribe("week")
+
+        name, data = parse_event(await anext(stream))
+        assert name == "snapshot"
+        assert data["timeline"] == [{"date": "2025-10-10", "value": 1}]
+
+        # Unchanged second computation is not sent
+        name, data = parse_event(await anext(stream))
+        assert name == "delta"
+        assert collector.calls == 3
+        assert data == {
+            "kpi_metrics": None,
+            "timeline": [{"date": "2025-10-10", "value": 5}],
+            "removed_dates": [],
+        }
+
+        await stream.aclose()
+        await broadcaster.close()
+
+    @pytest.mark.asyncio
+    async def test_subscribers_share_computation(self) -> None:
+        """Test that statistics are computed once per tick for all subscribers"""
+        collector = SequenceCollector(make_stats({"2025-10-10": 1}))
+        broadcaster = StatsBroadcaster(collector, interval_seconds=60)
+        streams = [broadcaster.subscribe("week", "1d") for _ in range(5)]
+
+        events = [await anext(stream) for stream in streams]
+
+        assert collector.calls == 1
+        assert all(parse_event(event)[0] == "snapshot" for event in events)
+
+        for stream in streams:
+            await stream.aclose()
+        assert broadcaster._channels == {}
+
+    @pytest.mark.asyncio
+    async def test_keep_alive_when_idle(self) -> None:
+        """Test keep-alive comment when nothing changes"""
+        collector = SequenceCollector(make_stats({"2025-10-10": 1}))
+        broadcaster = StatsBroadcaster(collector, interval_seconds=60, heartbeat_seconds=0.01)
+        stream = broadcaster.subscribe("week")
+
+        assert (await anext(stream)).startswith("event: snapshot")
+        assert await anext(stream) == ": keep-alive\n\n"
+
+        await stream.aclose()
+        await broadcaster.close()
+
+    @pytest.mark.asyncio
+    async def test_stream_endpoint(self) -> None:
+        """Test that /stats/stream responds with event stream starting with snapshot"""
+        # Called directly: TestClient can't disconnect from an endless stream
+        broadcaster = StatsBroadcaster(MockStatCollector(), interval_seconds=60)
+        response = await stream_stats(period="day", bucket="2h", broadcaster=broadcaster)
+
+        assert response.media_type == "text/event-stream"
+        assert response.headers["cache-control"] == "no-cache"
+        name, data = parse_event(await anext(response.body_iterator))
+        assert name == "snapshot"
+        # Unknown bucket falls back to the default (hourly for day)
+        assert len(data["timeline"]) == 24
+
+        await response.body_iterator.aclose()
+        await broadcaster.close()
@@ -0,0 +1,190 @@
+"""Тесты холодного архива сообщений messages_archive"""
+
+import asyncio
+import sqlite3
+
+import pytest
+import pytest_asyncio
+
+from alembic import command
+from src import maintenance
+from src.database import DatabaseManager, MessageArchiver, MessageRepository
+
+
+@pytest_asyncio.fixture
+async def db_manager(db_manager):
+    """Общая мигрированная БД с двумя пользователями"""
+    await db_manager.execute(
+        "INSERT INTO users (id, first_name) VALUES (1, 'First'), (2, 'Second')"
+    )
+    return db_manager
+
+
+async def create_old(db: DatabaseManager, user_id: int, created_at: str, content: str) -> int:
+    """Создает сообщение с заданной датой создания"""
+    rows = await db.execute_returning(
+        """
+        INSERT INTO messages (user_id, role, content, length, created_at)
+        VALUES (?, 'user', ?, ?, ?)
+        RETURNING id
+        """,
+        (user_id, content, len(content), created_at),
+    )
+    return int(rows[0]["id"])
+
+
+async def archive(db: DatabaseManager) -> int:
+    """Архивирует сообщения старше 30 дней"""
+    return await MessageArchiver(db, archive_after_days=30, pause_seconds=0).archive()
+
+
+@pytest.mark.asyncio
+async def test_archiver_validates_parameters(db_manager):
+    """Возраст архивации должен быть положительным"""
+    with pytest.raises(ValueError, match="archive_after_days"):
+        MessageArchiver(db_manager, archive_after_days=0)
+
+
+@pytest.mark.asyncio
+async def test_archive_moves_old_messages_by_user_and_month(db_manager):
+    """Старые активные сообщения переносятся в блоки по пользователю и месяцу"""
+    repo = MessageRepository(db_manager)
+    january = [
+        await create_old(db_manager, 1, f"2020-01-{day:02d} 10:00:00", "jan") for day in (1, 31)
+    ]
+    february = await create_old(db_manager, 1, "2020-02-01 00:00:00", "feb")
+    other_user = await create_old(db_manager, 2, "2020-01-15 10:00:00", "other")
+    deleted = await create_old(db_manager, 1, "2020-01-20 10:00:00", "deleted")
+    await repo.soft_delete(deleted)
+    recent = await repo.create(1, "user", "recent")
+
+    assert await archive(db_manager) == 4
+    assert await archive(db_manager) == 0
+
+    rows = await db_manager.fetchall(
+        "SELECT user_id, month, first_id, last_id, message_count FROM messages_archive"
+        " ORDER BY user_id, month"
+    )
+    assert rows == [
+        {
+            "user_id": 1,
+            "month": "2020-01",
+            "first_id": january[0],
+            "last_id": january[1],
+            "message_count": 2,
+        },
+        {
+            "user_id": 1,
+            "month": "2020-02",
+            "first_id": february,
+            "last_id": february,
+            "message_count": 1,
+        },
+        {
+            "user_id": 2,
+            "month": "2020-01",
+            "first_id": other_user,
+            "last_id": other_user,
+            "message_count": 1,
+        },
+    ]
+    # Удаленное сообщение остается для очистки по сроку хранения
+    hot = await db_manager.fetchall("SELECT id FROM messages ORDER BY id")
+    assert [row["id"] for row in hot] == [deleted, recent]
+
+
+@pytest.mark.asyncio
+async def test_archive_merges_month_blob(db_manager):
+    """Повторная архивация того же месяца дописывает сообщения в его блок"""
+    first = await create_old(db_manager, 1, "2020-01-01 10:00:00", "first")
+    await archive(db_manager)
+    second = await create_old(db_manager, 1, "2020-01-02 10:00:00", "second")
+    await archive(db_manager)
+
+    messages = await MessageRepository(db_manager).get_recent(1, limit=10)
+    assert [m.id for m in messages] == [second, first]
+    row = await db_manager.fetchone("SELECT message_count FROM messages_archive")
+    assert row == {"message_count": 2}
+
+
+@pytest.mark.asyncio
+async def test_history_reads_archive_transparently(db_manager, mocker):
+    """get_recent и get_page продолжают историю в архиве с теми же id"""
+    repo = MessageRepository(db_manager)
+    old = [
+        await create_old(db_manager, 1, f"2020-0{month}-01 10:00:00", f"old {month}")
+        for month in (1, 1, 2, 3)
+    ]
+    await archive(db_manager)
+    hot = [await repo.create(1, "user", f"hot {i}") for i in range(2)]
+
+    recent = await repo.get_recent(1, limit=4)
+    assert [m.id for m in recent] == [hot[1], hot[0], old[3], old[2]]
+    assert recent[-1].content == "old 2" and recent[-1].deleted_at is None
+
+    page, cursor = await repo.get_page(1, limit=3)
+    assert [m.id for m in page] == [old[3], *hot]
+    page, cursor = await repo.get_page(1, limit=3, before_id=cursor)
+    assert [m.id for m in page] == old[:3]
+    assert cursor is None
+
+    page, cursor = await repo.get_page(1, limit=3, after_id=old[0])
+    assert [m.id for m in page] == [old[1], old[2], old[3]]
+    # Курсор прошел последнее архивное сообщение - архив не читается
+    fetch_archived = mocker.spy(repo, "_fetch_archived")
+    page, cursor = await repo.get_page(1, limit=3, after_id=cursor)
+    assert [m.id for m in page] == hot
+    assert cursor is None
+    assert fetch_archived.call_count == 0
+
+
+@pytest.mark.asyncio
+async def test_clear_hides_archived_messages(db_manager):
+    """/clear скрывает и архивные сообщения"""
+    repo = MessageRepository(db_manager)
+    await create_old(db_manager, 1, "2020-01-01 10:00:00", "old")
+    await archive(db_manager)
+
+    assert await repo.clear_history(1) is True
+    assert await repo.get_recent(1, limit=10) == []
+    assert await repo.get_page(1, limit=10) == ([], None)
+    assert await repo.clear_history(1) is False
+
+
+def test_archive_command(migrated_db_path, tmp_path, monkeypatch, capsys):
+    """CLI archive переносит сообщения старше --days"""
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+    # setup_logger() пишет logs/bot.log в текущий каталог
+    monkeypatch.chdir(tmp_path)
+
+    maintenance.main(["--database", migrated_db_path, "archive", "--days", "90"])
+
+    assert "Archived 0 messages" in capsys.readouterr().out
+
+
+def test_downgrade_restores_archived_messages(migrated_db_path, alembic_config, monkeypatch):
+    """Откат миграции 009 возвращает архивные сообщения в messages"""
+    db_path = migrated_db_path
+
+    async def run_archive() -> None:
+        monkeypatch.setattr(DatabaseManager, "_instance", None)
+        manager = DatabaseManager(str(db_path), read_pool_size=0)
+        await manager.init()
+        try:
+            await manager.execute("INSERT INTO users (id, first_name) VALUES (1, 'User')")
+            await create_old(manager, 1, "2020-01-01 10:00:00", "pizza")
+            assert await archive(manager) == 1
+        finally:
+            await manager.close()
+
+    asyncio.run(run_archive())
+    command.downgrade(alembic_config, "008")
+
+    with sqlite3.connect(db_path) as connection:
+        messages = connection.execute("SELECT id, content, created_at FROM messages").fetchall()
+        stats = connection.execute("SELECT message_count, total_length FROM message_stats_hourly")
+        assert messages == [(1, "pizza", "2020-01-01 10:00:00")]
+        assert stats.fetchall() == [(1, 5)]
+        assert connection.execute(
+            "SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'pizza'"
+        ).fetchall() == [(1,)]
@@ -229,3 +229,138 @@ def test_config_zero_storage_ttl(monkeypatch):
 
     with pytest.raises(ValueError, match="must be greater than 0"):
         Config.load()
+
+
+def test_config_database_read_pool_size(monkeypatch):
+    """Тест параметра размера пула соединений чтения"""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    assert Config.load().database_read_pool_size == 4
+
+    monkeypatch.setenv("DATABASE_READ_POOL_SIZE", "8")
+    assert Config.load().database_read_pool_size == 8
+
+
+def test_config_invalid_database_read_pool_size(monkeypatch):
+    """Тест ошибки при некорректном DATABASE_READ_POOL_SIZE"""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    monkeypatch.setenv("DATABASE_READ_POOL_SIZE", "many")
+    with pytest.raises(ValueError, match="must be a valid integer"):
+        Config.load()
+
+    monkeypatch.setenv("DATABASE_READ_POOL_SIZE", "0")
+    with pytest.raises(ValueError, match="must be greater than 0"):
+        Config.load()
+
+
+def test_config_database_group_commit(monkeypatch):
+    """Тест параметров group commit (по умолчанию выключен)"""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    config = Config.load()
+    assert config.database_group_commit_ms == 0
+    assert config.database_group_commit_max_batch == 100
+
+    monkeypatch.setenv("DATABASE_GROUP_COMMIT_MS", "5")
+    monkeypatch.setenv("DATABASE_GROUP_COMMIT_MAX_BATCH", "20")
+    config = Config.load()
+    assert config.database_group_commit_ms == 5
+    assert config.database_group_commit_max_batch == 20
+
+
+def test_config_stats_cache(monkeypatch):
+    """Тест параметров кэша /stats"""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    config = Config.load()
+    assert config.stats_cache_ttl_seconds == 15
+    assert config.stats_cache_refresh_ahead_seconds == 0
+
+    monkeypatch.setenv("STATS_CACHE_TTL_SECONDS", "0")
+    monkeypatch.setenv("STATS_CACHE_REFRESH_AHEAD_SECONDS", "5")
+    config = Config.load()
+    assert config.stats_cache_ttl_seconds == 0
+    assert config.stats_cache_refresh_ahead_seconds == 5
+
+    monkeypatch.setenv("STATS_CACHE_TTL_SECONDS", "-1")
+    with pytest.raises(ValueError, match="STATS_CACHE_TTL_SECONDS"):
+        Config.load()
+
+
+def test_config_stats_stream_interval(monkeypatch):
+    """Тест интервала пересчета /stats/stream"""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    assert Config.load().stats_stream_interval_seconds == 5
+
+    monkeypatch.setenv("STATS_STREAM_INTERVAL_SECONDS", "0")
+    with pytest.raises(ValueError, match="must be greater than 0"):
+        Config.load()
+
+
+def test_config_fts_merge_interval(monkeypatch):
+    """Тест интервала фонового слияния FTS-индекса"""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    assert Config.load().fts_merge_interval_seconds == 600
+
+    monkeypatch.setenv("FTS_MERGE_INTERVAL_SECONDS", "0")
+    assert Config.load().fts_merge_interval_seconds == 0
+
+
+def test_config_clear_sweep_interval(monkeypatch):
+    """Тест интервала фонового удаления сообщений после /clear"""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    assert Config.load().clear_sweep_interval_seconds == 60
+
+    monkeypatch.setenv("CLEAR_SWEEP_INTERVAL_SECONDS", "0")
+    assert Config.load().clear_sweep_interval_seconds == 0
+
+
+def test_config_retention(monkeypatch):
+    """Тест параметров окончательного удаления soft deleted записей"""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    config = Config.load()
+    assert config.retention_days == 0
+    assert config.retention_interval_seconds == 3600
+
+    monkeypatch.setenv("RETENTION_DAYS", "30")
+    monkeypatch.setenv("RETENTION_INTERVAL_SECONDS", "600")
+    config = Config.load()
+    assert config.retention_days == 30
+    assert config.retention_interval_seconds == 600
+
+
+def test_config_archive(monkeypatch):
+    """Тест параметров переноса старых сообщений в архив"""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    config = Config.load()
+    assert config.archive_after_days == 0
+    assert config.archive_interval_seconds == 86400
+
+    monkeypatch.setenv("ARCHIVE_AFTER_DAYS", "180")
+    assert Config.load().archive_after_days == 180
+
+
+def test_config_message_compression_threshold(monkeypatch):
+    """Тест порога сжатого хранения текста сообщений"""
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "test-token")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+
+    assert Config.load().message_compression_threshold == 0
+
+    monkeypatch.setenv("MESSAGE_COMPRESSION_THRESHOLD", "2048")
+    assert Config.load().message_compression_threshold == 2048
@@ -0,0 +1,99 @@
+"""Тесты для ConversationCache"""
+
+from src.database import ConversationCache, MessageRecord
+
+
+def make_message(message_id: int, content: str = "text") -> MessageRecord:
+    """Создает запись сообщения как из БД"""
+    return MessageRecord(message_id, 1, "user", content, len(content), "2025-01-01 00:00:00", None)
+
+
+def fill(cache: ConversationCache, user_id: int, messages: list[MessageRecord]) -> None:
+    """Заполняет кэш пользователя (messages - от новых к старым)"""
+    cache.start_fill(user_id)
+    cache.finish_fill(user_id, messages)
+
+
+def test_get_miss_returns_none():
+    """Тест промаха кэша"""
+    cache = ConversationCache(capacity=3, max_bytes=1000)
+    assert cache.get(1, 3) is None
+
+
+def test_fill_and_get_most_recent_first():
+    """Тест заполнения и чтения последних сообщений"""
+    cache = ConversationCache(capacity=3, max_bytes=1000)
+    fill(cache, 1, [make_message(3), make_message(2), make_message(1)])
+
+    assert [msg["id"] for msg in cache.get(1, 3)] == [3, 2, 1]
+    assert [msg["id"] for msg in cache.get(1, 2)] == [3, 2]
+    assert cache.get(1, 0) == []
+    # Лимит больше емкости кэша не обслуживается
+    assert cache.get(1, 4) is None
+
+
+def test_append_keeps_ring_buffer_size():
+    """Тест кольцевого буфера: старые сообщения вытесняются новыми"""
+    cache = ConversationCache(capacity=2, max_bytes=1000)
+    fill(cache, 1, [make_message(2, "bb"), make_message(1, "a")])
+
+    cache.append(1, make_message(3, "ccc"))
+
+    assert [msg["id"] for msg in cache.get(1, 2)] == [3, 2]
+    assert cache.total_bytes == len("bb") + len("ccc")
+
+
+def test_append_ignored_for_uncached_user():
+    """Тест: append для пользователя вне кэша ничего не делает"""
+    cache = ConversationCache(capacity=2, max_bytes=1000)
+    cache.append(1, make_message(1))
+    assert 1 not in cache
+
+
+def test_invalidate():
+    """Тест инвалидации кэша пользователя"""
+    cache = ConversationCache(capacity=2, max_bytes=1000)
+    fill(cache, 1, [make_message(1, "abc")])
+
+    cache.invalidate(1)
+
+    assert cache.get(1, 2) is None
+    assert cache.total_bytes == 0
+
+
+def test_fill_discarded_after_concurrent_write():
+    """Тест: заполнение, пересекшееся с записью, не сохраняется"""
+    cache = ConversationCache(capacity=2, max_bytes=1000)
+
+    cache.start_fill(1)
+    cache.append(1, make_message(2))
+    cache.finish_fill(1, [make_message(1)])
+
+    assert 1 not in cache
+
+    # Следующее заполнение проходит нормально
+    fill(cache, 1, [make_message(2), make_message(1)])
+    assert 1 in cache
+
+
+def test_lru_eviction_by_total_bytes():
+    """Тест LRU-вытеснения по суммарному размеру"""
+    cache = ConversationCache(capacity=5, max_bytes=10)
+    fill(cache, 1, [make_message(1, "aaaa")])
+    fill(cache, 2, [make_message(2, "bbbb")])
+
+    # Обращение делает пользователя 1 самым свежим
+    cache.get(1, 1)
+    fill(cache, 3, [make_message(3, "cccc")])
+
+    assert 1 in cache
+    assert 2 not in cache
+    assert 3 in cache
+    assert cache.total_bytes == 8
+
+
+def test_size_counted_in_utf8_bytes():
+    """Тест: размер считается в байтах UTF-8"""
+    cache = ConversationCache(capacity=5, max_bytes=1000)
+    fill(cache, 1, [make_message(1, "привет")])
+    assert cache.total_bytes == len("привет".encode())
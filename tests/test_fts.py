@@ -0,0 +1,247 @@
+"""Тесты полнотекстового индекса messages_fts и его обслуживания"""
+
+import asyncio
+import sqlite3
+import zlib
+
+import pytest
+import pytest_asyncio
+
+from alembic import command
+from src import maintenance
+from src.database import DatabaseManager, FTSMaintenance, MessageRepository
+
+
+@pytest_asyncio.fixture
+async def db_manager(db_manager):
+    """Общая мигрированная БД с одним пользователем"""
+    await db_manager.execute("INSERT INTO users (id, first_name) VALUES (1, 'User')")
+    return db_manager
+
+
+async def indexed_ids(db: DatabaseManager, term: str) -> list[int]:
+    """ID сообщений, найденных по термину в самом индексе (без фильтра deleted_at)"""
+    rows = await db.fetchall(
+        "SELECT rowid FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rowid", (term,)
+    )
+    return [row["rowid"] for row in rows]
+
+
+async def check_integrity(db: DatabaseManager) -> None:
+    """Проверка внутренней согласованности FTS-индекса (ошибка - исключение)"""
+    await db.execute("INSERT INTO messages_fts(messages_fts, rank) VALUES ('integrity-check', 0)")
+
+
+@pytest.mark.asyncio
+async def test_index_keeps_only_active_messages(db_manager):
+    """Soft delete убирает сообщение из индекса, восстановление возвращает"""
+    repo = MessageRepository(db_manager)
+    first = await repo.create(1, "user", "pizza")
+    second = await repo.create(1, "user", "pizza again")
+
+    await repo.soft_delete(first)
+    assert await indexed_ids(db_manager, "pizza") == [second]
+
+    await db_manager.execute("UPDATE messages SET deleted_at = NULL WHERE id = ?", (first,))
+    assert await indexed_ids(db_manager, "pizza") == [first, second]
+
+    await repo.soft_delete_many([first, second])
+    assert await indexed_ids(db_manager, "pizza") == []
+    await check_integrity(db_manager)
+
+
+@pytest.mark.asyncio
+async def test_content_update_and_hard_delete(db_manager):
+    """Изменение content переиндексирует сообщение, жесткое удаление убирает его"""
+    repo = MessageRepository(db_manager)
+    message_id = await repo.create(1, "user", "pizza")
+    deleted_id = await repo.create(1, "user", "pasta")
+    await repo.soft_delete(deleted_id)
+
+    await db_manager.execute("UPDATE messages SET content = 'pasta' WHERE id = ?", (message_id,))
+    assert await indexed_ids(db_manager, "pizza") == []
+    assert await indexed_ids(db_manager, "pasta") == [message_id]
+
+    # Удаленное сообщение не было в индексе - удаление не трогает FTS
+    await db_manager.execute("DELETE FROM messages")
+    assert await indexed_ids(db_manager, "pasta") == []
+    await check_integrity(db_manager)
+
+
+@pytest.mark.asyncio
+async def test_soft_delete_skips_fts_of_deleted_rows(db_manager):
+    """Обновления, не меняющие content активных сообщений, не пишут в FTS"""
+    repo = MessageRepository(db_manager)
+    message_id = await repo.create(1, "user", "pizza")
+    await repo.soft_delete(message_id)
+
+    # Каждая запись в FTS5 добавляет сегмент в messages_fts_data
+    before = await db_manager.fetchone("SELECT COUNT(*) AS count FROM messages_fts_data")
+    await db_manager.execute(
+        "UPDATE messages SET deleted_at = '2026-01-01 00:00:00' WHERE id = ?", (message_id,)
+    )
+    await db_manager.execute("UPDATE messages SET length = 10 WHERE id = ?", (message_id,))
+    after = await db_manager.fetchone("SELECT COUNT(*) AS count FROM messages_fts_data")
+
+    assert before is not None and after is not None
+    assert after["count"] == before["count"]
+
+
+@pytest.mark.asyncio
+async def test_maintenance_merge_optimize_rebuild(db_manager):
+    """merge/optimize сохраняют результаты поиска, rebuild индексирует только активные"""
+    repo = MessageRepository(db_manager)
+    ids = [await repo.create(1, "user", f"pizza {i}") for i in range(5)]
+    await repo.soft_delete(ids[0])
+    fts = FTSMaintenance(db_manager)
+
+    await fts.merge(pages=10)
+    await fts.optimize()
+    assert await indexed_ids(db_manager, "pizza") == ids[1:]
+
+    assert await fts.rebuild() == 4
+    assert await indexed_ids(db_manager, "pizza") == ids[1:]
+    await check_integrity(db_manager)
+
+
+@pytest.mark.asyncio
+async def test_run_periodically_merges_until_cancelled(db_manager, mocker):
+    """Фоновая задача вызывает merge каждый интервал, ошибки не останавливают ее"""
+    fts = FTSMaintenance(db_manager)
+    merge = mocker.patch.object(fts, "merge", side_effect=[sqlite3.OperationalError("busy"), None])
+
+    task = asyncio.create_task(fts.run_periodically(0.01, pages=7))
+    while merge.call_count < 2:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    merge.assert_called_with(7)
+
+
+def test_migration_drops_soft_deleted_from_index(tmp_path, alembic_config):
+    """Миграция 006 убирает из индекса уже удаленные сообщения"""
+    db_path = tmp_path / "bot.db"
+    command.upgrade(alembic_config, "005")
+
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("INSERT INTO users (id, first_name) VALUES (1, 'User')")
+        connection.executemany(
+            "INSERT INTO messages (user_id, role, content, length) VALUES (1, 'user', ?, 5)",
+            [("pizza",), ("pizza",)],
+        )
+        connection.execute("UPDATE messages SET deleted_at = CURRENT_TIMESTAMP WHERE id = 1")
+
+    command.upgrade(alembic_config, "head")
+
+    with sqlite3.connect(db_path) as connection:
+        rows = connection.execute(
+            "SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'pizza'"
+        ).fetchall()
+    assert rows == [(2,)]
+
+
+def test_fts_rebuild_command(migrated_db_path, tmp_path, monkeypatch, capsys):
+    """CLI fts-rebuild переиндексирует указанную БД"""
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+    # setup_logger() пишет logs/bot.log в текущий каталог
+    monkeypatch.chdir(tmp_path)
+
+    maintenance.main(["--database", migrated_db_path, "fts-rebuild"])
+
+    assert "messages_fts rebuilt: 0 messages" in capsys.readouterr().out
+
+
+@pytest.mark.asyncio
+async def test_compressed_messages_go_through_queue(db_manager):
+    """Сжатые сообщения индексируются при создании, остальные изменения ждут apply_queue"""
+    repo = MessageRepository(db_manager, compression_threshold=10)
+    first = await repo.create(1, "user", "pizza " * 10)
+    second, third = await repo.create_many([(1, "user", "pizza " * 20), (1, "user", "pasta")])
+    queue_sql = "SELECT message_id, action FROM messages_fts_queue ORDER BY id"
+    assert await db_manager.fetchall(queue_sql) == []
+    assert await indexed_ids(db_manager, "pizza") == [first, second]
+
+    await repo.soft_delete(first)
+    await db_manager.execute("UPDATE messages SET deleted_at = NULL WHERE id = ?", (first,))
+    await db_manager.execute("DELETE FROM messages WHERE id = ?", (second,))
+    assert await db_manager.fetchall(queue_sql) == [
+        {"message_id": first, "action": "unindex"},
+        {"message_id": first, "action": "index"},
+        {"message_id": second, "action": "unindex"},
+    ]
+
+    fts = FTSMaintenance(db_manager)
+    assert await fts.apply_queue(batch_size=2) == 3
+    assert await db_manager.fetchall(queue_sql) == []
+    assert await indexed_ids(db_manager, "pizza") == [first]
+    assert await indexed_ids(db_manager, "pasta") == [third]
+
+    assert await fts.rebuild(batch_size=1) == 2
+    assert await indexed_ids(db_manager, "pizza") == [first]
+    await check_integrity(db_manager)
+
+
+def test_schema_works_without_application_functions(migrated_db_path, monkeypatch):
+    """Обычный клиент sqlite3 пишет и читает сообщения, сжатые попадают в очередь"""
+    long_text = "pizza " * 100
+    with sqlite3.connect(migrated_db_path) as connection:
+        connection.execute("INSERT INTO users (id, first_name) VALUES (1, 'User')")
+        connection.execute(
+            """
+            INSERT INTO messages (user_id, role, content, content_z, length)
+            VALUES (1, 'user', '', ?, ?)
+            """,
+            (zlib.compress(long_text.encode()), len(long_text)),
+        )
+        connection.execute(
+            "INSERT INTO messages (user_id, role, content, length) VALUES (1, 'user', 'pasta', 5)"
+        )
+        connection.execute("UPDATE messages SET deleted_at = CURRENT_TIMESTAMP WHERE id = 2")
+        assert connection.execute("SELECT action FROM messages_fts_queue").fetchall() == [
+            ("index",)
+        ]
+        assert connection.execute("SELECT COUNT(*) FROM messages_fts").fetchall() == [(2,)]
+
+    async def apply_queue() -> list[int]:
+        monkeypatch.setattr(DatabaseManager, "_instance", None)
+        manager = DatabaseManager(migrated_db_path, read_pool_size=0)
+        await manager.init()
+        try:
+            assert await FTSMaintenance(manager).apply_queue() == 1
+            [record] = await MessageRepository(manager).get_recent(1, 10)
+            assert record.content == long_text
+            return await indexed_ids(manager, "pizza")
+        finally:
+            await manager.close()
+
+    assert asyncio.run(apply_queue()) == [1]
+
+
+def test_migration_010_downgrade_decompresses_content(
+    migrated_db_path, alembic_config, monkeypatch
+):
+    """Откат миграции 010 возвращает сжатые тексты в content и индекс"""
+    db_path = migrated_db_path
+    long_text = "pizza " * 100
+
+    async def create_compressed() -> None:
+        monkeypatch.setattr(DatabaseManager, "_instance", None)
+        manager = DatabaseManager(str(db_path), read_pool_size=0)
+        await manager.init()
+        try:
+            await manager.execute("INSERT INTO users (id, first_name) VALUES (1, 'User')")
+            await MessageRepository(manager, compression_threshold=10).create(1, "user", long_text)
+        finally:
+            await manager.close()
+
+    asyncio.run(create_compressed())
+    command.downgrade(alembic_config, "009")
+
+    with sqlite3.connect(db_path) as connection:
+        assert connection.execute("SELECT content FROM messages").fetchall() == [(long_text,)]
+        rows = connection.execute(
+            "SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'pizza'"
+        ).fetchall()
+    assert rows == [(1,)]
@@ -0,0 +1,189 @@
+"""Тесты почасовой статистики сообщений (message_stats_hourly)"""
+
+import pytest
+import pytest_asyncio
+
+from api.collectors.real_collector import RealStatCollector
+from src import maintenance
+from src.database import (
+    DatabaseManager,
+    MessageArchiver,
+    MessageRepository,
+    MessageStatsRepository,
+)
+
+
+@pytest_asyncio.fixture
+async def db_manager(db_manager):
+    """Общая мигрированная БД с одним пользователем"""
+    await db_manager.execute("INSERT INTO users (id, first_name) VALUES (1, 'User')")
+    return db_manager
+
+
+async def add_message(
+    db: DatabaseManager, created_at: str, content: str = "text", deleted_at: str | None = None
+) -> int:
+    """Добавляет сообщение с заданным временем создания (и удаления)"""
+    rows = await db.execute_returning(
+        """
+        INSERT INTO messages (user_id, role, content, length, created_at, deleted_at)
+        VALUES (1, 'user', ?, ?, ?, ?)
+        RETURNING id
+        """,
+        (content, len(content), created_at, deleted_at),
+    )
+    return int(rows[0]["id"])
+
+
+async def get_rollup(db: DatabaseManager) -> list[tuple[str, int, int, int]]:
+    """Строки rollup: (час, число сообщений, суммарная длина, число удаленных)"""
+    rows = await db.fetchall(
+        """
+        SELECT datetime(hour * 3600, 'unixepoch') AS hour,
+               message_count, total_length, deleted_count
+        FROM message_stats_hourly
+        WHERE message_count != 0 OR total_length != 0 OR deleted_count != 0
+        ORDER BY hour
+        """
+    )
+    return [
+        (row["hour"], row["message_count"], row["total_length"], row["deleted_count"])
+        for row in rows
+    ]
+
+
+@pytest.mark.asyncio
+async def test_insert_updates_rollup(db_manager):
+    """Новые сообщения попадают в час своего создания"""
+    await add_message(db_manager, "2026-01-01 10:05:00", "hello")
+    await add_message(db_manager, "2026-01-01 10:55:00", "abc")
+    await add_message(db_manager, "2026-01-01 11:00:00", "x")
+    await add_message(db_manager, "2026-01-01 09:00:00", "gone", deleted_at="2026-01-02 00:30:00")
+
+    assert await get_rollup(db_manager) == [
+        ("2026-01-01 10:00:00", 2, 8, 0),
+        ("2026-01-01 11:00:00", 1, 1, 0),
+        ("2026-01-02 00:00:00", 0, 0, 1),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_soft_delete_and_restore_update_rollup(db_manager):
+    """Мягкое удаление переносит сообщение в удаленные, восстановление - обратно"""
+    message_id = await add_message(db_manager, "2026-01-01 10:00:00", "hello")
+
+    await db_manager.execute(
+        "UPDATE messages SET deleted_at = '2026-01-01 12:30:00' WHERE id = ?", (message_id,)
+    )
+    assert await get_rollup(db_manager) == [("2026-01-01 12:00:00", 0, 0, 1)]
+
+    # Повторное удаление переносит сообщение в новый час, а не учитывает дважды
+    await db_manager.execute(
+        "UPDATE messages SET deleted_at = '2026-01-01 13:00:00' WHERE id = ?", (message_id,)
+    )
+    assert await get_rollup(db_manager) == [("2026-01-01 13:00:00", 0, 0, 1)]
+
+    await db_manager.execute("UPDATE messages SET deleted_at = NULL WHERE id = ?", (message_id,))
+    assert await get_rollup(db_manager) == [("2026-01-01 10:00:00", 1, 5, 0)]
+
+
+@pytest.mark.asyncio
+async def test_epoch_columns_follow_text_timestamps(db_manager):
+    """created_at_ts/deleted_at_ts вычисляются из текстовых дат при любой записи"""
+    message_id = await add_message(db_manager, "2026-01-01 10:05:00")
+    deleted_id = await add_message(
+        db_manager, "2026-01-01 10:00:00", deleted_at="2026-01-02 00:30:00"
+    )
+    await db_manager.execute(
+        "UPDATE messages SET deleted_at = '2026-01-01 12:00:00' WHERE id = ?", (message_id,)
+    )
+    await db_manager.execute("UPDATE messages SET deleted_at = NULL WHERE id = ?", (deleted_id,))
+
+    rows = await db_manager.fetchall(
+        "SELECT id, created_at_ts, deleted_at_ts FROM messages ORDER BY id"
+    )
+    assert [(row["id"], row["created_at_ts"], row["deleted_at_ts"]) for row in rows] == [
+        (message_id, 1767261900, 1767268800),
+        (deleted_id, 1767261600, None),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_repository_writes_update_rollup(db_manager):
+    """Записи через MessageRepository (включая пакетные) поддерживают rollup"""
+    repo = MessageRepository(db_manager)
+    await repo.create(1, "user", "hello")
+    ids = await repo.create_many([(1, "user", "ab"), (1, "assistant", "abc")])
+    await repo.soft_delete_many(ids)
+
+    row = await db_manager.fetchone(
+        """
+        SELECT SUM(message_count) AS messages, SUM(total_length) AS length,
+               SUM(deleted_count) AS deleted
+        FROM message_stats_hourly
+        """
+    )
+    assert row is not None
+    assert (row["messages"], row["length"], row["deleted"]) == (1, 5, 2)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_matches_triggers(db_manager):
+    """rebuild() пересчитывает rollup так же, как его ведут триггеры"""
+    await add_message(db_manager, "2026-01-01 10:05:00", "hello")
+    message_id = await add_message(db_manager, "2026-01-01 11:00:00", "abc")
+    await db_manager.execute(
+        "UPDATE messages SET deleted_at = '2026-01-01 12:00:00' WHERE id = ?", (message_id,)
+    )
+    expected = await get_rollup(db_manager)
+
+    await db_manager.execute("UPDATE message_stats_hourly SET message_count = 100")
+    hours = await MessageStatsRepository(db_manager).rebuild()
+
+    assert hours == 2
+    assert await get_rollup(db_manager) == expected
+
+
+@pytest.mark.asyncio
+async def test_rebuild_counts_archived_messages(db_manager):
+    """Сообщения, перенесенные в архив, остаются в пересчитанном rollup"""
+    await add_message(db_manager, "2020-01-01 10:05:00", "hello")
+    await add_message(db_manager, "2020-01-01 10:45:00", "abc")
+    await add_message(db_manager, "2020-02-01 00:00:00", "feb")
+    await add_message(db_manager, "2020-02-01 00:30:00", "gone", deleted_at="2020-02-02 00:00:00")
+    await MessageRepository(db_manager).create(1, "user", "recent")
+    expected = await get_rollup(db_manager)
+
+    assert await MessageArchiver(db_manager, archive_after_days=30, pause_seconds=0).archive() == 3
+    assert await get_rollup(db_manager) == expected
+    await MessageStatsRepository(db_manager).rebuild()
+
+    assert await get_rollup(db_manager) == expected
+
+
+@pytest.mark.asyncio
+async def test_stats_read_only_rollup(db_manager):
+    """Статистика с бакетами от часа не читает таблицу messages"""
+    collector = RealStatCollector(db_manager)
+    statements: list[str] = []
+    await db_manager._connection.set_trace_callback(statements.append)
+    for reader in db_manager._readers:
+        await reader.set_trace_callback(statements.append)
+
+    for period in ("day", "week", "month"):
+        await collector.get_stats(period)
+
+    queries = [" ".join(sql.split()) for sql in statements if "SELECT" in sql]
+    assert queries
+    assert not [sql for sql in queries if "FROM messages" in sql]
+
+
+def test_rebuild_stats_command(migrated_db_path, tmp_path, monkeypatch, capsys):
+    """CLI rebuild-stats пересчитывает rollup указанной БД"""
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+    # setup_logger() пишет logs/bot.log в текущий каталог
+    monkeypatch.chdir(tmp_path)
+
+    maintenance.main(["--database", migrated_db_path, "rebuild-stats"])
+
+    assert "message_stats_hourly rebuilt: 0 hours" in capsys.readouterr().out
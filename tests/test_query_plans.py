@@ -0,0 +1,174 @@
+"""Регрессионные тесты планов запросов к messages
+
+Все запросы репозиториев и сборщика статистики выполняются на БД, созданной
+миграциями, затем для каждого выполненного SQL строится EXPLAIN QUERY PLAN.
+Полный просмотр (SCAN) таблицы messages считается регрессией: время таких
+запросов растет линейно с историей сообщений.
+"""
+
+import re
+
+import pytest
+import pytest_asyncio
+
+from api.collectors.real_collector import RealStatCollector
+from src.database import (
+    DatabaseManager,
+    MessageArchiver,
+    MessageRepository,
+    RetentionPurger,
+    UserRepository,
+)
+
+_DATA_STATEMENT = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+_TABLE_ALIAS = re.compile(r"\bmessages\s+(?:AS\s+)?(\w+)", re.IGNORECASE)
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+_NOT_ALIASES = {"where", "set", "order", "group", "limit", "join", "on", "values", "inner", "left"}
+
+
+@pytest_asyncio.fixture
+async def traced_db(migrated_db_path, monkeypatch):
+    """DatabaseManager на мигрированной БД, записывающий все выполненные SQL"""
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+    manager = DatabaseManager(migrated_db_path, read_pool_size=2)
+    await manager.init()
+
+    statements: list[str] = []
+    connections = [manager._connection, *manager._readers]
+    for connection in connections:
+        # sqlite3 передает SQL с подставленными параметрами
+        await connection.set_trace_callback(statements.append)
+
+    yield manager, statements
+
+    for connection in connections:
+        await connection.set_trace_callback(None)
+    await manager.close()
+
+
+async def find_message_scans(db: DatabaseManager, statements: list[str]) -> list[str]:
+    """Возвращает запросы, план которых содержит SCAN таблицы messages"""
+    scans = []
+    for sql in dict.fromkeys(statements):
+        if not _DATA_STATEMENT.match(sql):
+            continue
+        aliases = {"messages"} | {
+            alias.lower()
+            for alias in _TABLE_ALIAS.findall(sql)
+            if alias.lower() not in _NOT_ALIASES
+        }
+        plan = await db.fetchall(f"EXPLAIN QUERY PLAN {sql}")
+        for step in plan:
+            match = _SCAN.match(step["detail"])
+            if match and match.group(1).lower() in aliases:
+                scans.append(f"{step['detail']}: {' '.join(sql.split())}")
+    return scans
+
+
+@pytest.mark.asyncio
+async def test_detects_full_scan(traced_db):
+    """Тест: проверка действительно ловит полный просмотр messages"""
+    db, statements = traced_db
+
+    await db.fetchall("SELECT * FROM messages WHERE content = ?", ("x",))
+    await db.fetchall("SELECT m.id FROM messages AS m WHERE m.role = ?", ("user",))
+
+    assert len(await find_message_scans(db, statements)) == 2
+
+
+@pytest.mark.asyncio
+async def test_repository_queries_use_indexes(traced_db):
+    """Тест: запросы репозиториев не сканируют messages"""
+    db, statements = traced_db
+    user_repo = UserRepository(db, cache_size=0)
+    message_repo = MessageRepository(db)
+
+    await user_repo.get_or_create(chat_id=1, username="user", first_name="User")
+    await user_repo.get_by_id(1)
+    user_repo._pending_last_accessed.add(1)
+    await user_repo.flush_last_accessed()
+
+    message_id = await message_repo.create(1, "user", "I like pizza")
+    ids = await message_repo.create_many([(1, "assistant", "Pizza is tasty"), (1, "user", "Ok")])
+    await message_repo.get_recent(1, limit=10)
+    await message_repo.get_page(1, limit=2)
+    await message_repo.get_page(1, limit=2, before_id=ids[-1])
+    await message_repo.get_page(1, limit=2, after_id=message_id)
+    await message_repo.search_fts("pizza")
+    hits, cursor = await message_repo.search("pizza", limit=1, user_id=1)
+    await message_repo.search("pizza", limit=1, cursor=cursor)
+    await message_repo.soft_delete(message_id)
+    await message_repo.soft_delete_many(ids)
+    await message_repo.create(1, "user", "Before clear")
+    await message_repo.clear_history(1)
+    await message_repo.sweep_cleared()
+    await user_repo.soft_delete(1)
+
+    assert await find_message_scans(db, statements) == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("period", ["day", "week", "month"])
+async def test_stats_queries_use_indexes(traced_db, period):
+    """Тест: запросы статистики не сканируют messages"""
+    db, statements = traced_db
+    await UserRepository(db).get_or_create(chat_id=1, username="user", first_name="User")
+    message_id = await MessageRepository(db).create(1, "user", "Hello")
+    await MessageRepository(db).soft_delete(message_id)
+
+    await RealStatCollector(db).get_stats(period)
+
+    assert await find_message_scans(db, statements) == []
+
+
+@pytest.mark.asyncio
+async def test_five_minute_timeline_uses_index(traced_db):
+    """Тест: 5-минутная шкала читает messages по индексу created_at_ts"""
+    db, statements = traced_db
+    await UserRepository(db).get_or_create(chat_id=1, username="user", first_name="User")
+    await MessageRepository(db).create(1, "user", "Hello")
+
+    await RealStatCollector(db).get_stats("day", "5m")
+
+    assert await find_message_scans(db, statements) == []
+    assert any("(created_at_ts - " in sql for sql in statements)
+
+
+@pytest.mark.asyncio
+async def test_retention_purge_uses_indexes(traced_db):
+    """Тест: окончательное удаление старых записей не сканирует messages"""
+    db, statements = traced_db
+    user_repo = UserRepository(db, cache_size=0)
+    message_repo = MessageRepository(db)
+    await user_repo.get_or_create(chat_id=1, username="user", first_name="User")
+    message_id = await message_repo.create(1, "user", "Hello")
+    await message_repo.create(1, "user", "Bye")
+    await db.execute(
+        "UPDATE messages SET deleted_at = '2000-01-01 00:00:00' WHERE id = ?", (message_id,)
+    )
+    await db.execute("UPDATE users SET deleted_at = '2000-01-01 00:00:00'")
+
+    result = await RetentionPurger(db, retention_days=1, pause_seconds=0).run()
+
+    assert (result.messages, result.users) == (1, 1)
+    assert await find_message_scans(db, statements) == []
+
+
+@pytest.mark.asyncio
+async def test_archive_uses_indexes(traced_db):
+    """Тест: перенос в архив и чтение истории из архива не сканируют messages"""
+    db, statements = traced_db
+    message_repo = MessageRepository(db)
+    await UserRepository(db).get_or_create(chat_id=1, username="user", first_name="User")
+    await db.execute(
+        "INSERT INTO messages (user_id, role, content, length, created_at)"
+        " VALUES (1, 'user', 'Old', 3, '2000-01-01 00:00:00')"
+    )
+    await message_repo.create(1, "user", "New")
+
+    assert await MessageArchiver(db, archive_after_days=1, pause_seconds=0).archive() == 1
+    assert len(await message_repo.get_recent(1, limit=10)) == 2
+    await message_repo.get_page(1, limit=10, after_id=0)
+    await message_repo.clear_history(1)
+
+    assert await find_message_scans(db, statements) == []
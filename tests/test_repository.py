@@ -1,90 +1,21 @@
 """Тесты для repository слоя"""
 
+import asyncio
+import sqlite3
+from contextlib import aclosing
+
 import pytest
 import pytest_asyncio
 
-from src.database import DatabaseManager, MessageRepository, UserRepository
-
-
-@pytest_asyncio.fixture
-async def db_manager():
-    """Фикстура для временной БД в памяти"""
-    manager = DatabaseManager(":memory:")
-    await manager.init()
-
-    # Применяем миграцию вручную для тестовой БД
-    await manager.execute(
-        """
-        CREATE TABLE users (
-            id INTEGER PRIMARY KEY,
-            username TEXT NULL,
-            first_name TEXT NOT NULL,
-            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            last_accessed TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            deleted_at TIMESTAMP NULL
-        )
-    """
-    )
-
-    await manager.execute(
-        """
-        CREATE TABLE messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            role TEXT NOT NULL,
-            content TEXT NOT NULL,
-            length INTEGER NOT NULL,
-            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-            deleted_at TIMESTAMP NULL,
-            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-        )
-    """
-    )
-
-    await manager.execute(
-        """
-        CREATE INDEX idx_messages_user_created
-        ON messages(user_id, created_at)
-    """
-    )
-
-    await manager.execute(
-        """
-        CREATE VIRTUAL TABLE messages_fts
-        USING fts5(content, content='messages', content_rowid='id')
-    """
-    )
-
-    await manager.execute(
-        """
-        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
-            INSERT INTO messages_fts(rowid, content)
-            VALUES (new.id, new.content);
-        END
-    """
-    )
-
-    await manager.execute(
-        """
-        CREATE TRIGGER messages_fts_update AFTER UPDATE ON messages BEGIN
-            UPDATE messages_fts
-            SET content = new.content
-            WHERE rowid = new.id;
-        END
-    """
-    )
-
-    await manager.execute(
-        """
-        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
-            DELETE FROM messages_fts WHERE rowid = old.id;
-        END
-    """
-    )
-
-    yield manager
-
-    await manager.close()
+from src.database import (
+    ConversationCache,
+    DatabaseManager,
+    FTSMaintenance,
+    MessageRepository,
+    UserRecord,
+    UserRepository,
+)
+from src.database.records import compress_content, decompress_content
 
 
 @pytest_asyncio.fixture
@@ -112,6 +43,226 @@ class TestDatabaseManager:
         await manager.close()
         assert manager._connection is None
 
+    @pytest.mark.asyncio
+    async def test_file_database_uses_reader_pool(self, tmp_path, monkeypatch):
+        """Тест пула read-only соединений для файловой БД"""
+        monkeypatch.setattr(DatabaseManager, "_instance", None)
+        manager = DatabaseManager(str(tmp_path / "pool.db"), read_pool_size=2)
+        await manager.init()
+        try:
+            assert len(manager._readers) == 2
+
+            await manager.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+            await manager.execute("INSERT INTO items (name) VALUES (?)", ("first",))
+
+            # Записи, закоммиченные writer'ом, видны читателям
+            rows = await manager.fetchall("SELECT * FROM items")
+            assert rows == [{"id": 1, "name": "first"}]
+
+            # Читатели работают в режиме read-only
+            async with manager._read_connection() as reader:
+                assert reader is not manager._connection
+                with pytest.raises(Exception, match="readonly"):
+                    await reader.execute("INSERT INTO items (name) VALUES ('x')")
+        finally:
+            await manager.close()
+
+        assert manager._readers == []
+
+    @pytest.mark.asyncio
+    async def test_reader_pool_on_existing_database(self, tmp_path, monkeypatch):
+        """Тест: читатели работают с уже существующей БД (переход в WAL при init)"""
+        db_path = tmp_path / "existing.db"
+        with sqlite3.connect(db_path) as connection:
+            connection.execute("CREATE TABLE items (id INTEGER PRIMARY KEY)")
+            connection.execute("INSERT INTO items DEFAULT VALUES")
+        connection.close()
+
+        monkeypatch.setattr(DatabaseManager, "_instance", None)
+        manager = DatabaseManager(str(db_path), read_pool_size=1)
+        await manager.init()
+        try:
+            assert await manager.fetchall("SELECT id FROM items") == [{"id": 1}]
+        finally:
+            await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_data_version(self, tmp_path, monkeypatch):
+        """Тест data_version: меняется после своих и чужих коммитов, но не после чтения"""
+        db_path = tmp_path / "version.db"
+        monkeypatch.setattr(DatabaseManager, "_instance", None)
+        manager = DatabaseManager(str(db_path), read_pool_size=1)
+        await manager.init()
+        try:
+            await manager.execute("CREATE TABLE items (id INTEGER PRIMARY KEY)")
+            version = await manager.data_version()
+
+            await manager.fetchall("SELECT id FROM items")
+            assert await manager.data_version() == version
+
+            await manager.execute("INSERT INTO items DEFAULT VALUES")
+            own_write = await manager.data_version()
+            assert own_write != version
+
+            # Коммит другого процесса (например, бота)
+            with sqlite3.connect(db_path) as connection:
+                connection.execute("INSERT INTO items DEFAULT VALUES")
+            connection.close()
+            assert await manager.data_version() != own_write
+        finally:
+            await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_group_commit_batches_concurrent_writes(self, monkeypatch):
+        """Тест group commit: конкурентные записи коммитятся одной транзакцией"""
+        monkeypatch.setattr(DatabaseManager, "_instance", None)
+        manager = DatabaseManager(":memory:", group_commit_interval=0.05, group_commit_max_batch=50)
+        await manager.init()
+        try:
+            await manager.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+
+            commits = 0
+            original_commit = manager._connection.commit
+
+            async def counting_commit():
+                nonlocal commits
+                commits += 1
+                await original_commit()
+
+            monkeypatch.setattr(manager._connection, "commit", counting_commit)
+
+            cursors = await asyncio.gather(
+                *(
+                    manager.execute("INSERT INTO items (name) VALUES (?)", (f"item {i}",))
+                    for i in range(20)
+                )
+            )
+
+            # lastrowid возвращается каждому вызывающему
+            assert sorted(cursor.lastrowid for cursor in cursors) == list(range(1, 21))
+            assert commits == 1
+
+            # Ошибка одного запроса не ломает остальные записи батча
+            results = await asyncio.gather(
+                manager.execute("INSERT INTO items (id, name) VALUES (1, 'duplicate')"),
+                manager.execute("INSERT INTO items (name) VALUES ('ok')"),
+                return_exceptions=True,
+            )
+            assert isinstance(results[0], Exception)
+            assert results[1].lastrowid == 21
+        finally:
+            await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_group_commit_fails_batch_rolled_back_by_sqlite(self, monkeypatch):
+        """Тест group commit: откат транзакции самим SQLite проваливает весь батч"""
+        monkeypatch.setattr(DatabaseManager, "_instance", None)
+        manager = DatabaseManager(":memory:", group_commit_interval=0.05, group_commit_max_batch=50)
+        await manager.init()
+        try:
+            await manager.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+            await manager.execute(
+                """
+                CREATE TRIGGER items_rollback BEFORE INSERT ON items
+                WHEN new.name = 'rollback' BEGIN
+                    SELECT RAISE(ROLLBACK, 'rolled back');
+                END
+                """
+            )
+
+            results = await asyncio.gather(
+                manager.execute("INSERT INTO items (name) VALUES ('before')"),
+                manager.execute("INSERT INTO items (name) VALUES ('rollback')"),
+                manager.execute("INSERT INTO items (name) VALUES ('after')"),
+                return_exceptions=True,
+            )
+
+            assert all(isinstance(result, sqlite3.IntegrityError) for result in results)
+            assert await manager.fetchall("SELECT name FROM items") == []
+            assert not manager._connection.in_transaction
+        finally:
+            await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_transaction_commits_once(self, db_manager, user_repo, message_repo):
+        """Тест транзакции: несколько вызовов repository в одном BEGIN/COMMIT"""
+        async with db_manager.transaction():
+            await user_repo.get_or_create(chat_id=1, username="user", first_name="User")
+            message_id = await message_repo.create(1, "user", "Hello")
+
+            # Внутри транзакции видны собственные незакоммиченные записи
+            assert await user_repo.get_by_id(1) is not None
+            assert db_manager._connection.in_transaction
+
+        assert not db_manager._connection.in_transaction
+        messages = await message_repo.get_recent(1, limit=10)
+        assert [msg["id"] for msg in messages] == [message_id]
+
+    @pytest.mark.asyncio
+    async def test_transaction_rollback_on_error(self, db_manager, user_repo, message_repo):
+        """Тест отката транзакции при исключении"""
+        with pytest.raises(ValueError):
+            async with db_manager.transaction():
+                await user_repo.get_or_create(chat_id=1, username="user", first_name="User")
+                await message_repo.create(1, "user", "Hello")
+                raise ValueError("LLM failed")
+
+        assert await user_repo.get_by_id(1) is None
+        assert await db_manager.fetchone("SELECT * FROM messages") is None
+
+    @pytest.mark.asyncio
+    async def test_nested_transaction_joins_outer(self, db_manager, user_repo):
+        """Тест вложенной транзакции: откат внешней отменяет и вложенную"""
+        with pytest.raises(ValueError):
+            async with db_manager.transaction():
+                async with db_manager.transaction():
+                    await user_repo.get_or_create(chat_id=1, username="user", first_name="User")
+                raise ValueError("outer failed")
+
+        assert await user_repo.get_by_id(1) is None
+
+    @pytest.mark.asyncio
+    async def test_iterate_streams_rows(self, db_manager):
+        """Тест потокового чтения строк пачками"""
+        for i in range(1, 6):
+            await db_manager.execute(
+                "INSERT INTO users (id, username, first_name) VALUES (?, ?, ?)",
+                (i, f"user{i}", f"User {i}"),
+            )
+
+        query = "SELECT id FROM users ORDER BY id"
+        rows = [row async for row in db_manager.iterate(query, batch_size=2)]
+        assert rows == [{"id": i} for i in range(1, 6)]
+
+        tuples = [
+            row
+            async for row in db_manager.iterate(
+                "SELECT id, username FROM users WHERE id > ? ORDER BY id", (3,), as_dict=False
+            )
+        ]
+        assert tuples == [(4, "user4"), (5, "user5")]
+
+    @pytest.mark.asyncio
+    async def test_iterate_returns_reader_on_early_exit(self, tmp_path, monkeypatch):
+        """Тест: при досрочном выходе соединение возвращается в пул"""
+        monkeypatch.setattr(DatabaseManager, "_instance", None)
+        manager = DatabaseManager(str(tmp_path / "iterate.db"), read_pool_size=1)
+        await manager.init()
+        try:
+            await manager.execute("CREATE TABLE items (id INTEGER PRIMARY KEY)")
+            for _ in range(10):
+                await manager.execute("INSERT INTO items DEFAULT VALUES")
+
+            async with aclosing(manager.iterate("SELECT id FROM items", batch_size=3)) as rows:
+                async for row in rows:
+                    if row["id"] == 2:
+                        break
+
+            assert manager._reader_pool.qsize() == 1
+            assert await manager.fetchone("SELECT COUNT(*) AS count FROM items") == {"count": 10}
+        finally:
+            await manager.close()
+
     @pytest.mark.asyncio
     async def test_execute(self, db_manager):
         """Тест выполнения SQL запроса"""
@@ -151,6 +302,28 @@ class TestDatabaseManager:
         assert users[0]["id"] == 1
         assert users[1]["id"] == 2
 
+    @pytest.mark.asyncio
+    async def test_fetch_with_row_factory(self, db_manager):
+        """Тест построения типизированных записей прямо из строк курсора"""
+        await db_manager.execute(
+            "INSERT INTO users (id, username, first_name) VALUES (?, ?, ?)",
+            (1, "user1", "User One"),
+        )
+
+        query = f"SELECT {UserRecord.COLUMNS} FROM users WHERE id = ?"
+        user = await db_manager.fetchone(query, (1,), row_factory=UserRecord.from_row)
+        users = await db_manager.fetchall(query, (1,), row_factory=UserRecord.from_row)
+
+        assert isinstance(user, UserRecord)
+        assert users == [user]
+        assert user.first_name == "User One"
+        # Совместимость с прежним dict-представлением
+        assert user["username"] == "user1"
+        assert user.get("missing", "default") == "default"
+        assert user.to_dict() == dict(await db_manager.fetchone(query, (1,)))
+        with pytest.raises(KeyError):
+            user["missing"]
+
 
 class TestUserRepository:
     """Тесты для UserRepository"""
@@ -183,6 +356,104 @@ class TestUserRepository:
         assert user1["id"] == user2["id"]
         assert user1["created_at"] == user2["created_at"]
 
+    @pytest.mark.asyncio
+    async def test_get_or_create_cached_user_skips_db(self, user_repo, db_manager, mocker):
+        """Тест кэша: повторный пользователь не обращается к БД"""
+        await user_repo.get_or_create(chat_id=123, username="test_user", first_name="Test User")
+
+        execute_returning = mocker.spy(db_manager, "execute_returning")
+        execute = mocker.spy(db_manager, "execute")
+        fetchone = mocker.spy(db_manager, "fetchone")
+
+        user = await user_repo.get_or_create(
+            chat_id=123, username="test_user", first_name="Test User"
+        )
+
+        assert user["id"] == 123
+        assert execute_returning.call_count == 0
+        assert execute.call_count == 0
+        assert fetchone.call_count == 0
+
+    @pytest.mark.asyncio
+    async def test_last_accessed_flushed_in_batch(self, db_manager, mocker):
+        """Тест отложенной пакетной записи last_accessed"""
+        repo = UserRepository(db_manager, last_accessed_flush_interval=3600)
+        for chat_id in (1, 2, 3):
+            await repo.get_or_create(chat_id=chat_id, username=None, first_name="User")
+        await db_manager.execute("UPDATE users SET last_accessed = '2000-01-01 00:00:00'")
+
+        execute = mocker.spy(db_manager, "execute")
+        for chat_id in (1, 2, 3, 1, 2):
+            await repo.get_or_create(chat_id=chat_id, username=None, first_name="User")
+        assert execute.call_count == 0
+
+        await repo.flush_last_accessed()
+        assert execute.call_count == 1
+        rows = await db_manager.fetchall(
+            "SELECT id FROM users WHERE last_accessed > '2000-01-01 00:00:00'"
+        )
+        assert len(rows) == 3
+
+    @pytest.mark.asyncio
+    async def test_last_accessed_kept_after_failed_flush(self, db_manager, mocker):
+        """Тест: после ошибки записи или отката транзакции пользователи остаются в очереди"""
+        repo = UserRepository(db_manager, last_accessed_flush_interval=3600)
+        for _ in range(2):
+            await repo.get_or_create(chat_id=1, username=None, first_name="User")
+        assert repo._pending_last_accessed == {1}
+
+        execute = mocker.patch.object(
+            db_manager, "execute", side_effect=sqlite3.OperationalError("disk I/O error")
+        )
+        with pytest.raises(sqlite3.OperationalError):
+            await repo.flush_last_accessed()
+        mocker.stop(execute)
+        assert repo._pending_last_accessed == {1}
+
+        with pytest.raises(ValueError):
+            async with db_manager.transaction():
+                await repo.flush_last_accessed()
+                raise ValueError("rollback")
+        assert repo._pending_last_accessed == {1}
+
+        await repo.flush_last_accessed()
+        assert repo._pending_last_accessed == set()
+
+    @pytest.mark.asyncio
+    async def test_last_accessed_flusher_runs_until_cancelled(self, user_repo, mocker):
+        """Тест: фоновая задача пишет last_accessed по таймеру, ошибки не останавливают ее"""
+        flush = mocker.patch.object(
+            user_repo, "flush_last_accessed", side_effect=[sqlite3.OperationalError("busy"), None]
+        )
+
+        task = asyncio.create_task(user_repo.run_last_accessed_flusher(0.01))
+        while flush.call_count < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    @pytest.mark.asyncio
+    async def test_user_not_cached_after_rollback(self, db_manager, user_repo):
+        """Тест: пользователь из откаченной транзакции не попадает в кэш"""
+        with pytest.raises(ValueError):
+            async with db_manager.transaction():
+                await user_repo.get_or_create(chat_id=1, username=None, first_name="User")
+                raise ValueError("rollback")
+
+        assert user_repo._cache == {}
+        user = await user_repo.get_or_create(chat_id=1, username=None, first_name="User")
+        assert await user_repo.get_by_id(1) == user
+
+    @pytest.mark.asyncio
+    async def test_get_or_create_soft_deleted_user(self, user_repo):
+        """Тест: soft deleted пользователь не восстанавливается через get_or_create"""
+        await user_repo.get_or_create(chat_id=123, username="test_user", first_name="Test User")
+        await user_repo.soft_delete(123)
+
+        with pytest.raises(RuntimeError):
+            await user_repo.get_or_create(chat_id=123, username="test_user", first_name="Test")
+
     @pytest.mark.asyncio
     async def test_get_by_id(self, user_repo):
         """Тест получения пользователя по ID"""
@@ -252,6 +523,64 @@ class TestMessageRepository:
         assert messages[0]["content"] == "Response 2"
         assert messages[1]["content"] == "Message 2"
 
+    @pytest.mark.asyncio
+    async def test_get_page_keyset_pagination(self, message_repo):
+        """Тест постраничного чтения истории по курсорам"""
+        ids = [await message_repo.create(123, "user", f"Message {i}") for i in range(5)]
+
+        # Первая страница - самые новые сообщения, от старых к новым
+        page, cursor = await message_repo.get_page(123, limit=2)
+        assert [msg["id"] for msg in page] == ids[3:5]
+        assert cursor == ids[3]
+
+        page, cursor = await message_repo.get_page(123, limit=2, before_id=cursor)
+        assert [msg["id"] for msg in page] == ids[1:3]
+
+        page, cursor = await message_repo.get_page(123, limit=2, before_id=cursor)
+        assert [msg["id"] for msg in page] == ids[0:1]
+        assert cursor is None
+
+        # Листание вперед
+        page, cursor = await message_repo.get_page(123, limit=3, after_id=ids[0])
+        assert [msg["id"] for msg in page] == ids[1:4]
+        assert cursor == ids[3]
+
+        with pytest.raises(ValueError):
+            await message_repo.get_page(123, limit=2, before_id=ids[4], after_id=ids[0])
+
+    @pytest.mark.asyncio
+    async def test_create_many(self, message_repo, db_manager, mocker):
+        """Тест массовой вставки сообщений одним коммитом"""
+        first_id = await message_repo.create(123, "user", "Before")
+        commit = mocker.spy(db_manager._connection, "commit")
+
+        ids = await message_repo.create_many([(123, "user", f"Imported {i}") for i in range(5)])
+
+        assert commit.call_count == 1
+        assert ids == list(range(first_id + 1, first_id + 6))
+        rows = await db_manager.fetchall(
+            "SELECT id, content, length FROM messages WHERE id > ? ORDER BY id", (first_id,)
+        )
+        assert [(row["id"], row["content"]) for row in rows] == [
+            (message_id, f"Imported {i}") for i, message_id in enumerate(ids)
+        ]
+        assert all(row["length"] == len(row["content"]) for row in rows)
+        assert await message_repo.create_many([]) == []
+
+    @pytest.mark.asyncio
+    async def test_soft_delete_many_in_chunks(self, message_repo, db_manager, mocker):
+        """Тест массового soft delete порциями"""
+        ids = await message_repo.create_many([(123, "user", f"Message {i}") for i in range(5)])
+        execute_returning = mocker.spy(db_manager, "execute_returning")
+
+        # Уже удаленное сообщение повторно не считается
+        deleted = await message_repo.soft_delete_many([*ids[:4], ids[0]], chunk_size=2)
+
+        assert deleted == 4
+        assert execute_returning.call_count == 3
+        messages = await message_repo.get_recent(123, limit=10)
+        assert [msg.id for msg in messages] == [ids[4]]
+
     @pytest.mark.asyncio
     async def test_soft_delete(self, message_repo, db_manager):
         """Тест soft delete сообщения"""
@@ -268,17 +597,66 @@ class TestMessageRepository:
         assert len(messages) == 0
 
     @pytest.mark.asyncio
-    async def test_soft_delete_all_for_user(self, message_repo):
-        """Тест soft delete всех сообщений пользователя"""
-        await message_repo.create(123, "user", "Message 1")
-        await message_repo.create(123, "assistant", "Response 1")
-        await message_repo.create(123, "user", "Message 2")
+    async def test_epoch_columns_match_text_timestamps(self, message_repo, db_manager):
+        """Тест: created_at_ts/deleted_at_ts совпадают с текстовыми датами"""
+        message_id = await message_repo.create(123, "user", "Message")
+        ids = await message_repo.create_many([(123, "user", "Imported")])
+        await message_repo.soft_delete(message_id)
+        await message_repo.soft_delete_many(ids)
+
+        rows = await db_manager.fetchall(
+            """
+            SELECT created_at_ts, deleted_at_ts,
+                   CAST(strftime('%s', created_at) AS INTEGER) AS created_epoch,
+                   CAST(strftime('%s', deleted_at) AS INTEGER) AS deleted_epoch
+            FROM messages
+            """
+        )
+        assert len(rows) == 2
+        for row in rows:
+            assert row["created_at_ts"] == row["created_epoch"]
+            assert row["deleted_at_ts"] == row["deleted_epoch"]
 
-        await message_repo.soft_delete_all_for_user(123)
+    @pytest.mark.asyncio
+    async def test_clear_history_hides_messages(self, message_repo, user_repo):
+        """Тест /clear: сообщения скрываются сдвигом маркера, новые видны"""
+        await user_repo.get_or_create(chat_id=123, username="user", first_name="User")
+        await message_repo.create(123, "user", "Old pizza")
+        await message_repo.create(123, "assistant", "Old answer")
+
+        assert await message_repo.clear_history(123) is True
+        assert await message_repo.get_recent(123, limit=10) == []
+        assert await message_repo.clear_history(123) is False
+
+        new_id = await message_repo.create(123, "user", "New pizza")
+        assert [m.id for m in await message_repo.get_recent(123, limit=10)] == [new_id]
+        page, _ = await message_repo.get_page(123, limit=10)
+        assert [m.id for m in page] == [new_id]
+        page, _ = await message_repo.get_page(123, limit=10, after_id=0)
+        assert [m.id for m in page] == [new_id]
+        hits, _ = await message_repo.search("pizza", limit=10)
+        assert [hit.id for hit in hits] == [new_id]
 
-        # Все сообщения должны быть удалены
-        messages = await message_repo.get_recent(123, limit=10)
-        assert len(messages) == 0
+    @pytest.mark.asyncio
+    async def test_sweep_cleared_soft_deletes_in_batches(
+        self, message_repo, user_repo, db_manager, monkeypatch
+    ):
+        """Тест фонового удаления сообщений, скрытых /clear"""
+        monkeypatch.setattr(MessageRepository, "SWEEP_BATCH_SIZE", 2)
+        await user_repo.get_or_create(chat_id=123, username="user", first_name="User")
+        cleared = [await message_repo.create(123, "user", f"Message {i}") for i in range(5)]
+        await message_repo.clear_history(123)
+        kept = await message_repo.create(123, "user", "After clear")
+
+        assert await message_repo.sweep_cleared() == 5
+        assert await message_repo.sweep_cleared() == 0
+
+        rows = await db_manager.fetchall("SELECT id FROM messages WHERE deleted_at IS NULL")
+        assert [row["id"] for row in rows] == [kept]
+        user = await db_manager.fetchone("SELECT cleared_before_id, cleared_swept FROM users")
+        assert user is not None
+        assert user["cleared_before_id"] == cleared[-1] + 1
+        assert user["cleared_swept"] == 1
 
     @pytest.mark.asyncio
     async def test_search_fts(self, message_repo):
@@ -292,3 +670,167 @@ class TestMessageRepository:
 
         assert len(results) == 2
         assert any("pizza" in msg["content"].lower() for msg in results)
+
+    @pytest.mark.asyncio
+    async def test_search_ranked_with_snippets(self, message_repo, user_repo):
+        """Тест поиска: релевантность bm25, сниппеты и фильтр по пользователю"""
+        await user_repo.get_or_create(chat_id=456, username="other", first_name="Other")
+        weak = await message_repo.create(123, "user", "I like pizza and a long list of other foods")
+        strong = await message_repo.create(123, "user", "pizza pizza")
+        other = await message_repo.create(456, "user", "pizza")
+        deleted = await message_repo.create(123, "user", "pizza")
+        await message_repo.soft_delete(deleted)
+
+        hits, cursor = await message_repo.search("PIZZA", limit=10)
+        assert [hit.id for hit in hits] == [strong, other, weak]
+        assert hits[0].snippet == "<mark>pizza</mark> <mark>pizza</mark>"
+        assert cursor is None
+
+        hits, _ = await message_repo.search("pizza foods", limit=10, user_id=123)
+        assert [hit.id for hit in hits] == [weak]
+
+    @pytest.mark.asyncio
+    async def test_search_keyset_pagination(self, message_repo):
+        """Тест постраничного поиска по курсору (rank, id)"""
+        ids = await message_repo.create_many([(123, "user", "same pizza") for _ in range(5)])
+
+        found = []
+        cursor = None
+        while True:
+            hits, cursor = await message_repo.search("pizza", limit=2, cursor=cursor)
+            found.extend(hit.id for hit in hits)
+            if cursor is None:
+                break
+
+        assert found == ids
+        with pytest.raises(ValueError):
+            await message_repo.search("pizza", limit=2, cursor="bad")
+
+    @pytest.mark.asyncio
+    async def test_search_input_is_not_fts_syntax(self, message_repo, mocker):
+        """Тест: спецсимволы FTS5 в запросе не ломают поиск, лимит ограничен"""
+        await message_repo.create(123, "user", 'say "hi" (NEAR) to content:x')
+
+        hits, _ = await message_repo.search('"hi" NEAR( content:x', limit=10)
+        assert len(hits) == 1
+        assert await message_repo.search("   ", limit=10) == ([], None)
+
+        fetchall = mocker.spy(message_repo.db, "fetchall")
+        await message_repo.search("hi", limit=10_000)
+        assert fetchall.call_args_list[0].args[1][-1] == message_repo.MAX_SEARCH_RESULTS + 1
+
+    @pytest.mark.asyncio
+    async def test_compressed_content(self, db_manager):
+        """Тест: длинный текст хранится сжатым, читается и ищется как обычный"""
+        repo = MessageRepository(db_manager, compression_threshold=100)
+        long_text = "Pizza with extra cheese. " * 20
+        long_id = await repo.create(123, "assistant", long_text)
+        short_id = await repo.create(123, "user", "Short pizza")
+        many_ids = await repo.create_many([(123, "assistant", long_text)])
+
+        rows = await db_manager.fetchall(
+            "SELECT id, content, content_z IS NOT NULL AS compressed, length FROM messages"
+        )
+        assert [(r["id"], r["compressed"], r["length"]) for r in rows] == [
+            (long_id, 1, len(long_text)),
+            (short_id, 0, 11),
+            (many_ids[0], 1, len(long_text)),
+        ]
+        assert rows[0]["content"] == ""
+
+        recent = await repo.get_recent(123, limit=10)
+        assert [m.content for m in recent] == [long_text, "Short pizza", long_text]
+        assert {m.id for m in await repo.search_fts("cheese")} == {long_id, many_ids[0]}
+        hits, _ = await repo.search("cheese", limit=10, user_id=123)
+        assert "<mark>cheese</mark>" in hits[0].snippet
+
+        # Удаление сжатого сообщения убирает его из индекса по исходному тексту
+        await repo.soft_delete(long_id)
+        assert [m.id for m in await repo.search_fts("cheese")] == many_ids
+        assert await FTSMaintenance(db_manager).apply_queue() == 1
+        indexed = await db_manager.fetchall(
+            "SELECT rowid FROM messages_fts WHERE messages_fts MATCH 'cheese'"
+        )
+        assert [row["rowid"] for row in indexed] == many_ids
+        await db_manager.execute(
+            "INSERT INTO messages_fts(messages_fts, rank) VALUES ('integrity-check', 0)"
+        )
+
+    def test_compress_content_only_when_smaller(self):
+        """Тест: текст сжимается только начиная с порога"""
+        assert compress_content("a" * 200, 0) == ("a" * 200, None)
+        assert compress_content("a" * 50, 100) == ("a" * 50, None)
+        stored, compressed = compress_content("a" * 200, 100)
+        assert stored == "" and compressed is not None
+        assert decompress_content(stored, compressed) == "a" * 200
+        assert decompress_content("plain", None) == "plain"
+
+
+class TestMessageRepositoryContextCache:
+    """Тесты MessageRepository с кэшем контекста"""
+
+    @pytest_asyncio.fixture(autouse=True)
+    async def setup_user(self, user_repo):
+        """Создаем тестового пользователя перед каждым тестом"""
+        await user_repo.get_or_create(chat_id=123, username="test_user", first_name="Test User")
+
+    @pytest.fixture
+    def cached_repo(self, db_manager):
+        """MessageRepository с кэшем на 3 сообщения"""
+        return MessageRepository(db_manager, ConversationCache(capacity=3, max_bytes=10_000))
+
+    @pytest.mark.asyncio
+    async def test_get_recent_served_from_cache(self, cached_repo, db_manager, mocker):
+        """Тест: после первого чтения контекст берется из памяти"""
+        await cached_repo.create(123, "user", "Message 1")
+        await cached_repo.get_recent(123, limit=3)
+
+        await cached_repo.create(123, "assistant", "Response 1")
+        fetchall = mocker.spy(db_manager, "fetchall")
+
+        messages = await cached_repo.get_recent(123, limit=3)
+
+        assert fetchall.call_count == 0
+        assert [msg["content"] for msg in messages] == ["Response 1", "Message 1"]
+        assert messages == await MessageRepository(db_manager).get_recent(123, limit=3)
+
+    @pytest.mark.asyncio
+    async def test_soft_delete_invalidates_cache(self, cached_repo, user_repo):
+        """Тест: soft delete и /clear сбрасывают кэш пользователя"""
+        await user_repo.get_or_create(chat_id=123, username="user", first_name="User")
+        message_id = await cached_repo.create(123, "user", "Message 1")
+        await cached_repo.create(123, "user", "Message 2")
+        await cached_repo.get_recent(123, limit=3)
+
+        await cached_repo.soft_delete(message_id)
+        messages = await cached_repo.get_recent(123, limit=3)
+        assert [msg["content"] for msg in messages] == ["Message 2"]
+
+        await cached_repo.clear_history(123)
+        assert await cached_repo.get_recent(123, limit=3) == []
+
+    @pytest.mark.asyncio
+    async def test_bulk_operations_invalidate_cache(self, cached_repo):
+        """Тест: массовые вставка и удаление сбрасывают кэш пользователя"""
+        await cached_repo.create(123, "user", "Message 1")
+        await cached_repo.get_recent(123, limit=3)
+
+        ids = await cached_repo.create_many([(123, "user", "Message 2")])
+        messages = await cached_repo.get_recent(123, limit=3)
+        assert [msg.content for msg in messages] == ["Message 2", "Message 1"]
+
+        await cached_repo.soft_delete_many(ids)
+        messages = await cached_repo.get_recent(123, limit=3)
+        assert [msg.content for msg in messages] == ["Message 1"]
+
+    @pytest.mark.asyncio
+    async def test_rolled_back_message_not_cached(self, cached_repo, db_manager):
+        """Тест: сообщение из откаченной транзакции не попадает в кэш"""
+        await cached_repo.get_recent(123, limit=3)
+
+        with pytest.raises(ValueError):
+            async with db_manager.transaction():
+                await cached_repo.create(123, "user", "Lost message")
+                raise ValueError("rollback")
+
+        assert await cached_repo.get_recent(123, limit=3) == []
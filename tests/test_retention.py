@@ -0,0 +1,123 @@
+"""Тесты окончательного удаления старых soft deleted записей и incremental vacuum"""
+
+import pytest
+import pytest_asyncio
+
+from src import maintenance
+from src.database import DatabaseManager, MessageRepository, RetentionPurger
+
+OLD = "2000-01-01 00:00:00"
+
+
+@pytest_asyncio.fixture
+async def db_manager(db_manager):
+    """Общая мигрированная БД с двумя пользователями"""
+    await db_manager.execute(
+        "INSERT INTO users (id, first_name) VALUES (1, 'First'), (2, 'Second')"
+    )
+    return db_manager
+
+
+async def active_ids(db: DatabaseManager) -> list[int]:
+    """ID всех сообщений, оставшихся в таблице"""
+    rows = await db.fetchall("SELECT id FROM messages ORDER BY id")
+    return [row["id"] for row in rows]
+
+
+@pytest.mark.asyncio
+async def test_purger_validates_parameters(db_manager):
+    """Срок хранения и размер пакета должны быть положительными"""
+    with pytest.raises(ValueError, match="retention_days"):
+        RetentionPurger(db_manager, retention_days=0)
+    with pytest.raises(ValueError, match="batch_size"):
+        RetentionPurger(db_manager, retention_days=1, batch_size=0)
+
+
+@pytest.mark.asyncio
+async def test_purge_messages_deletes_only_expired(db_manager):
+    """Удаляются только сообщения, удаленные раньше срока хранения"""
+    repo = MessageRepository(db_manager)
+    ids = [await repo.create(1, "user", f"Message {i}") for i in range(7)]
+    expired = ids[:2] + ids[3:6]
+    await repo.soft_delete_many(expired + [ids[2]])
+    await db_manager.executemany(
+        "UPDATE messages SET deleted_at = ? WHERE id = ?", [(OLD, i) for i in expired]
+    )
+
+    purger = RetentionPurger(db_manager, retention_days=30, batch_size=2, pause_seconds=0)
+    assert await purger.purge_messages() == 5
+    assert await purger.purge_messages() == 0
+
+    # Недавно удаленное и активное сообщения остаются
+    assert await active_ids(db_manager) == [ids[2], ids[6]]
+
+
+@pytest.mark.asyncio
+async def test_purge_messages_skips_gaps_between_expired_ids(db_manager, mocker):
+    """Пустые промежутки id не обходятся окнами: одно удаление на каждое окно с сообщениями"""
+    repo = MessageRepository(db_manager)
+    ids = [await repo.create(1, "user", f"Message {i}") for i in range(3)]
+    await db_manager.execute("UPDATE messages SET id = 1000000 WHERE id = ?", (ids[2],))
+    await db_manager.execute("UPDATE messages SET deleted_at = ?", (OLD,))
+    execute = mocker.spy(db_manager, "execute")
+
+    purger = RetentionPurger(db_manager, retention_days=30, batch_size=2, pause_seconds=0)
+    assert await purger.purge_messages() == 3
+    assert execute.call_count == 2
+    assert await active_ids(db_manager) == []
+
+
+@pytest.mark.asyncio
+async def test_purge_users_deletes_messages_first(db_manager):
+    """Пользователь, удаленный раньше срока, удаляется вместе со всеми сообщениями"""
+    repo = MessageRepository(db_manager)
+    for i in range(5):
+        await repo.create(1, "user", f"pizza {i}")
+    kept = await repo.create(2, "user", "pizza")
+    await db_manager.execute("UPDATE users SET deleted_at = ? WHERE id = 1", (OLD,))
+    await db_manager.execute("UPDATE users SET deleted_at = CURRENT_TIMESTAMP WHERE id = 2")
+
+    purger = RetentionPurger(db_manager, retention_days=30, batch_size=2, pause_seconds=0)
+    assert await purger.purge_users() == 1
+
+    users = await db_manager.fetchall("SELECT id FROM users")
+    assert [row["id"] for row in users] == [2]
+    assert await active_ids(db_manager) == [kept]
+    hits, _ = await repo.search("pizza", limit=10)
+    assert [hit.id for hit in hits] == [kept]
+
+
+@pytest.mark.asyncio
+async def test_run_releases_free_pages(db_manager):
+    """После удаления incremental vacuum возвращает свободные страницы"""
+    row = await db_manager.fetchone("PRAGMA auto_vacuum")
+    assert row is not None and row["auto_vacuum"] == 2  # INCREMENTAL
+
+    repo = MessageRepository(db_manager)
+    ids = await repo.create_many([(1, "user", "x" * 4000) for _ in range(50)])
+    await repo.soft_delete_many(ids)
+    await db_manager.execute("UPDATE messages SET deleted_at = ?", (OLD,))
+
+    result = await RetentionPurger(db_manager, retention_days=30, pause_seconds=0).run()
+
+    assert result.messages == 50
+    assert result.vacuumed_pages > 0
+    row = await db_manager.fetchone("PRAGMA freelist_count")
+    assert row is not None and row["freelist_count"] == 0
+
+
+def test_purge_command(migrated_db_path, tmp_path, monkeypatch, capsys):
+    """CLI purge удаляет записи старше --days"""
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+    # setup_logger() пишет logs/bot.log в текущий каталог
+    monkeypatch.chdir(tmp_path)
+
+    maintenance.main(["--database", migrated_db_path, "purge", "--days", "7"])
+
+    assert "Purged 0 messages, 0 users" in capsys.readouterr().out
+
+
+def test_purge_command_rejects_zero_days(migrated_db_path):
+    """CLI purge не принимает нулевой срок хранения"""
+    with pytest.raises(SystemExit):
+        maintenance.parse_args(["--database", migrated_db_path, "purge", "--days", "0"])
@@ -0,0 +1,278 @@
+"""Тесты пакетной перестройки таблиц для миграций Alembic"""
+
+import sqlite3
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import pool
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from migrations.table_rebuild import PROGRESS_TABLE, rebuild_table, shadow_table_name
+from src.database import DatabaseManager, MessageRepository
+
+pytest.importorskip("greenlet", reason="migrations run on the SQLAlchemy asyncio engine")
+
+# Таблица notes без столбца obsolete
+NOTES_SQL = """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        text TEXT NOT NULL
+    )
+"""
+NOTES_INDEX = "CREATE INDEX idx_notes_user_id ON {table}(user_id)"
+
+
+@pytest.fixture
+def db_path(tmp_path) -> str:
+    """БД с пользователем, 10 заметками, индексом и представлением над notes"""
+    path = str(tmp_path / "rebuild.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE users (id INTEGER PRIMARY KEY);
+        CREATE TABLE notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            text TEXT NOT NULL,
+            obsolete TEXT NULL
+        );
+        CREATE INDEX idx_notes_user_id ON notes(user_id);
+        CREATE VIEW notes_text AS SELECT id, text FROM notes;
+        INSERT INTO users (id) VALUES (1);
+        """
+    )
+    conn.executemany(
+        "INSERT INTO notes (user_id, text, obsolete) VALUES (1, ?, 'x')",
+        [(f"Note {i}",) for i in range(1, 11)],
+    )
+    # Удаленный хвост: AUTOINCREMENT не должен выдать id 10 повторно
+    conn.execute("DELETE FROM notes WHERE id = 10")
+    conn.commit()
+    conn.close()
+    return path
+
+
+async def run_migration(db_path: str, migration: Callable[[], Any]) -> Any:
+    """Выполнить функцию миграции так же, как alembic/env.py (aiosqlite, одна транзакция)"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=pool.NullPool)
+
+    def run(connection) -> Any:  # type: ignore[no-untyped-def]
+        migration_context = MigrationContext.configure(connection)
+        with Operations.context(migration_context), migration_context.begin_transaction():
+            return migration()
+
+    try:
+        async with engine.connect() as connection:
+            return await connection.run_sync(run)
+    finally:
+        await engine.dispose()
+
+
+def rebuild_notes(**kwargs: Any) -> Callable[[], int]:
+    """Миграция, удаляющая столбец notes.obsolete"""
+    return lambda: rebuild_table(
+        "notes",
+        NOTES_SQL,
+        columns=["id", "user_id", "text"],
+        after_swap=[NOTES_INDEX],
+        pause_seconds=0,
+        **kwargs,
+    )
+
+
+def fetch(db_path: str, sql: str) -> list[tuple]:
+    """Результат запроса через отдельное соединение"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def schema_names(db_path: str) -> set[str]:
+    """Имена всех объектов схемы"""
+    return {name for (name,) in fetch(db_path, "SELECT name FROM sqlite_master")}
+
+
+@pytest.mark.asyncio
+async def test_rebuild_copies_rows_in_batches(db_path):
+    """Строки копируются пакетами по id, схема и индексы заменяются"""
+    reports = []
+    copied = await run_migration(
+        db_path, rebuild_notes(batch_size=4, progress=lambda *args: reports.append(args))
+    )
+
+    assert copied == 9
+    assert reports == [(4, 9), (8, 9), (9, 9)]
+    columns = [row[1] for row in fetch(db_path, "PRAGMA table_info(notes)")]
+    assert columns == ["id", "user_id", "text"]
+    assert fetch(db_path, "SELECT id, text FROM notes_text ORDER BY id") == [
+        (i, f"Note {i}") for i in range(1, 10)
+    ]
+
+    names = schema_names(db_path)
+    assert "idx_notes_user_id" in names
+    assert shadow_table_name("notes") not in names
+    assert PROGRESS_TABLE not in names
+    assert not [name for name in names if "__rebuild" in name]
+    assert fetch(db_path, "SELECT seq FROM sqlite_sequence WHERE name = 'notes'") == [(10,)]
+    assert fetch(db_path, "PRAGMA foreign_key_check") == []
+
+
+@pytest.mark.asyncio
+async def test_rebuild_mirrors_concurrent_changes(db_path):
+    """Изменения строк во время копирования попадают в новую таблицу"""
+
+    def write_between_batches(copied: int, total: int) -> None:
+        # Отдельное соединение, как у бота: пишет между пакетами миграции
+        if copied != 4:
+            return
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE notes SET text = 'Edited' WHERE id = 2")
+        conn.execute("DELETE FROM notes WHERE id IN (3, 7)")
+        conn.execute("UPDATE notes SET text = 'Edited later' WHERE id = 8")
+        conn.execute("INSERT INTO notes (user_id, text) VALUES (1, 'New')")
+        conn.commit()
+        conn.close()
+
+    await run_migration(db_path, rebuild_notes(batch_size=4, progress=write_between_batches))
+
+    assert fetch(db_path, "SELECT id, text FROM notes ORDER BY id") == [
+        (1, "Note 1"),
+        (2, "Edited"),
+        (4, "Note 4"),
+        (5, "Note 5"),
+        (6, "Note 6"),
+        (8, "Edited later"),
+        (9, "Note 9"),
+        (11, "New"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rebuild_resumes_after_interruption(db_path):
+    """Прерванная перестройка продолжается с последнего пакета"""
+
+    def interrupt(copied: int, total: int) -> None:
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        await run_migration(db_path, rebuild_notes(batch_size=4, progress=interrupt))
+
+    # Первый пакет зафиксирован, старая таблица работает дальше
+    assert fetch(db_path, f"SELECT table_name, last_id FROM {PROGRESS_TABLE}") == [("notes", 4)]
+    assert fetch(db_path, f"SELECT COUNT(*) FROM {shadow_table_name('notes')}") == [(4,)]
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE notes SET text = 'Edited' WHERE id = 1")
+    conn.commit()
+    conn.close()
+
+    reports = []
+    await run_migration(
+        db_path, rebuild_notes(batch_size=4, progress=lambda *args: reports.append(args))
+    )
+
+    assert reports == [(8, 9), (9, 9)]
+    rows = fetch(db_path, "SELECT id, text FROM notes ORDER BY id")
+    assert rows == [(1, "Edited")] + [(i, f"Note {i}") for i in range(2, 10)]
+    assert PROGRESS_TABLE not in schema_names(db_path)
+
+
+@pytest.mark.asyncio
+async def test_rebuild_transforms_columns(db_path):
+    """select задает выражения для столбцов новой таблицы"""
+    await run_migration(
+        db_path,
+        rebuild_notes(select=["id", "user_id", "upper(text) || '/' || obsolete"]),
+    )
+
+    assert fetch(db_path, "SELECT text FROM notes WHERE id = 1") == [("NOTE 1/x",)]
+
+
+@pytest.mark.asyncio
+async def test_rebuild_refuses_unknown_shadow_table(db_path):
+    """Чужая таблица с именем теневой не перезаписывается"""
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"CREATE TABLE {shadow_table_name('notes')} (id INTEGER PRIMARY KEY)")
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(RuntimeError, match="no rebuild"):
+        await run_migration(db_path, rebuild_notes())
+    assert fetch(db_path, "SELECT COUNT(*) FROM notes") == [(9,)]
+
+
+@pytest.mark.asyncio
+async def test_rebuild_messages_keeps_search_and_triggers(migrated_db_path, monkeypatch):
+    """Перестройка messages сохраняет сжатые сообщения, FTS и триггеры статистики"""
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+    manager = DatabaseManager(migrated_db_path, read_pool_size=1)
+    await manager.init()
+    await manager.execute("INSERT INTO users (id, first_name) VALUES (1, 'First')")
+    repo = MessageRepository(manager, compression_threshold=20)
+    ids = [await repo.create(1, "user", f"Message {i} " + "long " * i) for i in range(5)]
+    await repo.soft_delete_many([ids[0]])
+    await manager.close()
+    stats_sql = "SELECT SUM(message_count) FROM message_stats_hourly"
+    [(counted,)] = fetch(migrated_db_path, stats_sql)
+
+    # Определение таблицы, индексы и триггеры берутся из текущей схемы
+    table_sql = fetch(migrated_db_path, "SELECT sql FROM sqlite_master WHERE name = 'messages'")
+    create_sql = table_sql[0][0].replace("CREATE TABLE messages", "CREATE TABLE {table}", 1)
+    after_swap = [
+        sql
+        for (sql,) in fetch(
+            migrated_db_path,
+            """
+            SELECT sql FROM sqlite_master
+            WHERE tbl_name = 'messages' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+            """,
+        )
+    ]
+    columns = [
+        row[1] for row in fetch(migrated_db_path, "PRAGMA table_xinfo(messages)") if row[6] == 0
+    ]
+    await run_migration(
+        migrated_db_path,
+        lambda: rebuild_table(
+            "messages", create_sql, columns, after_swap=after_swap, batch_size=2, pause_seconds=0
+        ),
+    )
+
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+    manager = DatabaseManager(migrated_db_path, read_pool_size=1)
+    await manager.init()
+    try:
+        repo = MessageRepository(manager, compression_threshold=20)
+        recent = await repo.get_recent(1, 10)
+        assert sorted(m.id for m in recent) == ids[1:]
+        assert recent[0].content == "Message 4 " + "long " * 4
+        assert {m.id for m in await repo.search_fts("long")} == set(ids[1:])
+
+        # Триггеры FTS и статистики снова на месте
+        new_id = await repo.create(1, "user", "Fresh " + "long " * 10)
+        assert new_id > ids[-1]
+        assert new_id in {m.id for m in await repo.search_fts("fresh")}
+    finally:
+        await manager.close()
+    assert fetch(migrated_db_path, stats_sql) == [(counted + 1,)]
+    assert fetch(migrated_db_path, "PRAGMA integrity_check") == [("ok",)]
+    assert (
+        fetch(
+            migrated_db_path,
+            "INSERT INTO messages_fts(messages_fts, rank) VALUES ('integrity-check', 0)",
+        )
+        == []
+    )
+
+
+def test_rebuild_validates_parameters():
+    """Размер пакета и выражения столбцов проверяются до обращения к БД"""
+    with pytest.raises(ValueError, match="batch_size"):
+        rebuild_table("notes", NOTES_SQL, columns=["id"], batch_size=0)
+    with pytest.raises(ValueError, match="select"):
+        rebuild_table("notes", NOTES_SQL, columns=["id", "text"], select=["id"])